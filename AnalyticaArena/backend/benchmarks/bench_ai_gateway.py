@@ -0,0 +1,88 @@
+"""
+Load-test the AI gateway offline against a degrading fake provider.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ai_gateway --requests 500 --latency 0.2 --fail-after 200
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from services.ai_cache import ai_response_cache
+from services.ai_gateway import AIGateway
+from services.ai_providers import AIProvider
+from services.ai_service import AIService
+import services.ai_service as ai_service_module
+
+class DegradingProvider(AIProvider):
+    """
+    Provider with jittered latency that degrades after `fail_after` calls:
+    every later call hangs past the gateway deadline.
+    """
+
+    model_name = "degrading"
+
+    def __init__(self, latency: float, fail_after: int, hang: float, seed: int = 0):
+        self.latency = latency
+        self.fail_after = fail_after
+        self.hang = hang
+        self.calls = 0
+        self.peak_concurrency = 0
+        self._active = 0
+        self._rng = random.Random(seed)
+
+    async def generate(self, prompt: str, task: str, context) -> str:
+        self.calls += 1
+        self._active += 1
+        self.peak_concurrency = max(self.peak_concurrency, self._active)
+        try:
+            degraded = self.fail_after and self.calls > self.fail_after
+            await asyncio.sleep(self.hang if degraded else self.latency * self._rng.uniform(0.5, 1.5))
+            return '[{"title": "t", "description": "d", "category": "trend", "importance": "low"}]'
+        finally:
+            self._active -= 1
+
+async def run(args) -> None:
+    gateway = AIGateway(args.max_concurrency, args.timeout, args.queue_timeout,
+                        args.breaker_failures, args.breaker_reset)
+    ai_service_module.ai_gateway = gateway
+    ai_response_cache.enabled = False
+
+    model = DegradingProvider(args.latency, args.fail_after, args.timeout * 2)
+    service = AIService(model)
+
+    async def one(i: int):
+        # Distinct dataset names give distinct prompts, so nothing is coalesced
+        info = {"name": f"dataset-{i}", "num_rows": 10, "num_columns": 2,
+                "column_info": "", "statistics": "", "quality_issues": ""}
+        start = time.perf_counter()
+        insights = await service.generate_insights(info)
+        return time.perf_counter() - start, insights
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one(i) for i in range(args.requests)])
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    fallbacks = sum(1 for _, insights in results if insights and insights[0]["title"] == "Dataset Overview")
+    print(f"Requests: {args.requests}, wall time {elapsed:.2f}s, {args.requests / elapsed:.1f} req/s")
+    print(f"Caller latency p50 {latencies[len(latencies) // 2]:.3f}s, p95 {latencies[int(len(latencies) * 0.95)]:.3f}s")
+    print(f"Provider calls: {model.calls}, peak provider concurrency: {model.peak_concurrency}")
+    print(f"Fallback insights served: {fallbacks}")
+    print(f"Gateway: {gateway.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2, help="mean fake provider latency (s)")
+    parser.add_argument("--fail-after", type=int, default=0, help="provider hangs after this many calls (0 = never)")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--queue-timeout", type=float, default=30.0)
+    parser.add_argument("--breaker-failures", type=int, default=5)
+    parser.add_argument("--breaker-reset", type=float, default=30.0)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
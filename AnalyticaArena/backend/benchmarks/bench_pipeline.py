@@ -0,0 +1,168 @@
+"""
+Throughput of the analysis and chat pipelines with the offline AI provider.
+
+Runs the same stages as the analyze and chat routes (profiling and charts in
+the worker pool, generated code in the query sandbox, AI calls through the
+gateway) without MongoDB or network.
+Run from the backend directory:
+    python -m benchmarks.bench_pipeline --rows 200000 --datasets 8 --latency-ms 800
+"""
+import argparse
+import asyncio
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+from models.dataset_model import DatasetProfile
+from services.ai_cache import ai_response_cache
+from services.ai_gateway import ai_gateway
+from services.ai_providers import LocalProvider
+from services.ai_service import ai_service
+from services.column_profiler import profile_dataframe
+from services.query_sandbox import query_sandbox
+from services.tasks import profile_dataset, build_charts
+from utils.workers import worker_pool
+
+QUESTIONS = [
+    "What is the average amount by region?",
+    "Total amount per channel",
+    "How many orders per region?"
+]
+
+# Quadratic generated code, like a row-wise apply that rescans the frame
+RUNAWAY_CODE = "result = df.apply(lambda row: (df['amount'] > row['amount']).sum(), axis=1)"
+
+def make_frame(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "channel": rng.choice(["web", "store", "phone"], rows),
+        "amount": rng.gamma(2.0, 50.0, rows).round(2),
+        "quantity": rng.integers(1, 40, rows),
+        "discount": rng.random(rows).round(3)
+    })
+
+async def analyze(name: str, df: pd.DataFrame, profile: DatasetProfile, combined: bool) -> dict:
+    """Mirror of the analyze route minus persistence; returns stage timings"""
+    timings = {}
+    start = time.perf_counter()
+    result = await worker_pool.run(profile_dataset, df, profile)
+    timings["profile"] = time.perf_counter() - start
+
+    column_types = profile.semantic_types()
+    dataset_info = {
+        "name": name,
+        "num_rows": len(df),
+        "num_columns": len(df.columns),
+        "column_info": result["column_info"],
+        "statistics": result["statistics_summary"],
+        "quality_issues": result["quality_issues_summary"],
+        "columns": list(df.columns),
+        "column_types": column_types,
+        "sample_data": result["sample_data"],
+        "prompt_columns": result["prompt_columns"]
+    }
+
+    start = time.perf_counter()
+    if combined:
+        insights, suggestions = await ai_service.generate_analysis(dataset_info)
+    else:
+        insights, suggestions = await asyncio.gather(
+            ai_service.generate_insights(dataset_info),
+            ai_service.suggest_charts(dataset_info)
+        )
+    timings["ai"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    charts = await worker_pool.run(build_charts, df, column_types, suggestions)
+    timings["charts"] = time.perf_counter() - start
+    timings["insights"] = len(insights)
+    timings["num_charts"] = len(charts)
+    return timings
+
+async def chat(dataset_key: str, df: pd.DataFrame, profile: DatasetProfile, question: str) -> float:
+    """Mirror of the chat route minus persistence; returns the latency in seconds"""
+    start = time.perf_counter()
+    dataset_info = {
+        "columns": list(df.columns),
+        "column_types": profile.semantic_types(),
+        "unique_counts": {col.name: col.unique_count for col in profile.columns},
+        "shape": df.shape
+    }
+    response = await ai_service.natural_language_to_code(question, dataset_info)
+    if response.get("code"):
+        await query_sandbox.run(dataset_key, df, response["code"], response.get("chart_config"))
+    return time.perf_counter() - start
+
+async def runaway(dataset_key: str, df: pd.DataFrame) -> bool:
+    """Submit a query that overruns its deadline; returns whether it was stopped"""
+    result = await query_sandbox.run(dataset_key, df, RUNAWAY_CODE)
+    return not result["execution"]["success"]
+
+async def run(args) -> None:
+    ai_service.provider = LocalProvider(args.latency_ms)
+    ai_response_cache.enabled = not args.no_cache
+    # Queue every submission instead of shedding load; this measures throughput, not backpressure
+    worker_pool.max_pending = args.datasets * len(QUESTIONS)
+    worker_pool.start()
+    query_sandbox.timeout = args.query_timeout
+    query_sandbox.max_pending = args.datasets * (len(QUESTIONS) + 1)
+    query_sandbox.start()
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    frames = [make_frame(args.rows, seed) for seed in range(args.datasets)]
+    profiles = [profile_dataframe(df) for df in frames]
+    print(f"{args.datasets} datasets x {args.rows:,} rows, provider latency {args.latency_ms:.0f}ms, "
+          f"pool {worker_pool.kind} x {worker_pool.size}, {'combined' if args.combined else 'separate'} AI calls")
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        analyze(f"dataset-{i}", df, profile, args.combined) for i, (df, profile) in enumerate(zip(frames, profiles))
+    ])
+    elapsed = time.perf_counter() - start
+    print(f"Analyses: {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.2f}/s)")
+    for stage in ("profile", "ai", "charts"):
+        times = [r[stage] for r in results]
+        print(f"  {stage:<8} mean {np.mean(times):.3f}s  max {np.max(times):.3f}s")
+    print(f"  insights/analysis {np.mean([r['insights'] for r in results]):.1f}, "
+          f"charts/analysis {np.mean([r['num_charts'] for r in results]):.1f}")
+    print(f"  provider calls {ai_gateway.calls}")
+
+    start = time.perf_counter()
+    chats = [
+        chat(f"dataset-{i}", df, profile, question)
+        for i, (df, profile) in enumerate(zip(frames, profiles)) for question in QUESTIONS
+    ]
+    runaways = [runaway(f"dataset-{i}", df) for i, df in enumerate(frames[:args.runaway])]
+    outcomes = await asyncio.gather(*chats, *runaways)
+    elapsed = time.perf_counter() - start
+    latencies = outcomes[:len(chats)]
+    print(f"Chat queries: {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.2f}/s), "
+          f"p50 {np.percentile(latencies, 50):.3f}s  p95 {np.percentile(latencies, 95):.3f}s  "
+          f"max {np.max(latencies):.3f}s")
+    if runaways:
+        print(f"  runaway queries stopped {sum(outcomes[len(chats):])}/{len(runaways)}")
+    stats = query_sandbox.stats()
+    print(f"  sandbox x {stats['workers']}: dataset sends {stats['dataset_sends']}, "
+          f"timeouts {stats['timeouts']}, memory kills {stats['memory_kills']}")
+
+    query_sandbox.shutdown()
+    worker_pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--datasets", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--combined", action="store_true", help="one LLM call for insights and charts")
+    parser.add_argument("--no-cache", action="store_true", help="disable the AI response cache")
+    parser.add_argument("--runaway", type=int, default=0,
+                        help="also submit this many quadratic queries (rejected by the cost precheck, "
+                             "or stopped at the deadline with QUERY_COST_LIMIT_SECONDS=0)")
+    parser.add_argument("--query-timeout", type=float, default=10, help="sandbox deadline in seconds")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
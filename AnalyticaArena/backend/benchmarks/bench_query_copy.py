@@ -0,0 +1,71 @@
+"""
+Per-query latency and peak allocation of QueryExecutor under each copy mode.
+
+"copy" deep-copies the dataset before every query; "cow" hands the code a
+shallow copy under pandas Copy-on-Write. Run from the backend directory:
+    python -m benchmarks.bench_query_copy --rows 100000 --cols 50
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from services.query_executor import QueryExecutor, enable_copy_on_write
+
+QUERIES = {
+    "groupby mean": "result = df.groupby('cat_0')['num_1'].mean()",
+    "filter head": "result = df[df['num_1'] > 0.5].head(20)",
+    "value counts": "result = df['cat_0'].value_counts()",
+    "add column": "df['ratio'] = df['num_1'] / (df['num_2'] + 1)\nresult = df['ratio'].describe()",
+    "in-place fill": "df.fillna(0, inplace=True)\nresult = df['num_1'].sum()"
+}
+
+def make_frame(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        if i % 5 == 0:
+            data[f"cat_{i}"] = pd.Categorical(rng.choice(["a", "b", "c", "d"], rows))
+        else:
+            data[f"num_{i}"] = rng.random(rows)
+    return pd.DataFrame(data)
+
+def measure(df: pd.DataFrame, code: str, mode: str, repeat: int):
+    """Median latency in seconds and peak traced allocation in bytes"""
+    times, peaks = [], []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = QueryExecutor.execute_query(df, code, mode)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert result["success"], result["error"]
+    return float(np.median(times)), max(peaks)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--cols", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    enable_copy_on_write()
+    df = make_frame(args.rows, args.cols)
+    before = df.copy()
+    print(f"{args.rows:,} x {args.cols} frame, {df.memory_usage(deep=True).sum() / 1e6:.1f}MB, pandas {pd.__version__}")
+    print(f"{'query':<15}{'copy ms':>10}{'cow ms':>10}{'copy peak MB':>15}{'cow peak MB':>14}")
+
+    for name, code in QUERIES.items():
+        copy_time, copy_peak = measure(df, code, "copy", args.repeat)
+        cow_time, cow_peak = measure(df, code, "cow", args.repeat)
+        print(f"{name:<15}{copy_time * 1000:>10.2f}{cow_time * 1000:>10.2f}"
+              f"{copy_peak / 1e6:>15.1f}{cow_peak / 1e6:>14.1f}")
+
+    # Mutating queries must not have reached the shared frame
+    pd.testing.assert_frame_equal(df, before)
+    print("dataset unchanged after all queries")
+
+if __name__ == "__main__":
+    main()
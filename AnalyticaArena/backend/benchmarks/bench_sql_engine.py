@@ -0,0 +1,89 @@
+"""
+Per-query latency of the pandas and SQL (DuckDB over Arrow) chat engines.
+
+Each query is run as generated pandas code through QueryExecutor and as SQL
+through SQLExecutor against the same frame. The Arrow table is built once,
+as the query sandbox does per dataset, and its cost is reported separately.
+Run from the backend directory:
+    python -m benchmarks.bench_sql_engine --rows 1000000 --groups 10000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from services.query_executor import QueryExecutor, enable_copy_on_write
+from services.sql_executor import SQLExecutor
+
+QUERIES = {
+    "groupby mean": (
+        "result = df.groupby('store')['amount'].mean().sort_values(ascending=False)",
+        'SELECT store, AVG(amount) AS amount FROM df GROUP BY store ORDER BY amount DESC'
+    ),
+    "groupby multi": (
+        "result = df.groupby(['region', 'store']).agg(total=('amount', 'sum'), orders=('amount', 'count'),"
+        " top=('amount', 'max')).reset_index().sort_values('total', ascending=False)",
+        'SELECT region, store, SUM(amount) AS total, COUNT(amount) AS orders, MAX(amount) AS top '
+        'FROM df GROUP BY region, store ORDER BY total DESC'
+    ),
+    "distinct count": (
+        "result = df.groupby('region')['customer'].nunique()",
+        'SELECT region, COUNT(DISTINCT customer) AS customers FROM df GROUP BY region'
+    ),
+    "join to groups": (
+        "means = df.groupby('store')['amount'].mean().rename('store_mean').reset_index()\n"
+        "joined = df.merge(means, on='store')\n"
+        "result = joined[joined['amount'] > joined['store_mean'] * 2].groupby('region')['amount'].count()",
+        'WITH means AS (SELECT store, AVG(amount) AS store_mean FROM df GROUP BY store) '
+        'SELECT region, COUNT(amount) AS amount FROM df JOIN means USING (store) '
+        'WHERE amount > store_mean * 2 GROUP BY region'
+    ),
+    "filter top rows": (
+        "result = df[df['amount'] > 900].sort_values('amount', ascending=False).head(20)",
+        'SELECT * FROM df WHERE amount > 900 ORDER BY amount DESC LIMIT 20'
+    )
+}
+
+def make_frame(rows: int, groups: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "region": pd.Categorical(rng.choice(["north", "south", "east", "west"], rows)),
+        "store": rng.integers(0, groups, rows),
+        "customer": rng.integers(0, rows // 10 + 1, rows),
+        "amount": rng.gamma(2.0, 150.0, rows),
+        "day": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+    })
+
+def measure(run, repeat: int) -> float:
+    """Median latency in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+        assert result["success"], result["error"]
+    return float(np.median(times))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    enable_copy_on_write()
+    df = make_frame(args.rows, args.groups)
+    print(f"{args.rows:,} rows, {args.groups:,} stores, {df.memory_usage(deep=True).sum() / 1e6:.1f}MB, pandas {pd.__version__}")
+
+    start = time.perf_counter()
+    table = SQLExecutor.arrow_table(df)
+    print(f"arrow table built in {(time.perf_counter() - start) * 1000:.1f}ms ({table.nbytes / 1e6:.1f}MB)")
+
+    print(f"{'query':<17}{'pandas ms':>11}{'sql ms':>10}{'speedup':>9}")
+    for name, (code, sql) in QUERIES.items():
+        pandas_time = measure(lambda: QueryExecutor.execute_query(df, code), args.repeat)
+        sql_time = measure(lambda: SQLExecutor.execute_query(table, sql), args.repeat)
+        print(f"{name:<17}{pandas_time * 1000:>11.2f}{sql_time * 1000:>10.2f}{pandas_time / sql_time:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
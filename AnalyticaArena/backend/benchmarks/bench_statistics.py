@@ -0,0 +1,85 @@
+"""
+Benchmark DataAnalyzer.get_basic_statistics against the former per-column loop.
+
+Run from the backend directory:
+    python -m benchmarks.bench_statistics --rows 1000000 --cols 100
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from services.data_analysis import DataAnalyzer
+
+def legacy_basic_statistics(df: pd.DataFrame):
+    """The per-column implementation get_basic_statistics replaced"""
+    stats_list = []
+    for col in df.select_dtypes(include=[np.number]).columns:
+        col_data = df[col].dropna()
+        if len(col_data) > 0:
+            stats_dict = {
+                "column": col,
+                "mean": float(col_data.mean()),
+                "median": float(col_data.median()),
+                "std": float(col_data.std()),
+                "min": float(col_data.min()),
+                "max": float(col_data.max()),
+                "q25": float(col_data.quantile(0.25)),
+                "q75": float(col_data.quantile(0.75))
+            }
+            mode_val = col_data.mode()
+            if len(mode_val) > 0:
+                stats_dict["mode"] = float(mode_val.iloc[0])
+            stats_list.append(stats_dict)
+    return stats_list
+
+def make_frame(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        if i % 4 == 0:
+            data[f"int_{i}"] = rng.integers(0, 1000, rows)
+        else:
+            column = rng.normal(loc=i, scale=10, size=rows)
+            column[rng.random(rows) < 0.01] = np.nan
+            data[f"float_{i}"] = column
+    return pd.DataFrame(data)
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cols", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.cols)
+    print(f"Frame: {args.rows:,} rows x {args.cols} numeric columns")
+
+    legacy_time, legacy = timed(lambda: legacy_basic_statistics(df), args.repeat)
+    batched_time, batched = timed(lambda: DataAnalyzer(df).get_basic_statistics(), args.repeat)
+
+    mismatches = 0
+    for old, new in zip(legacy, batched):
+        for key, value in old.items():
+            if key == "column":
+                continue
+            if not np.isclose(value, new[key], rtol=1e-9, atol=0, equal_nan=True):
+                mismatches += 1
+                print(f"  mismatch {old['column']}.{key}: {value} != {new[key]}")
+
+    print(f"Per-column loop: {legacy_time:8.3f}s")
+    print(f"Batched engine:  {batched_time:8.3f}s")
+    print(f"Speedup:         {legacy_time / batched_time:8.2f}x")
+    print(f"Mismatched values (rtol=1e-9): {mismatches}")
+
+if __name__ == "__main__":
+    main()
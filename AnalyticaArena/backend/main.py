@@ -1,5 +1,6 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
@@ -8,14 +9,34 @@ from slowapi.errors import RateLimitExceeded
 
 from utils.database import connect_to_mongo, close_mongo_connection
 from utils.limiter import limiter
+from utils.workers import worker_pool, PoolSaturatedError
+from services.dataframe_cache import dataframe_cache
+from services.ai_cache import ai_response_cache
+from services.ai_gateway import ai_gateway
+from services.ai_service import ai_service
+from services.analysis_pipeline import ensure_analysis_indexes
+from services.dataset_store import dataset_store
+from services.jobs import job_queue
+from services.query_sandbox import query_sandbox
+from services.query_planner import query_plan_metrics
+from services.query_cache import query_result_cache
 
 load_dotenv()
-from routes import auth, upload, analysis, chat
+from routes import auth, upload, analysis, chat, jobs
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_to_mongo()
+    await ai_response_cache.ensure_indexes()
+    await ensure_analysis_indexes()
+    await dataset_store.ensure_indexes()
+    worker_pool.start()
+    query_sandbox.start()
+    await job_queue.start()
     yield
+    await job_queue.stop()
+    query_sandbox.shutdown()
+    worker_pool.shutdown()
     await close_mongo_connection()
 app = FastAPI(
     title="Analytica API",
@@ -25,6 +46,16 @@ app = FastAPI(
 )
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    """Backpressure when the pandas worker pool is full"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -43,6 +74,7 @@ app.include_router(auth.router)
 app.include_router(upload.router)
 app.include_router(analysis.router)
 app.include_router(chat.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 async def root():
@@ -58,6 +90,24 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """In-process cache and pipeline metrics"""
+    return {
+        "dataframe_cache": dataframe_cache.stats(),
+        "worker_pool": worker_pool.stats(),
+        "query_sandbox": query_sandbox.stats(),
+        "query_plans": query_plan_metrics.stats(),
+        "query_results": query_result_cache.stats(),
+        "ai_cache": ai_response_cache.stats(),
+        "ai_gateway": ai_gateway.stats(),
+        "jobs": job_queue.stats(),
+        "single_flight": {
+            "ai": ai_service.flights.stats(),
+            "analysis": analysis.analysis_flights.stats()
+        }
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -21,6 +21,7 @@ class DataQualityIssue(BaseModel):
     description: str
     count: int
     percentage: Optional[float] = None
+    samples: Optional[List[Any]] = None  # e.g. duplicate row groups
 
 class Insight(BaseModel):
     title: str
@@ -61,6 +62,9 @@ class AnalysisResult(BaseModel):
     # KPIs
     kpis: Dict[str, Any] = {}
     
+    # Sketch error bounds when the analysis ran in approximate mode
+    approximation: Optional[Dict[str, Any]] = None
+    
     # Timestamps
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
@@ -76,4 +80,5 @@ class AnalysisResponse(BaseModel):
     insights: List[Insight]
     charts: List[ChartConfig]
     kpis: Dict[str, Any]
+    approximation: Optional[Dict[str, Any]] = None  # sketch error bounds for large datasets
     created_at: datetime
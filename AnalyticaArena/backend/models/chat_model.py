@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime
 from bson import ObjectId
 
@@ -25,9 +25,11 @@ class ChatSession(BaseModel):
 class ChatQuery(BaseModel):
     dataset_id: str
     message: str
+    engine: Optional[Literal["pandas", "sql"]] = None  # defaults to the deployment's CHAT_ENGINE
 
 class ChatResponse(BaseModel):
     message: str
     data: Optional[Any] = None
     chart_config: Optional[Dict[str, Any]] = None
     generated_code: Optional[str] = None
+    engine: Optional[str] = None
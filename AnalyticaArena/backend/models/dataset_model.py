@@ -11,6 +11,26 @@ class ColumnInfo(BaseModel):
     missing_percentage: float
     unique_count: int
     sample_values: List[Any] = []
+    min_value: Optional[Any] = None
+    max_value: Optional[Any] = None
+
+class DatasetProfile(BaseModel):
+    """Per-column profile computed once at upload and persisted with the dataset"""
+    num_rows: int
+    columns: List[ColumnInfo] = []
+
+    @classmethod
+    def from_dataset(cls, dataset: Dict[str, Any]) -> "DatasetProfile":
+        return cls(num_rows=dataset["num_rows"], columns=dataset["columns"])
+
+    def column(self, name: str) -> Optional[ColumnInfo]:
+        for col in self.columns:
+            if col.name == name:
+                return col
+        return None
+
+    def semantic_types(self) -> Dict[str, str]:
+        return {col.name: col.semantic_type for col in self.columns}
 
 class DatasetMetadata(BaseModel):
     id: str = Field(default_factory=lambda: str(ObjectId()), alias="_id")
@@ -51,3 +71,4 @@ class DatasetResponse(BaseModel):
     num_columns: int
     uploaded_at: datetime
     is_analyzed: bool
+    job_id: Optional[str] = None  # background analysis queued by the upload
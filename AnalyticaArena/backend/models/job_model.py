@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import Dict, Optional, Any
+from datetime import datetime
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str  # analysis
+    dataset_id: str
+    status: str  # queued, running, complete, failed
+    stage: Optional[str] = None
+    progress: float = 0.0  # 0-1
+    attempts: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -1,26 +1,51 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
+import asyncio
 import pandas as pd
-import io
 import json
+import os
 from datetime import datetime
+from typing import Optional
 
 from routes.auth import get_current_user
 from models.analysis_model import AnalysisResult, AnalysisResponse, Insight, ChartConfig
-from services.data_analysis import DataAnalyzer
-from services.ai_service import ai_service
-from services.chart_generator import generate_charts
+from services.analysis_pipeline import (
+    run_analysis, analysis_key, find_reusable_analysis, latest_analysis,
+    analysis_response, replay_analysis, Emit
+)
+from services.dataset_store import dataset_store, dataframe_fingerprint
+from services.jobs import job_queue, Progress
 from utils.database import get_database
-from utils.helpers import safe_serialize
+from utils.singleflight import BroadcastFlight
 
 router = APIRouter(prefix="/api/analysis", tags=["analysis"])
 
+# Ask for insights and chart suggestions in one LLM call instead of two
+AI_COMBINED_ANALYSIS = os.getenv("AI_COMBINED_ANALYSIS", "false").lower() == "true"
+
+# Concurrent analyses of the same dataset share one run, streamed or not;
+# each caller receives the run's stage events
+analysis_flights = BroadcastFlight()
+
+# Streaming analyses outlive their request if the client disconnects
+_background_tasks = set()
+
+# Job progress reached when each pipeline stage is stored
+STAGE_PROGRESS = {"kpis": 0.4, "statistics": 0.45, "quality": 0.5, "charts": 0.8, "insights": 1.0}
+
 @router.post("/analyze/{dataset_id}", response_model=AnalysisResponse)
 async def analyze_dataset(
     dataset_id: str,
+    approximate: Optional[bool] = None,
+    combined: Optional[bool] = None,
+    force: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
-    """Perform comprehensive analysis on a dataset"""
+    """
+    Perform comprehensive analysis on a dataset.
+    A stored analysis of the same data and settings is returned as is unless `force` is set.
+    """
     db = get_database()
     
     # Get dataset
@@ -41,93 +66,136 @@ async def analyze_dataset(
             detail="Dataset not found"
         )
     
-    # Load DataFrame from stored data
+    combined = AI_COMBINED_ANALYSIS if combined is None else combined
+    return await analysis_flights.do(
+        (dataset_id, approximate, combined, force),
+        lambda emit: load_and_analyze(dataset_id, dataset, approximate, combined, force, emit=emit)
+    )
+
+async def load_dataframe(dataset: dict) -> pd.DataFrame:
+    """Load the stored DataFrame of a dataset"""
     try:
-        df = pd.read_json(io.StringIO(dataset["data"]), orient='records')
+        return await dataset_store.load(dataset)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error loading dataset: {str(e)}"
         )
+
+async def load_and_analyze(dataset_id: str, dataset: dict, approximate: Optional[bool],
+                           combined: bool, force: bool = False,
+                           emit: Optional[Emit] = None) -> AnalysisResponse:
+    """Reuse the stored analysis of unchanged data, or load the dataset and run a new one"""
+    df = None
+    content_hash = dataset_store.content_hash(dataset)
+    if content_hash is None:
+        df = await load_dataframe(dataset)
+        content_hash = dataframe_fingerprint(df)
+    key = analysis_key(content_hash, approximate, combined)
+    
+    if not force:
+        stored = await find_reusable_analysis(dataset_id, dataset["user_id"], key)
+        if stored is not None:
+            return replay_analysis(stored, emit)
+    
+    if df is None:
+        df = await load_dataframe(dataset)
+    return await run_analysis(
+        dataset_id, dataset, df, approximate, combined,
+        emit=emit, key=key, content_hash=content_hash
+    )
+
+async def analysis_job(job: dict, progress: Progress) -> dict:
+    """Background analysis queued by an upload; shares a run with concurrent analyze requests"""
+    db = get_database()
+    dataset_id = job["dataset_id"]
+    dataset = await db.datasets.find_one({
+        "_id": ObjectId(dataset_id),
+        "user_id": job["user_id"]
+    })
+    if not dataset:
+        raise ValueError("Dataset not found")
+    
+    approximate = job["params"].get("approximate")
+    combined = job["params"].get("combined", AI_COMBINED_ANALYSIS)
+    progress("profiling", 0.1)
+    response = await analysis_flights.do(
+        (dataset_id, approximate, combined, False),
+        lambda emit: load_and_analyze(dataset_id, dataset, approximate, combined, emit=emit),
+        listener=lambda stage, payload: progress(stage, STAGE_PROGRESS[stage])
+    )
+    return {"analysis_id": response.id}
+
+job_queue.register("analysis", analysis_job)
+
+@router.post("/analyze/{dataset_id}/stream")
+async def analyze_dataset_stream(
+    dataset_id: str,
+    approximate: Optional[bool] = None,
+    combined: Optional[bool] = None,
+    force: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Analyze a dataset, streaming each stage as a Server-Sent Event as soon as
+    it is ready: kpis, statistics, quality, charts, insights, then complete
+    (or error). Concurrent streams and analyze requests for the same dataset
+    and settings share one run. The analysis keeps running if the client
+    disconnects. A stored analysis of the same data is replayed unless `force` is set.
+    """
+    db = get_database()
     
-    # Initialize analyzer
-    analyzer = DataAnalyzer(df)
-    
-    # Get statistics
-    statistics = analyzer.get_basic_statistics()
-    
-    # Get quality issues
-    quality_issues = analyzer.get_data_quality_issues()
-    
-    # Calculate quality score
-    quality_score = analyzer.calculate_quality_score(quality_issues)
-    
-    # Calculate KPIs
-    kpis = analyzer.calculate_kpis()
-    
-    # Prepare data for AI
-    column_types = {col["name"]: col["semantic_type"] for col in dataset["columns"]}
-    
-    dataset_info = {
-        "name": dataset["filename"],
-        "num_rows": len(df),
-        "num_columns": len(df.columns),
-        "column_info": analyzer.get_column_info(),
-        "statistics": analyzer.get_statistics_summary(statistics),
-        "quality_issues": analyzer.get_quality_issues_summary(quality_issues),
-        "columns": list(df.columns),
-        "column_types": column_types,
-        "sample_data": df.head(5).to_string()
-    }
-    
-    # Generate AI insights
-    try:
-        ai_insights = await ai_service.generate_insights(dataset_info)
-    except Exception as e:
-        print(f"Error generating AI insights: {e}")
-        ai_insights = []
-    
-    # Get chart suggestions from AI
+    # Get dataset
     try:
-        ai_chart_suggestions = await ai_service.suggest_charts(dataset_info)
-    except Exception as e:
-        print(f"Error getting chart suggestions: {e}")
-        ai_chart_suggestions = None
-    
-    # Generate charts
-    charts = generate_charts(df, column_types, ai_chart_suggestions)
-    
-    # Create analysis document
-    analysis_doc = {
-        "dataset_id": dataset_id,
-        "user_id": str(current_user["_id"]),
-        "statistics": [safe_serialize(stat) for stat in statistics],
-        "quality_score": quality_score,
-        "quality_issues": [safe_serialize(issue) for issue in quality_issues],
-        "insights": ai_insights,
-        "charts": [safe_serialize(chart) for chart in charts],
-        "kpis": {k: safe_serialize(v) for k, v in kpis.items()},
-        "created_at": datetime.utcnow()
-    }
-    
-    # Save to database
-    result = await db.analyses.insert_one(analysis_doc)
-    analysis_id = str(result.inserted_id)
+        dataset = await db.datasets.find_one({
+            "_id": ObjectId(dataset_id),
+            "user_id": str(current_user["_id"])
+        })
+    except:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid dataset ID"
+        )
     
-    # Update dataset with analysis ID
-    await db.datasets.update_one(
-        {"_id": ObjectId(dataset_id)},
-        {"$set": {"is_analyzed": True, "analysis_id": analysis_id}}
-    )
+    if not dataset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dataset not found"
+        )
     
-    return AnalysisResponse(
-        id=analysis_id,
-        dataset_id=dataset_id,
-        quality_score=quality_score,
-        insights=[Insight(**insight) for insight in ai_insights],
-        charts=[ChartConfig(**chart) for chart in charts],
-        kpis=kpis,
-        created_at=analysis_doc["created_at"]
+    combined = AI_COMBINED_ANALYSIS if combined is None else combined
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def produce():
+        try:
+            # Streams of the same analysis share one run; a late subscriber gets the earlier stages first
+            response = await analysis_flights.do(
+                (dataset_id, approximate, combined, force),
+                lambda emit: load_and_analyze(dataset_id, dataset, approximate, combined, force, emit=emit),
+                listener=lambda stage, payload: events.put_nowait((stage, payload))
+            )
+            events.put_nowait(("complete", response.model_dump(mode="json")))
+        except HTTPException as e:
+            events.put_nowait(("error", {"detail": e.detail}))
+        except Exception as e:
+            events.put_nowait(("error", {"detail": str(e)}))
+    
+    # Keep a reference so the task is not garbage collected if the client goes away
+    task = asyncio.ensure_future(produce())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    
+    async def event_stream():
+        while True:
+            stage, payload = await events.get()
+            yield f"event: {stage}\ndata: {json.dumps(payload, default=str)}\n\n"
+            if stage in ("complete", "error"):
+                break
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @router.get("/{dataset_id}", response_model=AnalysisResponse)
@@ -136,13 +204,8 @@ async def get_analysis(
     current_user: dict = Depends(get_current_user)
 ):
     """Get existing analysis for a dataset"""
-    db = get_database()
-    
-    # Find analysis
-    analysis = await db.analyses.find_one({
-        "dataset_id": dataset_id,
-        "user_id": str(current_user["_id"])
-    })
+    # Find the newest analysis
+    analysis = await latest_analysis(dataset_id, str(current_user["_id"]))
     
     if not analysis:
         raise HTTPException(
@@ -150,15 +213,7 @@ async def get_analysis(
             detail="Analysis not found. Please run analysis first."
         )
     
-    return AnalysisResponse(
-        id=str(analysis["_id"]),
-        dataset_id=dataset_id,
-        quality_score=analysis["quality_score"],
-        insights=[Insight(**insight) for insight in analysis["insights"]],
-        charts=[ChartConfig(**chart) for chart in analysis["charts"]],
-        kpis=analysis["kpis"],
-        created_at=analysis["created_at"]
-    )
+    return analysis_response(analysis)
 
 @router.get("/{dataset_id}/quality")
 async def get_data_quality(
@@ -166,12 +221,7 @@ async def get_data_quality(
     current_user: dict = Depends(get_current_user)
 ):
     """Get detailed data quality report"""
-    db = get_database()
-    
-    analysis = await db.analyses.find_one({
-        "dataset_id": dataset_id,
-        "user_id": str(current_user["_id"])
-    })
+    analysis = await latest_analysis(dataset_id, str(current_user["_id"]))
     
     if not analysis:
         raise HTTPException(
@@ -191,12 +241,7 @@ async def get_insights(
     current_user: dict = Depends(get_current_user)
 ):
     """Get AI-generated insights"""
-    db = get_database()
-    
-    analysis = await db.analyses.find_one({
-        "dataset_id": dataset_id,
-        "user_id": str(current_user["_id"])
-    })
+    analysis = await latest_analysis(dataset_id, str(current_user["_id"]))
     
     if not analysis:
         raise HTTPException(
@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from bson import ObjectId
-import pandas as pd
-import io
 from datetime import datetime
 from typing import List
 import os
 
 from routes.auth import get_current_user
 from models.chat_model import ChatQuery, ChatResponse, ChatSession, ChatMessage
+from models.dataset_model import DatasetProfile
 from services.ai_service import ai_service
+from services.dataset_store import dataset_store
+from services.query_cache import query_result_cache
 from services.query_executor import QueryExecutor
-from services.chart_generator import ChartGenerator
+from services.query_planner import query_plan_metrics
+from services.query_sandbox import query_sandbox
+from services.sql_executor import sql_engine_available
 from utils.database import get_database
 from utils.limiter import limiter
 
@@ -19,6 +22,10 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
 # Get rate limit from environment variable (default: 10 requests per minute)
 CHAT_RATE_LIMIT = os.getenv("CHAT_RATE_LIMIT", "10/minute")
 
+# Engine answering chat queries unless a request picks one: "pandas" runs
+# generated pandas code, "sql" runs generated SQL in an embedded DuckDB database
+CHAT_ENGINE = os.getenv("CHAT_ENGINE", "pandas")
+
 @router.post("/query", response_model=ChatResponse)
 @limiter.limit(CHAT_RATE_LIMIT)
 async def chat_query(
@@ -29,6 +36,13 @@ async def chat_query(
     """Process a natural language query about the dataset"""
     db = get_database()
     
+    engine = query.engine or CHAT_ENGINE
+    if engine == "sql" and not sql_engine_available():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="SQL engine is not available: install duckdb"
+        )
+    
     # Get dataset
     try:
         dataset = await db.datasets.find_one({
@@ -47,26 +61,22 @@ async def chat_query(
             detail="Dataset not found"
         )
     
-    # Load DataFrame
-    try:
-        df = pd.read_json(io.StringIO(dataset["data"]), orient='records')
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error loading dataset: {str(e)}"
-        )
-    
-    # Prepare dataset info for AI
-    column_types = {col["name"]: col["semantic_type"] for col in dataset["columns"]}
+    # Prepare dataset info for AI from the upload-time profile
+    dataset_profile = DatasetProfile.from_dataset(dataset)
+    column_types = dataset_profile.semantic_types()
     dataset_info = {
-        "columns": list(df.columns),
+        "columns": [col.name for col in dataset_profile.columns],
         "column_types": column_types,
-        "shape": df.shape
+        "unique_counts": {col.name: col.unique_count for col in dataset_profile.columns},
+        "shape": (dataset["num_rows"], dataset["num_columns"])
     }
     
-    # Convert natural language to code
+    # Convert natural language to code, or to SQL for the SQL engine
     try:
-        ai_response = await ai_service.natural_language_to_code(query.message, dataset_info)
+        if engine == "sql":
+            ai_response = await ai_service.natural_language_to_sql(query.message, dataset_info)
+        else:
+            ai_response = await ai_service.natural_language_to_code(query.message, dataset_info)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -81,7 +91,7 @@ async def chat_query(
         )
     
     # Execute the generated code
-    code = ai_response.get("code")
+    code = ai_response.get("sql" if engine == "sql" else "code")
     if not code:
         return ChatResponse(
             message="I couldn't generate code for that query. Can you rephrase?",
@@ -89,43 +99,42 @@ async def chat_query(
             chart_config=None
         )
     
-    execution_result = QueryExecutor.execute_query(df, code)
+    # Execute the generated code and build chart data in a sandboxed executor process
+    chart_spec = None
+    if ai_response.get("needs_chart") and ai_response.get("chart_config"):
+        chart_spec = ai_response["chart_config"]
+    
+    # Repeated questions on unchanged data reuse the earlier result
+    result_key = query_result_cache.key(dataset_store.content_key(dataset), code, chart_spec, engine)
+    query_run = query_result_cache.get(result_key)
+    if query_run is None:
+        try:
+            df = await dataset_store.load(dataset)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error loading dataset: {str(e)}"
+            )
+        dataset_key = (dataset_store.cache_id(dataset), dataset_store.version(dataset))
+        query_run = await query_sandbox.run(dataset_key, df, code, chart_spec, engine)
+        query_plan_metrics.record(query_run["execution"].get("plan"))
+        if query_run["execution"]["success"]:
+            query_result_cache.put(result_key, query_run)
+    execution_result = query_run["execution"]
     
     if not execution_result["success"]:
         return ChatResponse(
             message=f"Error executing query: {execution_result['error']}",
             data=None,
             chart_config=None,
-            generated_code=code
+            generated_code=code,
+            engine=engine
         )
     
     # Format result
     result_data = execution_result["result"]
     result_type = execution_result["result_type"]
-    
-    # Generate chart if needed
-    chart_config = None
-    if ai_response.get("needs_chart") and ai_response.get("chart_config"):
-        chart_spec = ai_response["chart_config"]
-        
-        # If result is a DataFrame or Series, use it for chart
-        if result_type in ["DataFrame", "Series"]:
-            if isinstance(result_data, list):
-                result_df = pd.DataFrame(result_data)
-            elif isinstance(result_data, dict):
-                result_df = pd.DataFrame([result_data])
-            else:
-                result_df = df 
-            
-            # Generate chart data
-            if len(result_df) > 0:
-                chart_config = {
-                    "chart_type": chart_spec.get("type", "bar"),
-                    "title": chart_spec.get("title", "Query Result"),
-                    "x_column": chart_spec.get("x_column"),
-                    "y_column": chart_spec.get("y_column"),
-                    "data": ChartGenerator.generate_chart_data(result_df, chart_spec)
-                }
+    chart_config = query_run["chart_config"]
     
     formatted_result = QueryExecutor.format_result_for_display(result_data, result_type)
 
@@ -180,7 +189,8 @@ async def chat_query(
         message=formatted_result,
         data=result_data,
         chart_config=chart_config,
-        generated_code=code
+        generated_code=code,
+        engine=engine
     )
 
 @router.get("/history/{dataset_id}")
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from bson import ObjectId
+from typing import List, Optional
+
+from routes.auth import get_current_user
+from models.job_model import JobResponse
+from utils.database import get_database
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+def job_response(job: dict) -> JobResponse:
+    return JobResponse(
+        id=str(job["_id"]),
+        kind=job["kind"],
+        dataset_id=job["dataset_id"],
+        status=job["status"],
+        stage=job.get("stage"),
+        progress=job.get("progress", 0.0),
+        attempts=job.get("attempts", 0),
+        result=job.get("result"),
+        error=job.get("error"),
+        created_at=job["created_at"],
+        started_at=job.get("started_at"),
+        finished_at=job.get("finished_at")
+    )
+
+@router.get("/", response_model=List[JobResponse])
+async def list_jobs(
+    dataset_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the most recent background jobs, optionally for one dataset"""
+    db = get_database()
+    
+    query = {"user_id": str(current_user["_id"])}
+    if dataset_id:
+        query["dataset_id"] = dataset_id
+    
+    jobs = await db.jobs.find(query).sort("created_at", -1).to_list(50)
+    return [job_response(job) for job in jobs]
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the status and progress of a background job"""
+    db = get_database()
+    
+    try:
+        job = await db.jobs.find_one({
+            "_id": ObjectId(job_id),
+            "user_id": str(current_user["_id"])
+        })
+    except:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID"
+        )
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return job_response(job)
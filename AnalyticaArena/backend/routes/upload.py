@@ -1,99 +1,79 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
-from typing import List
-import pandas as pd
-import io
+from typing import List, Optional, Tuple
 import os
 from datetime import datetime
 from bson import ObjectId
 
 from routes.auth import get_current_user
-from models.dataset_model import DatasetMetadata, ColumnInfo, DatasetResponse
+from models.dataset_model import DatasetMetadata, DatasetResponse
+from services.dataset_store import dataset_store
+from services.jobs import job_queue
+from services.query_cache import query_result_cache
+from services.ingestion import spool_upload, UploadSpool, UploadTooLargeError, RowLimitExceededError
+from services.tasks import ingest_upload
 from utils.database import get_database
-from utils.helpers import validate_file, infer_column_types, safe_serialize
+from utils.helpers import validate_file, safe_serialize
+from utils.workers import worker_pool, PoolSaturatedError
 
 router = APIRouter(prefix="/api/upload", tags=["upload"])
 
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE_MB", 50)) * 1024 * 1024
+MAX_ROWS = int(os.getenv("MAX_ROWS", 100000))
+
+# Queue a background analysis as soon as a dataset is stored
+EAGER_ANALYSIS = os.getenv("EAGER_ANALYSIS", "false").lower() == "true"
 
 @router.post("/", response_model=DatasetResponse)
 async def upload_dataset(
     file: UploadFile = File(...),
+    analyze: Optional[bool] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload and process a dataset"""
-    
-    # Read file content
-    content = await file.read()
-    file_size = len(content)
+    """
+    Upload and process a dataset.
+    With `analyze` (default EAGER_ANALYSIS) an analysis is queued in the background;
+    its job id is returned for polling /api/jobs.
+    """
     
-    # Validate file
-    validation = validate_file(file.filename, file_size)
+    # Validate file type before reading any bytes
+    validation = validate_file(file.filename, 0)
     if not validation["valid"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={"errors": validation["errors"]}
         )
+    file_ext = validation["extension"]
     
-    # Parse file based on type
+    # Stream the upload into a spooled temp file, checking the size limit as bytes arrive
     try:
-        file_ext = validation["extension"]
-        
-        if file_ext == '.csv':
-            df = pd.read_csv(io.BytesIO(content))
-        elif file_ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(io.BytesIO(content))
-        elif file_ext == '.json':
-            df = pd.read_json(io.BytesIO(content))
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Unsupported file type"
-            )
-        
-        # Check row limit
-        max_rows = int(os.getenv("MAX_ROWS", 100000))
-        if len(df) > max_rows:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Dataset exceeds maximum row limit of {max_rows}"
-            )
-        
-    except Exception as e:
+        spool = await spool_upload(file, MAX_FILE_SIZE)
+    except UploadTooLargeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Error parsing file: {str(e)}"
-        )
-    
-    # Infer column types
-    column_types = infer_column_types(df)
-    
-    # Create column information
-    columns_info = []
-    for col in df.columns:
-        col_data = df[col]
-        missing_count = int(col_data.isna().sum())
-        missing_pct = (missing_count / len(df)) * 100
-        
-        # Get sample values
-        sample_values = col_data.dropna().head(5).tolist()
-        sample_values = [safe_serialize(v) for v in sample_values]
-        
-        column_info = ColumnInfo(
-            name=col,
-            dtype=str(col_data.dtype),
-            semantic_type=column_types.get(col, "text"),
-            missing_count=missing_count,
-            missing_percentage=round(missing_pct, 2),
-            unique_count=int(col_data.nunique()),
-            sample_values=sample_values
+            detail={"errors": [str(e)]}
         )
-        columns_info.append(column_info)
+    file_size = spool.size
+    source_sha256 = spool.sha256
     
-    # Store dataset in database
     db = get_database()
     
-    # Convert DataFrame to JSON for storage
-    dataset_json = df.to_json(orient='records')
+    # The spool's temp file is removed however this block exits
+    with spool:
+        # An identical earlier upload already has a parsed payload and column profile
+        duplicate = await db.datasets.find_one({
+            "user_id": str(current_user["_id"]),
+            "source_sha256": source_sha256,
+            "file_type": file_ext.replace('.', '')
+        })
+        if duplicate is not None and await dataset_store.link(duplicate["storage"]):
+            ingested = {
+                "num_rows": duplicate["num_rows"],
+                "num_columns": duplicate["num_columns"],
+                "columns": duplicate["columns"]
+            }
+            storage = duplicate["storage"]
+        else:
+            ingested, storage = await ingest_and_store(spool, file_ext, file.filename)
     
     dataset_doc = {
         "user_id": str(current_user["_id"]),
@@ -101,26 +81,70 @@ async def upload_dataset(
         "original_filename": file.filename,
         "file_size": file_size,
         "file_type": file_ext.replace('.', ''),
-        "num_rows": len(df),
-        "num_columns": len(df.columns),
-        "columns": [col.model_dump() for col in columns_info],
-        "data": dataset_json,  # Store actual data
+        "num_rows": ingested["num_rows"],
+        "num_columns": ingested["num_columns"],
+        "columns": ingested["columns"],
+        "storage": storage,
+        "source_sha256": source_sha256,
+        "file_path": str(storage["file_id"]),
         "uploaded_at": datetime.utcnow(),
         "is_analyzed": False
     }
     
-    result = await db.datasets.insert_one(dataset_doc)
+    # The stored file, or the reference taken on a duplicate's file, belongs to
+    # this document; give it back if the document cannot be written
+    try:
+        result = await db.datasets.insert_one(dataset_doc)
+    except Exception:
+        await dataset_store.delete(dataset_doc)
+        raise
     dataset_id = str(result.inserted_id)
     
+    job_id = None
+    eager = EAGER_ANALYSIS if analyze is None else analyze
+    if eager:
+        job_id = await job_queue.enqueue("analysis", dataset_doc["user_id"], dataset_id)
+    
     return DatasetResponse(
         id=dataset_id,
         filename=file.filename,
-        num_rows=len(df),
-        num_columns=len(df.columns),
+        num_rows=dataset_doc["num_rows"],
+        num_columns=dataset_doc["num_columns"],
         uploaded_at=dataset_doc["uploaded_at"],
-        is_analyzed=False
+        is_analyzed=False,
+        job_id=job_id
     )
 
+async def ingest_and_store(spool: UploadSpool, file_ext: str, filename: str) -> Tuple[dict, dict]:
+    """Parse, profile and store a spooled upload; returns (ingested info, storage descriptor)"""
+    # Parse, profile and serialize off the event loop
+    try:
+        ingested = await worker_pool.run(ingest_upload, spool.source(), file_ext, MAX_ROWS)
+    except PoolSaturatedError:
+        raise
+    except RowLimitExceededError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error parsing file: {str(e)}"
+        )
+    finally:
+        spool.close()
+    
+    # Store the data as compressed columnar chunks
+    try:
+        storage = await dataset_store.save(ingested["payload"], filename, ingested["sha256"])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error storing dataset: {str(e)}"
+        )
+    return ingested, storage
+
 @router.get("/datasets", response_model=List[DatasetResponse])
 async def get_user_datasets(current_user: dict = Depends(get_current_user)):
     """Get all datasets for the current user"""
@@ -209,17 +233,16 @@ async def get_dataset_preview(
             detail="Dataset not found"
         )
     
-    # Parse stored data and return first 10 rows
+    # Load stored data and return first 10 rows
     try:
-        import json
-        data = json.loads(dataset["data"])
-        preview_rows = data[:10]
-        columns = list(preview_rows[0].keys()) if preview_rows else []
+        df = await dataset_store.load(dataset)
+        preview_rows = df.head(10).to_dict(orient='records')
+        columns = [str(col) for col in df.columns]
         
         # Safe serialize all values
         safe_rows = []
         for row in preview_rows:
-            safe_row = {k: safe_serialize(v) for k, v in row.items()}
+            safe_row = {str(k): safe_serialize(v) for k, v in row.items()}
             safe_rows.append(safe_row)
         
         return {
@@ -244,7 +267,7 @@ async def delete_dataset(
     db = get_database()
     
     try:
-        result = await db.datasets.delete_one({
+        dataset = await db.datasets.find_one_and_delete({
             "_id": ObjectId(dataset_id),
             "user_id": str(current_user["_id"])
         })
@@ -254,13 +277,18 @@ async def delete_dataset(
             detail="Invalid dataset ID"
         )
     
-    if result.deleted_count == 0:
+    if not dataset:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Dataset not found"
         )
     
-    # Also delete associated analysis
+    # Remove the stored data payload and cached query results
+    await dataset_store.delete(dataset)
+    query_result_cache.invalidate(dataset_store.content_key(dataset))
+    
+    # Also delete associated analysis and background jobs
     await db.analyses.delete_many({"dataset_id": dataset_id})
+    await db.jobs.delete_many({"dataset_id": dataset_id})
     
     return {"message": "Dataset deleted successfully"}
@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+from utils.database import get_database
+
+logger = logging.getLogger(__name__)
+
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", 512))
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+def prompt_fingerprint(model_name: str, template_version: str, prompt: str) -> str:
+    """Stable cache key for a prompt sent to a given model with a given template version"""
+    digest = hashlib.sha256()
+    for part in (model_name, template_version, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class AIResponseCache:
+    """
+    Two-tier cache of raw LLM response text.
+    An in-process LRU answers repeated prompts without I/O; the Mongo
+    `ai_cache` collection (TTL-indexed on created_at) shares responses across
+    workers and restarts. Store errors are logged and treated as misses.
+    """
+
+    def __init__(self, enabled: bool, max_entries: int, ttl_seconds: int):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.store_errors = 0
+
+    async def ensure_indexes(self) -> None:
+        """Create the TTL index that expires persisted responses"""
+        db = get_database()
+        if not self.enabled or db is None:
+            return
+        try:
+            await db.ai_cache.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Could not create AI cache TTL index: {e}")
+
+    def _remember(self, key: str, response: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (response, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look a fingerprint up in memory, then in Mongo"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        db = get_database()
+        if db is not None:
+            try:
+                doc = await db.ai_cache.find_one({"_id": key})
+            except Exception as e:
+                self.store_errors += 1
+                logger.warning(f"AI cache lookup failed: {e}")
+                doc = None
+
+            # The TTL monitor runs periodically, so expired documents may still be present
+            if doc is not None:
+                expires_at = doc["created_at"] + timedelta(seconds=self.ttl_seconds)
+                if expires_at > datetime.utcnow():
+                    self.store_hits += 1
+                    self._remember(key, doc["response"], now + (expires_at - datetime.utcnow()).total_seconds())
+                    return doc["response"]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def put(self, key: str, response: str, model_name: str, template_version: str) -> None:
+        """Store a response in both tiers"""
+        if not self.enabled:
+            return
+
+        self._remember(key, response, time.time() + self.ttl_seconds)
+        self.writes += 1
+
+        db = get_database()
+        if db is None:
+            return
+        try:
+            await db.ai_cache.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "response": response,
+                    "model": model_name,
+                    "template_version": template_version,
+                    "created_at": datetime.utcnow()
+                },
+                upsert=True
+            )
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning(f"AI cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters for monitoring"""
+        with self._lock:
+            hits = self.memory_hits + self.store_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "store_errors": self.store_errors,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+# Singleton instance
+ai_response_cache = AIResponseCache(AI_CACHE_ENABLED, AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL_SECONDS)
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 8))
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", 30))
+AI_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AI_QUEUE_TIMEOUT_SECONDS", 10))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", 5))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", 30))
+
+LATENCY_WINDOW = 256
+
+class AIUnavailableError(Exception):
+    """Raised when a call is refused without reaching the provider"""
+
+class AIGateway:
+    """
+    Admission control in front of the AI provider.
+    A semaphore bounds concurrent provider calls; callers wait at most
+    `queue_timeout` for a slot and each call is cut off after `timeout`.
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast for `reset_seconds`, then a single probe call decides whether
+    it closes again.
+    """
+
+    def __init__(self, max_concurrency: int, timeout: float, queue_timeout: float,
+                 failure_threshold: int, reset_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self._probing = False
+        self.waiting = 0
+        self.in_flight = 0
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def _admit(self) -> bool:
+        """Whether the breaker lets a call through; claims the probe when half-open"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def _record_success(self, latency: float) -> None:
+        self.successes += 1
+        self._latencies.append(latency)
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self._probing = False
+
+    def _record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a provider call under the concurrency limit, deadline and breaker"""
+        self.calls += 1
+        if self.state == "open" and time.monotonic() - self.opened_at < self.reset_seconds:
+            self.rejected += 1
+            raise AIUnavailableError("AI provider is temporarily unavailable")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Local overload says nothing about provider health, so the breaker is not charged
+            self.rejected += 1
+            raise AIUnavailableError("Too many AI requests in progress")
+        finally:
+            self.waiting -= 1
+
+        # The breaker may have opened while this call was queued
+        if not self._admit():
+            self._semaphore.release()
+            self.rejected += 1
+            raise AIUnavailableError("AI provider is temporarily unavailable")
+
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._record_failure()
+            raise
+        except asyncio.CancelledError:
+            self._probing = False
+            raise
+        except Exception:
+            self._record_failure()
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+        self._record_success(time.monotonic() - start)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Gateway counters and recent provider latency for monitoring"""
+        latencies = sorted(self._latencies)
+
+        def percentile(q: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000, 1)
+
+        return {
+            "state": self.state,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "latency_ms_p50": percentile(0.5),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": round(latencies[-1] * 1000, 1) if latencies else 0.0
+        }
+
+# Singleton instance
+ai_gateway = AIGateway(
+    AI_MAX_CONCURRENCY,
+    AI_TIMEOUT_SECONDS,
+    AI_QUEUE_TIMEOUT_SECONDS,
+    AI_BREAKER_FAILURES,
+    AI_BREAKER_RESET_SECONDS
+)
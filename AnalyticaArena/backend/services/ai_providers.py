@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AI_PROVIDER = os.getenv("AI_PROVIDER", "gemini")  # gemini or local
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+AI_LOCAL_LATENCY_MS = float(os.getenv("AI_LOCAL_LATENCY_MS", 0))
+
+NUMERIC_TYPES = ("numeric_continuous", "numeric_discrete")
+DATETIME_TYPES = ("datetime", "datetime_string")
+
+class AIProvider(ABC):
+    """
+    A text-generation backend.
+    `task` names the prompt template ("insights", "charts", "analysis",
+    "nl_to_code", "nl_to_sql", "report") and `context` holds the values it was filled from; remote
+    models only need the prompt, offline backends answer from the context.
+    Subclasses must implement `generate`; one that does not cannot be instantiated.
+    """
+
+    model_name = "unknown"
+
+    @abstractmethod
+    async def generate(self, prompt: str, task: str, context: Dict[str, Any]) -> str:
+        """Model response text for a filled prompt"""
+
+class GeminiProvider(AIProvider):
+    """Google Gemini through the google-generativeai SDK"""
+
+    def __init__(self, api_key: str, model_name: str):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str, task: str, context: Dict[str, Any]) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+class LocalProvider(AIProvider):
+    """
+    Deterministic offline backend for benchmarks and isolated environments.
+    Responses are schema-valid and derived from the dataset info only, so the
+    same request always gets the same answer. Each call sleeps for
+    `latency_ms`, jittered by +/-50% from the prompt hash.
+    """
+
+    model_name = "local"
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    async def generate(self, prompt: str, task: str, context: Dict[str, Any]) -> str:
+        if self.latency_ms > 0:
+            jitter = int(hashlib.md5(prompt.encode("utf-8")).hexdigest()[:4], 16) / 0xFFFF
+            await asyncio.sleep(self.latency_ms * (0.5 + jitter) / 1000)
+
+        if task == "insights":
+            return json.dumps(self._insights(context))
+        if task == "charts":
+            return json.dumps(self._charts(context))
+        if task == "analysis":
+            return json.dumps({"insights": self._insights(context), "charts": self._charts(context)})
+        if task == "nl_to_code":
+            return json.dumps(self._nl_to_code(context))
+        if task == "nl_to_sql":
+            return json.dumps(self._nl_to_sql(context))
+        if task == "report":
+            return self._report(context)
+        raise ValueError(f"Unknown task: {task}")
+
+    @staticmethod
+    def _columns_by_type(column_types: Dict[str, str]) -> Dict[str, List[str]]:
+        return {
+            "numeric": [col for col, kind in column_types.items() if kind in NUMERIC_TYPES],
+            "categorical": [col for col, kind in column_types.items() if kind == "categorical"],
+            "datetime": [col for col, kind in column_types.items() if kind in DATETIME_TYPES]
+        }
+
+    def _insights(self, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        groups = self._columns_by_type(context.get("column_types", {}))
+        insights = [{
+            "title": "Dataset Overview",
+            "description": f"{context.get('name', 'Dataset')} contains {context['num_rows']} rows and {context['num_columns']} columns.",
+            "category": "pattern",
+            "importance": "medium"
+        }]
+        if groups["numeric"]:
+            insights.append({
+                "title": "Numeric Measures",
+                "description": f"{len(groups['numeric'])} numeric columns are available for aggregation, led by {groups['numeric'][0]}.",
+                "category": "pattern",
+                "importance": "medium"
+            })
+        if groups["categorical"] and groups["numeric"]:
+            insights.append({
+                "title": f"Segment {groups['numeric'][0]} by {groups['categorical'][0]}",
+                "description": f"Compare average {groups['numeric'][0]} across {groups['categorical'][0]} to find outperforming segments.",
+                "category": "recommendation",
+                "importance": "high"
+            })
+        if groups["datetime"]:
+            insights.append({
+                "title": "Time Dimension",
+                "description": f"{groups['datetime'][0]} allows trends to be tracked over time.",
+                "category": "trend",
+                "importance": "medium"
+            })
+        quality_issues = context.get("quality_issues") or ""
+        if quality_issues.strip() and not quality_issues.startswith("No significant"):
+            insights.append({
+                "title": "Data Quality",
+                "description": "Quality issues were detected; review them before relying on aggregates.",
+                "category": "anomaly",
+                "importance": "high"
+            })
+        return insights
+
+    def _charts(self, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        groups = self._columns_by_type(context.get("column_types", {}))
+        numeric, categorical, datetime_cols = groups["numeric"], groups["categorical"], groups["datetime"]
+        charts = []
+        if categorical and numeric:
+            charts.append({
+                "chart_type": "bar",
+                "title": f"Average {numeric[0]} by {categorical[0]}",
+                "description": f"Mean {numeric[0]} for each {categorical[0]}",
+                "x_column": categorical[0],
+                "y_column": numeric[0],
+                "group_by": None,
+                "aggregation": "mean"
+            })
+        if datetime_cols and numeric:
+            charts.append({
+                "chart_type": "line",
+                "title": f"{numeric[0]} over Time",
+                "description": f"Total {numeric[0]} by {datetime_cols[0]}",
+                "x_column": datetime_cols[0],
+                "y_column": numeric[0],
+                "group_by": None,
+                "aggregation": "sum"
+            })
+        if numeric:
+            charts.append({
+                "chart_type": "histogram",
+                "title": f"Distribution of {numeric[0]}",
+                "description": f"Frequency distribution of {numeric[0]}",
+                "x_column": numeric[0],
+                "y_column": None,
+                "group_by": None,
+                "aggregation": "none"
+            })
+        if categorical:
+            charts.append({
+                "chart_type": "pie",
+                "title": f"Share of {categorical[0]}",
+                "description": f"Row count for each {categorical[0]}",
+                "x_column": categorical[0],
+                "y_column": None,
+                "group_by": None,
+                "aggregation": "count"
+            })
+        if len(numeric) >= 2:
+            charts.append({
+                "chart_type": "scatter",
+                "title": f"{numeric[0]} vs {numeric[1]}",
+                "description": f"Relationship between {numeric[0]} and {numeric[1]}",
+                "x_column": numeric[0],
+                "y_column": numeric[1],
+                "group_by": None,
+                "aggregation": "none"
+            })
+        return charts
+
+    def _query_columns(self, context: Dict[str, Any]) -> Tuple[List[str], List[str], str]:
+        """Numeric and categorical columns for a question, mentioned ones first, and its aggregation"""
+        question = context.get("question", "").lower()
+        column_types = context.get("column_types", {})
+        groups = self._columns_by_type(column_types)
+        mentioned = [col for col in context.get("columns", []) if str(col).lower() in question]
+        numeric = [col for col in mentioned if col in groups["numeric"]] or groups["numeric"]
+        categorical = [col for col in mentioned if col in groups["categorical"]] or groups["categorical"]
+
+        if any(word in question for word in ("sum", "total")):
+            aggregation = "sum"
+        elif "count" in question or "how many" in question:
+            aggregation = "count"
+        else:
+            aggregation = "mean"
+        return numeric, categorical, aggregation
+
+    def _nl_to_code(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        numeric, categorical, aggregation = self._query_columns(context)
+
+        if not numeric:
+            return {"code": "result = df.describe(include='all')", "needs_chart": False}
+
+        y_column = numeric[0]
+        if not categorical:
+            return {"code": f"result = df[{y_column!r}].{aggregation}()", "needs_chart": False}
+
+        x_column = categorical[0]
+        return {
+            "code": f"result = df.groupby({x_column!r})[{y_column!r}].{aggregation}().sort_values(ascending=False)",
+            "needs_chart": True,
+            "chart_config": {
+                "type": "bar",
+                "x_column": x_column,
+                "y_column": y_column,
+                "title": f"{aggregation.title()} of {y_column} by {x_column}"
+            }
+        }
+
+    def _nl_to_sql(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        from services.sql_executor import quote_identifier
+
+        numeric, categorical, aggregation = self._query_columns(context)
+
+        if not numeric:
+            return {"sql": "SELECT COUNT(*) AS row_count FROM df", "needs_chart": False}
+
+        y_column = numeric[0]
+        function = {"sum": "SUM", "count": "COUNT", "mean": "AVG"}[aggregation]
+        value = f"{function}({quote_identifier(y_column)}) AS {quote_identifier(y_column)}"
+        if not categorical:
+            return {"sql": f"SELECT {value} FROM df", "needs_chart": False}
+
+        x_column = categorical[0]
+        return {
+            "sql": (
+                f"SELECT {quote_identifier(x_column)}, {value} FROM df "
+                f"GROUP BY {quote_identifier(x_column)} ORDER BY {quote_identifier(y_column)} DESC"
+            ),
+            "needs_chart": True,
+            "chart_config": {
+                "type": "bar",
+                "x_column": x_column,
+                "y_column": y_column,
+                "title": f"{aggregation.title()} of {y_column} by {x_column}"
+            }
+        }
+
+    def _report(self, context: Dict[str, Any]) -> str:
+        return (
+            f"# Analysis Report: {context.get('dataset_name', 'Dataset')}\n\n"
+            f"## Dataset Overview\n\n{context.get('statistics', '')}\n\n"
+            f"## Key Findings\n\n{context.get('insights', '')}\n\n"
+            f"## Charts\n\n{context.get('chart_descriptions', '')}\n"
+        )
+
+def create_provider(kind: str = AI_PROVIDER) -> Optional[AIProvider]:
+    """Build the configured provider; None when AI features are disabled"""
+    if kind == "local":
+        return LocalProvider(AI_LOCAL_LATENCY_MS)
+    if kind == "gemini":
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            logger.warning("GEMINI_API_KEY not found. AI features will be disabled.")
+            return None
+        return GeminiProvider(api_key, GEMINI_MODEL)
+    raise ValueError(f"Unknown AI_PROVIDER: {kind}")
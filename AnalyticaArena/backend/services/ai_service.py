@@ -1,8 +1,9 @@
-import google.generativeai as genai
+import asyncio
 import os
+import re
 import json
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,20 +12,126 @@ logger = logging.getLogger(__name__)
 from utils.prompts import (
     fill_insight_prompt,
     fill_nl_to_code_prompt,
+    fill_nl_to_sql_prompt,
     fill_chart_suggestion_prompt,
-    fill_report_prompt
+    fill_report_prompt,
+    fill_combined_analysis_prompt,
+    PROMPT_TEMPLATE_VERSION
 )
+from services.ai_cache import ai_response_cache, prompt_fingerprint
+from services.ai_gateway import ai_gateway, AIUnavailableError
+from services.ai_providers import AIProvider, create_provider
+from services.prompt_builder import rank_columns, budget_column_list
+from utils.singleflight import SingleFlight
+
+def parse_json_response(text: str) -> Any:
+    """Parse a JSON model response, removing markdown code fences if present"""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return json.loads(text.strip())
+
+INSIGHT_KEYS = ("title", "description", "category", "importance")
+
+def _salvage_array(text: str, key: str) -> Optional[Any]:
+    """Decode the JSON array following `"key":` even if the rest of the text is malformed"""
+    match = re.search(r'"%s"\s*:\s*\[' % key, text)
+    if not match:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, match.end() - 1)
+    except json.JSONDecodeError:
+        return None
+    return value
+
+def parse_combined_response(text: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[List[Dict[str, Any]]]]:
+    """
+    Parse a combined analysis response into (insights, charts).
+    Each half is recovered independently, so a truncated or malformed half
+    comes back as None without losing the other. Raises ValueError when
+    neither half is usable.
+    """
+    try:
+        result = parse_json_response(text)
+        if not isinstance(result, dict):
+            raise ValueError("Expected a JSON object")
+        insights, charts = result.get("insights"), result.get("charts")
+    except ValueError:
+        insights, charts = _salvage_array(text, "insights"), _salvage_array(text, "charts")
+    
+    if isinstance(insights, list):
+        insights = [item for item in insights if isinstance(item, dict) and all(k in item for k in INSIGHT_KEYS)]
+    if isinstance(charts, list):
+        charts = [item for item in charts if isinstance(item, dict) and item.get("chart_type")]
+    insights = insights if isinstance(insights, list) and insights else None
+    charts = charts if isinstance(charts, list) and charts else None
+    
+    if insights is None and charts is None:
+        raise ValueError("No usable insights or charts in response")
+    return insights, charts
+
+def require_complete_analysis(text: str) -> None:
+    """Accept only combined responses where both halves parsed"""
+    insights, charts = parse_combined_response(text)
+    if insights is None or charts is None:
+        raise ValueError("Combined response is missing insights or charts")
 
 class AIService:
-    def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            logger.warning("GEMINI_API_KEY not found. AI features will be disabled.")
-            self.model = None
-            return
+    def __init__(self, provider: Optional[AIProvider] = None):
+        self.flights = SingleFlight()
+        self._provider = provider
+        self._provider_loaded = provider is not None
+    
+    @property
+    def provider(self) -> Optional[AIProvider]:
+        """The configured provider, created on first use rather than at import time"""
+        if not self._provider_loaded:
+            self._provider = create_provider()
+            self._provider_loaded = True
+        return self._provider
+    
+    @provider.setter
+    def provider(self, provider: Optional[AIProvider]) -> None:
+        self._provider = provider
+        self._provider_loaded = True
+    
+    async def _generate(self, prompt: str, task: str, context: Dict[str, Any],
+                        parse: Callable[[str], Any] = str,
+                        validate: Optional[Callable[[str], Any]] = None) -> Any:
+        """
+        Send a prompt to the provider through the gateway.
+        Responses are cached by prompt fingerprint, and concurrent callers with
+        the same fingerprint share one request. Each caller parses the shared
+        text itself so no parsed objects are shared between requests.
+        Only responses accepted by `validate` (default: `parse`) are cached.
+        """
+        provider = self.provider
+        if provider is None:
+            raise AIUnavailableError("AI features are disabled")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        key = prompt_fingerprint(provider.model_name, PROMPT_TEMPLATE_VERSION, prompt)
+        response_text = await self.flights.do(key, lambda: self._fetch(provider, key, prompt, task, context, validate or parse))
+        return parse(response_text)
+    
+    async def _fetch(self, provider: AIProvider, key: str, prompt: str, task: str,
+                     context: Dict[str, Any], validate: Callable[[str], Any]) -> str:
+        """Return the response text from the cache or the provider"""
+        cached = await ai_response_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        response_text = await ai_gateway.call(lambda: provider.generate(prompt, task, context))
+        # Only valid responses are stored, so malformed output is never replayed
+        try:
+            validate(response_text)
+        except ValueError:
+            return response_text
+        await ai_response_cache.put(key, response_text, provider.model_name, PROMPT_TEMPLATE_VERSION)
+        return response_text
     
     async def generate_insights(self, dataset_info: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Generate AI insights from dataset summary"""
@@ -38,56 +145,99 @@ class AIService:
                 quality_issues=dataset_info["quality_issues"]
             )
             
-            response = self.model.generate_content(prompt)
-            
             # Parse JSON response
-            insights_text = response.text.strip()
-            # Remove markdown code blocks if present
-            if insights_text.startswith("```json"):
-                insights_text = insights_text[7:]
-            if insights_text.startswith("```"):
-                insights_text = insights_text[3:]
-            if insights_text.endswith("```"):
-                insights_text = insights_text[:-3]
-            
-            insights = json.loads(insights_text.strip())
+            insights = await self._generate(prompt, "insights", dataset_info, parse_json_response)
             return insights
             
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse AI response as JSON: {e}")
-            # Return fallback insights
-            return [{
-                "title": "Dataset Overview",
-                "description": f"Dataset contains {dataset_info['num_rows']} rows and {dataset_info['num_columns']} columns.",
-                "category": "pattern",
-                "importance": "medium"
-            }]
+            return self._fallback_insights(dataset_info)
+        except asyncio.TimeoutError:
+            logger.warning("AI insights timed out, using fallback insights")
+            return self._fallback_insights(dataset_info)
+        except AIUnavailableError as e:
+            # Circuit open or too many requests queued
+            logger.warning(f"Skipping AI insights: {e}")
+            return self._fallback_insights(dataset_info)
         except Exception as e:
             print(f"Error generating insights: {e}")
             return []
     
+    def _fallback_insights(self, dataset_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Basic insight used when the model response is unusable or the provider is unavailable"""
+        return [{
+            "title": "Dataset Overview",
+            "description": f"Dataset contains {dataset_info['num_rows']} rows and {dataset_info['num_columns']} columns.",
+            "category": "pattern",
+            "importance": "medium"
+        }]
+    
+    async def generate_analysis(self, dataset_info: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+        """
+        Generate insights and chart suggestions with a single prompt
+        Returns: (insights, chart suggestions or None to auto-generate charts)
+        """
+        try:
+            prompt_columns = dataset_info.get("prompt_columns") or dataset_info["columns"]
+            prompt = fill_combined_analysis_prompt(
+                dataset_name=dataset_info.get("name", "Dataset"),
+                num_rows=dataset_info["num_rows"],
+                num_columns=dataset_info["num_columns"],
+                column_info=dataset_info["column_info"],
+                column_types={col: dataset_info["column_types"].get(col) for col in prompt_columns},
+                statistics=dataset_info["statistics"],
+                quality_issues=dataset_info["quality_issues"],
+                sample_data=dataset_info["sample_data"]
+            )
+            
+            insights, charts = await self._generate(
+                prompt, "analysis", dataset_info, parse_combined_response, require_complete_analysis
+            )
+            if insights is None:
+                logger.error("Combined AI response had no usable insights")
+                insights = self._fallback_insights(dataset_info)
+            if charts is None:
+                logger.error("Combined AI response had no usable chart suggestions")
+            return insights, charts
+            
+        except ValueError as e:
+            logger.error(f"Failed to parse combined AI response: {e}")
+            return self._fallback_insights(dataset_info), None
+        except asyncio.TimeoutError:
+            logger.warning("AI analysis timed out, using fallback insights")
+            return self._fallback_insights(dataset_info), None
+        except AIUnavailableError as e:
+            # Circuit open or too many requests queued
+            logger.warning(f"Skipping AI analysis: {e}")
+            return self._fallback_insights(dataset_info), None
+        except Exception as e:
+            print(f"Error generating AI analysis: {e}")
+            return [], None
+    
     async def natural_language_to_code(self, question: str, dataset_info: Dict[str, Any]) -> Dict[str, Any]:
         """Convert natural language question to Pandas code"""
         try:
+            # Keep the column list within budget, favouring columns the question names
+            ranked = rank_columns(
+                dataset_info["columns"],
+                dataset_info["shape"][0],
+                dataset_info.get("unique_counts", {}),
+                question=question
+            )
+            columns, column_types, omitted = budget_column_list(
+                dataset_info["columns"], dataset_info["column_types"], ranked
+            )
             prompt = fill_nl_to_code_prompt(
-                columns=dataset_info["columns"],
-                column_types=dataset_info["column_types"],
+                columns=columns,
+                column_types=column_types,
                 shape=dataset_info["shape"],
-                question=question
+                question=question,
+                omitted_columns=omitted
             )
             
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            # Clean markdown formatting
-            if result_text.startswith("```json"):
-                result_text = result_text[7:]
-            if result_text.startswith("```"):
-                result_text = result_text[3:]
-            if result_text.endswith("```"):
-                result_text = result_text[:-3]
-            
-            result = json.loads(result_text.strip())
+            result = await self._generate(
+                prompt, "nl_to_code", {**dataset_info, "question": question}, parse_json_response
+            )
             return result
             
         except Exception as e:
@@ -98,6 +248,39 @@ class AIService:
                 "error": str(e)
             }
     
+    async def natural_language_to_sql(self, question: str, dataset_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert natural language question to a DuckDB SQL query over table `df`"""
+        try:
+            ranked = rank_columns(
+                dataset_info["columns"],
+                dataset_info["shape"][0],
+                dataset_info.get("unique_counts", {}),
+                question=question
+            )
+            columns, column_types, omitted = budget_column_list(
+                dataset_info["columns"], dataset_info["column_types"], ranked
+            )
+            prompt = fill_nl_to_sql_prompt(
+                columns=columns,
+                column_types=column_types,
+                shape=dataset_info["shape"],
+                question=question,
+                omitted_columns=omitted
+            )
+            
+            result = await self._generate(
+                prompt, "nl_to_sql", {**dataset_info, "question": question}, parse_json_response
+            )
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error converting NL to SQL: {e}")
+            return {
+                "sql": None,
+                "needs_chart": False,
+                "error": str(e)
+            }
+    
     async def suggest_charts(self, dataset_info: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Suggest appropriate charts for the dataset"""
         try:
@@ -107,18 +290,7 @@ class AIService:
                 sample_data=dataset_info["sample_data"]
             )
             
-            response = self.model.generate_content(prompt)
-            charts_text = response.text.strip()
-            
-            # Clean markdown formatting
-            if charts_text.startswith("```json"):
-                charts_text = charts_text[7:]
-            if charts_text.startswith("```"):
-                charts_text = charts_text[3:]
-            if charts_text.endswith("```"):
-                charts_text = charts_text[:-3]
-            
-            charts = json.loads(charts_text.strip())
+            charts = await self._generate(prompt, "charts", dataset_info, parse_json_response)
             return charts
             
         except Exception as e:
@@ -136,8 +308,12 @@ class AIService:
                 chart_descriptions=chart_descriptions
             )
             
-            response = self.model.generate_content(prompt)
-            return response.text
+            return await self._generate(prompt, "report", {
+                "dataset_name": dataset_name,
+                "statistics": statistics,
+                "insights": insights,
+                "chart_descriptions": chart_descriptions
+            })
             
         except Exception as e:
             logger.error(f"Error generating report: {e}")
@@ -0,0 +1,244 @@
+"""Dataset analysis pipeline shared by the blocking and streaming analyze endpoints"""
+import asyncio
+import hashlib
+import logging
+import pandas as pd
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from bson import ObjectId
+
+from models.analysis_model import AnalysisResponse, Insight, ChartConfig
+from models.dataset_model import DatasetProfile
+from services.ai_service import ai_service
+from services.tasks import profile_dataset, build_charts
+from utils.database import get_database
+from utils.helpers import safe_serialize
+from utils.prompts import PROMPT_TEMPLATE_VERSION
+from utils.workers import worker_pool
+
+logger = logging.getLogger(__name__)
+
+# Bump when profiling, quality checks or chart building change what an analysis contains
+ANALYZER_VERSION = "1"
+
+Emit = Callable[[str, Dict[str, Any]], None]
+
+async def ensure_analysis_indexes() -> None:
+    """Indexes for stored-analysis lookups"""
+    db = get_database()
+    await db.analyses.create_index([("dataset_id", 1), ("analysis_key", 1)])
+    await db.analyses.create_index([("dataset_id", 1), ("created_at", -1)])
+    await db.analyses.create_index([("user_id", 1), ("analysis_key", 1)])
+
+def analysis_key(content_hash: str, approximate: Optional[bool], combined: bool) -> str:
+    """
+    Identity of an analysis result: the dataset content plus everything else
+    that changes the output (analyzer and prompt versions, model, options)
+    """
+    provider = ai_service.provider
+    parts = [
+        content_hash,
+        ANALYZER_VERSION,
+        PROMPT_TEMPLATE_VERSION,
+        provider.model_name if provider is not None else "none",
+        "auto" if approximate is None else str(approximate),
+        str(combined)
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+async def find_reusable_analysis(dataset_id: str, user_id: str, key: str) -> Optional[dict]:
+    """
+    Newest complete analysis of a dataset stored under `key`. When the dataset
+    has none, a matching analysis of another of the user's datasets holding
+    the same data (a re-upload) is copied to it.
+    """
+    db = get_database()
+    query = {"user_id": user_id, "analysis_key": key, "status": "complete"}
+    analysis = await db.analyses.find_one({**query, "dataset_id": dataset_id}, sort=[("created_at", -1)])
+    if analysis is not None:
+        return analysis
+
+    source = await db.analyses.find_one(query, sort=[("created_at", -1)])
+    if source is None:
+        return None
+    analysis = {k: v for k, v in source.items() if k != "_id"}
+    analysis.update({"dataset_id": dataset_id, "created_at": datetime.utcnow()})
+    result = await db.analyses.insert_one(analysis)
+    analysis["_id"] = result.inserted_id
+    await db.datasets.update_one(
+        {"_id": ObjectId(dataset_id)},
+        {"$set": {"is_analyzed": True, "analysis_id": str(result.inserted_id)}}
+    )
+    return analysis
+
+async def latest_analysis(dataset_id: str, user_id: str) -> Optional[dict]:
+    """Newest complete analysis of a dataset, else the newest one still running or failed"""
+    db = get_database()
+    query = {"dataset_id": dataset_id, "user_id": user_id}
+    # Analyses stored before statuses were recorded have no status field
+    analysis = await db.analyses.find_one(
+        {**query, "status": {"$in": ["complete", None]}},
+        sort=[("created_at", -1)]
+    )
+    if analysis is None:
+        analysis = await db.analyses.find_one(query, sort=[("created_at", -1)])
+    return analysis
+
+def analysis_response(analysis: dict) -> AnalysisResponse:
+    """API response for a stored analysis document"""
+    return AnalysisResponse(
+        id=str(analysis["_id"]),
+        dataset_id=analysis["dataset_id"],
+        quality_score=analysis["quality_score"],
+        insights=[Insight(**insight) for insight in analysis["insights"]],
+        charts=[ChartConfig(**chart) for chart in analysis["charts"]],
+        kpis=analysis["kpis"],
+        approximation=analysis.get("approximation"),
+        created_at=analysis["created_at"]
+    )
+
+def replay_analysis(analysis: dict, emit: Optional[Emit] = None) -> AnalysisResponse:
+    """Emit the stages of a stored analysis in pipeline order and return it"""
+    if emit is not None:
+        emit("kpis", {"id": str(analysis["_id"]), "kpis": analysis["kpis"], "approximation": analysis.get("approximation")})
+        emit("statistics", {"statistics": analysis["statistics"]})
+        emit("quality", {"quality_score": analysis["quality_score"], "quality_issues": analysis["quality_issues"]})
+        emit("charts", {"charts": analysis["charts"]})
+        emit("insights", {"insights": analysis["insights"]})
+    return analysis_response(analysis)
+
+async def collect_superseded(dataset_id: str, keep_id: ObjectId) -> None:
+    """Delete every finished analysis of a dataset except `keep_id`; running ones are left alone"""
+    db = get_database()
+    await db.analyses.delete_many({
+        "dataset_id": dataset_id,
+        "_id": {"$ne": keep_id},
+        "status": {"$ne": "running"}
+    })
+
+async def run_analysis(dataset_id: str, dataset: dict, df: pd.DataFrame,
+                       approximate: Optional[bool] = None, combined: bool = False,
+                       emit: Optional[Emit] = None, key: Optional[str] = None,
+                       content_hash: Optional[str] = None) -> AnalysisResponse:
+    """
+    Profile, summarize with AI, chart and persist an analysis of a dataset.
+    The analysis document is inserted as soon as the pandas profiling is done
+    and updated as charts and insights arrive; `emit(stage, payload)` is
+    called after each stage is persisted, in the order kpis, statistics,
+    quality, charts, insights. The document is stored under `key` (see
+    analysis_key) and older analyses of the dataset are deleted once it completes.
+    """
+    db = get_database()
+    emit = emit or (lambda stage, payload: None)
+
+    # Run the pandas profiling off the event loop, reusing the upload-time column profile
+    dataset_profile = DatasetProfile.from_dataset(dataset)
+    profile = await worker_pool.run(profile_dataset, df, dataset_profile, approximate)
+    statistics = [safe_serialize(stat) for stat in profile["statistics"]]
+    quality_issues = [safe_serialize(issue) for issue in profile["quality_issues"]]
+    quality_score = profile["quality_score"]
+    kpis = {k: safe_serialize(v) for k, v in profile["kpis"].items()}
+
+    # Persist the pandas results before waiting on the AI
+    analysis_doc = {
+        "dataset_id": dataset_id,
+        "user_id": dataset["user_id"],
+        "status": "running",
+        "analysis_key": key,
+        "content_hash": content_hash,
+        "analyzer_version": ANALYZER_VERSION,
+        "statistics": statistics,
+        "quality_score": quality_score,
+        "quality_issues": quality_issues,
+        "insights": [],
+        "charts": [],
+        "kpis": kpis,
+        "approximation": profile["approximation"],
+        "prompt_columns_omitted": profile["prompt_columns_omitted"],
+        "created_at": datetime.utcnow()
+    }
+    result = await db.analyses.insert_one(analysis_doc)
+    analysis_id = result.inserted_id
+
+    insights_task = None
+    try:
+        emit("kpis", {"id": str(analysis_id), "kpis": kpis, "approximation": profile["approximation"]})
+        emit("statistics", {"statistics": statistics})
+        emit("quality", {"quality_score": quality_score, "quality_issues": quality_issues})
+
+        # Prepare data for AI
+        column_types = dataset_profile.semantic_types()
+
+        dataset_info = {
+            "name": dataset["filename"],
+            "num_rows": len(df),
+            "num_columns": len(df.columns),
+            "column_info": profile["column_info"],
+            "statistics": profile["statistics_summary"],
+            "quality_issues": profile["quality_issues_summary"],
+            "columns": list(df.columns),
+            "column_types": column_types,
+            "sample_data": profile["sample_data"],
+            "prompt_columns": profile["prompt_columns"]
+        }
+
+        if combined:
+            # One request returns both insights and chart suggestions
+            ai_insights, ai_chart_suggestions = await ai_service.generate_analysis(dataset_info)
+        else:
+            # Request insights and chart suggestions concurrently; charts are built
+            # and sent while the insights request is still running
+            insights_task = asyncio.ensure_future(ai_service.generate_insights(dataset_info))
+            try:
+                ai_chart_suggestions = await ai_service.suggest_charts(dataset_info)
+            except Exception as e:
+                logger.exception(f"Error getting chart suggestions for dataset {dataset_id}: {e}")
+                ai_chart_suggestions = None
+
+        # Generate charts
+        charts = await worker_pool.run(build_charts, df, column_types, ai_chart_suggestions)
+        charts = [safe_serialize(chart) for chart in charts]
+        await db.analyses.update_one({"_id": analysis_id}, {"$set": {"charts": charts}})
+        emit("charts", {"charts": charts})
+
+        if insights_task is not None:
+            try:
+                ai_insights = await insights_task
+            except Exception as e:
+                logger.exception(f"Error generating AI insights for dataset {dataset_id}: {e}")
+                ai_insights = []
+
+        await db.analyses.update_one(
+            {"_id": analysis_id},
+            {"$set": {"insights": ai_insights, "status": "complete"}}
+        )
+        emit("insights", {"insights": ai_insights})
+
+        # Update dataset with analysis ID
+        await db.datasets.update_one(
+            {"_id": ObjectId(dataset_id)},
+            {"$set": {"is_analyzed": True, "analysis_id": str(analysis_id)}}
+        )
+    except BaseException:
+        # Cancellation included (e.g. the client went away); a document left
+        # "running" would never be collected
+        if insights_task is not None:
+            insights_task.cancel()
+        await asyncio.shield(
+            db.analyses.update_one({"_id": analysis_id}, {"$set": {"status": "failed"}})
+        )
+        raise
+
+    # Only the newest result of a dataset is kept
+    await collect_superseded(dataset_id, analysis_id)
+
+    return AnalysisResponse(
+        id=str(analysis_id),
+        dataset_id=dataset_id,
+        quality_score=quality_score,
+        insights=[Insight(**insight) for insight in ai_insights],
+        charts=[ChartConfig(**chart) for chart in charts],
+        kpis=kpis,
+        approximation=profile["approximation"],
+        created_at=analysis_doc["created_at"]
+    )
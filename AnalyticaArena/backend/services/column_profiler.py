@@ -0,0 +1,179 @@
+import os
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Any, Optional
+
+from models.dataset_model import ColumnInfo, DatasetProfile
+from services.sketches import HyperLogLog
+from utils.helpers import safe_serialize
+
+SAMPLE_SIZE = 5
+TYPE_PROBE_SIZE = 100
+# Distinct values counted exactly per column before switching to a HyperLogLog estimate
+PROFILE_EXACT_DISTINCT = int(os.getenv("PROFILE_EXACT_DISTINCT", 100000))
+
+def infer_semantic_type(dtype, unique_count: int, num_rows: int, probe: List[Any]) -> str:
+    """Infer the semantic type of a column from its profile"""
+    # Check if numeric
+    if pd.api.types.is_numeric_dtype(dtype):
+        # Check if it's actually an ID or categorical
+        unique_ratio = unique_count / num_rows if num_rows else 0
+        if unique_ratio > 0.9:
+            return "identifier"
+        elif unique_count < 20:
+            return "categorical"
+        elif pd.api.types.is_float_dtype(dtype):
+            return "numeric_continuous"
+        return "numeric_discrete"
+
+    # Check if datetime
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+
+    # Object (string) column: try to parse the first values as datetime
+    try:
+        pd.to_datetime(pd.Series(probe, dtype=object), errors='raise')
+        return "datetime_string"
+    except Exception:
+        return "categorical" if unique_count < 20 else "text"
+
+class DistinctCounter:
+    """
+    Distinct non-null values of a column, counted chunk by chunk.
+    64-bit hashes of the values seen are kept exactly up to `exact_limit`
+    (8 bytes each), after which they seed a HyperLogLog of fixed size.
+    """
+
+    def __init__(self, exact_limit: int = PROFILE_EXACT_DISTINCT):
+        self.exact_limit = exact_limit
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.sketch: Optional[HyperLogLog] = None
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna()
+        if len(values) == 0:
+            return
+        if pd.api.types.is_float_dtype(values.dtype):
+            # -0.0 and 0.0 are one value, as for nunique, but hash differently
+            values = values + 0.0
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        if self.sketch is not None:
+            self.sketch.update(hashes)
+            return
+        self.hashes = np.union1d(self.hashes, hashes)
+        if len(self.hashes) > self.exact_limit:
+            # The hashes stand in for the values seen so far
+            self.sketch = HyperLogLog()
+            self.sketch.update(self.hashes)
+            self.hashes = np.empty(0, dtype=np.uint64)
+
+    def count(self) -> int:
+        return self.sketch.estimate() if self.sketch is not None else len(self.hashes)
+
+class ColumnProfiler:
+    """
+    Single-pass column profiler.
+    Null counts, min/max, distinct counts, samples and type probes are
+    accumulated chunk by chunk, so a dataset can be profiled without ever
+    being assembled in memory.
+    """
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE, probe_size: int = TYPE_PROBE_SIZE):
+        self.sample_size = sample_size
+        self.probe_size = probe_size
+        self.num_rows = 0
+        self.missing_counts: Dict[str, int] = {}
+        self.minimums: Dict[str, Any] = {}
+        self.maximums: Dict[str, Any] = {}
+        self.probes: Dict[str, List[Any]] = {}
+        self.distinct: Dict[str, DistinctCounter] = {}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Fold one chunk of rows into the running profile"""
+        self.num_rows += len(chunk)
+
+        for col, count in chunk.isna().sum().items():
+            self.missing_counts[col] = self.missing_counts.get(col, 0) + int(count)
+
+        for col in chunk.columns:
+            self.distinct.setdefault(col, DistinctCounter()).update(chunk[col])
+
+        # Reduce min/max one dtype block at a time so integers are not upcast to float
+        ordered = chunk.select_dtypes(include=[np.number, 'datetime'])
+        if len(ordered) > 0:
+            for cols in ordered.columns.groupby(ordered.dtypes).values():
+                block = ordered[cols]
+                for col, value in block.min().items():
+                    if not pd.isna(value):
+                        current = self.minimums.get(col)
+                        self.minimums[col] = value if current is None else min(current, value)
+                for col, value in block.max().items():
+                    if not pd.isna(value):
+                        current = self.maximums.get(col)
+                        self.maximums[col] = value if current is None else max(current, value)
+
+        # Samples and datetime probes only need the first non-null values, which
+        # almost always sit in the first rows of the first chunk
+        head = chunk.head(self.probe_size)
+        for col in chunk.columns:
+            probe = self.probes.setdefault(col, [])
+            needed = self.probe_size - len(probe)
+            if needed <= 0:
+                continue
+            values = head[col].dropna()
+            if len(values) < needed and len(chunk) > len(head):
+                values = chunk[col].dropna()
+            probe.extend(values.head(needed).tolist())
+
+    def retype(self, columns: List[str]) -> None:
+        """
+        Columns whose chunks disagreed on dtype are converted; their distinct
+        counts are rebuilt from the converted chunks with recount()
+        """
+        for col in columns:
+            self.distinct[col] = DistinctCounter()
+
+    def retype_as_text(self, columns: List[str]) -> None:
+        """Columns whose chunks disagreed on dtype end up as text; keep their probes consistent"""
+        self.retype(columns)
+        for col in columns:
+            self.probes[col] = [str(v) for v in self.probes.get(col, [])]
+
+    def recount(self, chunk: pd.DataFrame, columns: List[str]) -> None:
+        """Count the distinct values of retyped columns in one converted chunk"""
+        for col in columns:
+            self.distinct[col].update(chunk[col])
+
+    def finalize(self, dtypes: pd.Series) -> DatasetProfile:
+        """Build the dataset profile once all chunks have been seen; dtypes are the final column dtypes"""
+        columns = []
+        for col, dtype in dtypes.items():
+            probe = self.probes.get(col, [])
+            missing_count = self.missing_counts.get(col, 0)
+            missing_pct = (missing_count / self.num_rows) * 100 if self.num_rows else 0.0
+            counter = self.distinct.get(col)
+            # An estimated count is kept within the number of values there are
+            unique_count = min(counter.count(), self.num_rows - missing_count) if counter is not None else 0
+            # Min/max are tracked for the numeric and datetime columns update() reduces
+            ordered = (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+                       or pd.api.types.is_datetime64_any_dtype(dtype))
+
+            columns.append(ColumnInfo(
+                name=str(col),
+                dtype=str(dtype),
+                semantic_type=infer_semantic_type(dtype, unique_count, self.num_rows, probe),
+                missing_count=missing_count,
+                missing_percentage=round(missing_pct, 2),
+                unique_count=unique_count,
+                sample_values=[safe_serialize(v) for v in probe[:self.sample_size]],
+                min_value=safe_serialize(self.minimums.get(col)) if ordered else None,
+                max_value=safe_serialize(self.maximums.get(col)) if ordered else None
+            ))
+
+        return DatasetProfile(num_rows=self.num_rows, columns=columns)
+
+def profile_dataframe(df: pd.DataFrame) -> DatasetProfile:
+    """Profile an in-memory DataFrame in one pass"""
+    profiler = ColumnProfiler()
+    profiler.update(df)
+    return profiler.finalize(df.dtypes)
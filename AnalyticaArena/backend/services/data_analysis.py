@@ -1,45 +1,227 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional
 from scipy import stats
 import json
+import os
+
+from models.dataset_model import DatasetProfile
+from services.sketches import HyperLogLog, KLLSketch, TopKSketch, compute_sketched_summaries
+from services.prompt_builder import PROMPT_TOKEN_BUDGET, rank_columns, build_insight_sections
+
+STATS_BLOCK_MB = float(os.getenv("STATS_BLOCK_MB", 64))  # float64 working copy per block of columns
+APPROX_ROW_THRESHOLD = int(os.getenv("APPROX_ROW_THRESHOLD", 1000000))
+APPROX_CHUNK_ROWS = int(os.getenv("APPROX_CHUNK_ROWS", 100000))
+SKETCH_KLL_K = int(os.getenv("SKETCH_KLL_K", 200))
+SKETCH_HLL_PRECISION = int(os.getenv("SKETCH_HLL_PRECISION", 14))
+SKETCH_TOP_K = int(os.getenv("SKETCH_TOP_K", 64))
+STATISTIC_KEYS = ["column", "mean", "median", "std", "min", "max", "q25", "q75", "mode"]
+
+def _linear_quantile(sorted_block: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Per-column linear-interpolated quantile of NaN-last sorted columns (same arithmetic as numpy.percentile)"""
+    positions = np.arange(sorted_block.shape[1])
+    virtual = counts * q + (1 + q * -1) - 1
+    lower = np.floor(virtual)
+    gamma = virtual - lower
+    lower = np.clip(lower.astype(np.int64), 0, np.maximum(counts - 1, 0))
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    a = sorted_block[lower, positions]
+    b = sorted_block[upper, positions]
+    diff = b - a
+    return np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+
+def _sorted_mode(sorted_col: np.ndarray) -> float:
+    """Smallest most frequent value of a sorted column without NaNs"""
+    run_starts = np.flatnonzero(np.concatenate(([True], sorted_col[1:] != sorted_col[:-1])))
+    run_lengths = np.diff(np.append(run_starts, len(sorted_col)))
+    return float(sorted_col[run_starts[np.argmax(run_lengths)]])
+
+def compute_numeric_summaries(numeric_df: pd.DataFrame,
+                              block_bytes: int = int(STATS_BLOCK_MB * 1024 * 1024)) -> List[Dict[str, Any]]:
+    """
+    Summary statistics for every numeric column in a few matrix-wide passes.
+    Columns are processed in blocks sized so their float64 copy stays within
+    `block_bytes`. Each block is sorted in place, min, max, quantiles and mode
+    are read from the sorted columns, and the mean and variance are then
+    computed in place on the same buffer, so a block needs only its copy
+    and a boolean mask.
+    """
+    summaries = []
+    columns = list(numeric_df.columns)
+    block_columns = max(1, block_bytes // max(1, len(numeric_df) * 8))
+    
+    for start in range(0, len(columns), block_columns):
+        block_cols = columns[start:start + block_columns]
+        values = np.asfortranarray(
+            numeric_df[block_cols].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        )
+        
+        # Always a copy, as the block is sorted in place. NaNs sort to the end,
+        # so the first `count` rows of each column hold its values
+        values.sort(axis=0)
+        present = np.isnan(values)
+        np.logical_not(present, out=present)
+        counts = present.sum(axis=0)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            q25 = _linear_quantile(values, counts, 0.25)
+            medians = _linear_quantile(values, counts, 0.5)
+            q75 = _linear_quantile(values, counts, 0.75)
+        
+        # Everything read from the sorted columns is taken before the buffer is reused
+        minimums = [float(values[0, j]) if counts[j] else None for j in range(len(block_cols))]
+        maximums = [float(values[counts[j] - 1, j]) if counts[j] else None for j in range(len(block_cols))]
+        modes = [_sorted_mode(values[:counts[j], j]) if counts[j] else None for j in range(len(block_cols))]
+        for j, count in enumerate(counts):
+            if count and count % 2 == 0:
+                medians[j] = (values[count // 2 - 1, j] + values[count // 2, j]) / 2
+        
+        # Turn the sorted values into squared deviations in place for the variance
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = values.sum(axis=0, where=present) / counts
+            np.subtract(values, means, out=values, where=present)
+            np.multiply(values, values, out=values, where=present)
+            stds = np.sqrt(values.sum(axis=0, where=present) / (counts - 1))
+        num_rows = len(values)
+        del values, present
+        
+        for j, col in enumerate(block_cols):
+            count = int(counts[j])
+            summary = {"column": col, "count": count, "null_count": num_rows - count}
+            if count > 0:
+                summary.update({
+                    "mean": float(means[j]),
+                    "median": float(medians[j]),
+                    "std": float(stds[j]) if count > 1 else float("nan"),
+                    "min": minimums[j],
+                    "max": maximums[j],
+                    "q25": float(q25[j]),
+                    "q75": float(q75[j]),
+                    "mode": modes[j]
+                })
+            summaries.append(summary)
+    
+    return summaries
 
 class DataAnalyzer:
     """Comprehensive data analysis and profiling"""
     
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, profile: Optional[DatasetProfile] = None,
+                 approximate: Optional[bool] = None):
         self.df = df
+        self.profile = profile
+        # Large datasets switch to chunked sketches unless the caller decides explicitly
+        self.approximate = len(df) > APPROX_ROW_THRESHOLD if approximate is None else approximate
+        # Memoized per-column summaries shared by every analysis method
+        self._summaries: Dict[str, Any] = {}
+        self._top_k_errors: Dict[str, int] = {}
+    
+    def _memoize(self, key: Any, compute):
+        if key not in self._summaries:
+            self._summaries[key] = compute()
+        return self._summaries[key]
+    
+    def _chunks(self):
+        for start in range(0, len(self.df), APPROX_CHUNK_ROWS):
+            yield self.df.iloc[start:start + APPROX_CHUNK_ROWS]
+    
+    def numeric_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """Nulls, moments and quantiles of every numeric column, computed once"""
+        def compute():
+            numeric_df = self.df.select_dtypes(include=[np.number])
+            if self.approximate:
+                summaries = compute_sketched_summaries(numeric_df, APPROX_CHUNK_ROWS, SKETCH_KLL_K, SKETCH_TOP_K)
+            else:
+                summaries = compute_numeric_summaries(numeric_df)
+            return {summary["column"]: summary for summary in summaries}
+        return self._memoize("numeric", compute)
+    
+    def null_counts(self) -> pd.Series:
+        """Missing values per column, computed once"""
+        def compute():
+            if self.approximate:
+                # Same exact counts, without materializing a full boolean frame
+                return sum((chunk.isna().sum() for chunk in self._chunks()), pd.Series(0, index=self.df.columns))
+            return self.df.isna().sum()
+        return self._memoize("nulls", compute)
+    
+    def value_counts(self, column: str) -> pd.Series:
+        """Value counts of a column (heavy hitters only in approximate mode), computed once"""
+        def compute():
+            if self.approximate:
+                sketch = TopKSketch(SKETCH_TOP_K)
+                for chunk in self._chunks():
+                    sketch.update(chunk[column])
+                self._top_k_errors[column] = sketch.max_error
+                return sketch.top()
+            return self.df[column].value_counts()
+        return self._memoize(("value_counts", column), compute)
+    
+    def unique_counts(self) -> pd.Series:
+        """Distinct values per column (HyperLogLog estimates in approximate mode), computed once"""
+        def compute():
+            if not self.approximate:
+                return self.df.nunique()
+            sketches = {col: HyperLogLog(SKETCH_HLL_PRECISION) for col in self.df.columns}
+            for chunk in self._chunks():
+                for col in self.df.columns:
+                    sketches[col].update(chunk[col].dropna().to_numpy())
+            return pd.Series({col: sketch.estimate() for col, sketch in sketches.items()})
+        return self._memoize("unique", compute)
+    
+    def approximation_report(self) -> Optional[Dict[str, Any]]:
+        """Error bounds of the sketches used, or None when every figure is exact"""
+        if not self.approximate:
+            return None
+        return {
+            "mode": "approximate",
+            "row_threshold": APPROX_ROW_THRESHOLD,
+            "chunk_rows": APPROX_CHUNK_ROWS,
+            "quantile_rank_error": round(KLLSketch(SKETCH_KLL_K).rank_error, 5),
+            "distinct_count_relative_error": round(HyperLogLog(SKETCH_HLL_PRECISION).relative_error, 5),
+            "top_k_count_error": dict(self._top_k_errors),
+            "exact": ["count", "mean", "std", "min", "max", "missing_values", "duplicates", "outlier_counts"],
+            "estimated": ["median", "q25", "q75", "mode", "outlier_bounds", "distinct_counts", "imbalance"]
+        }
+    
+    def row_hashes(self) -> pd.Series:
+        """64-bit hash of every row, computed once and reused for all duplicate checks"""
+        return self._memoize("row_hashes", lambda: pd.util.hash_pandas_object(self.df, index=False))
+    
+    def duplicate_mask(self) -> pd.Series:
+        """True for rows that repeat an earlier row"""
+        return self._memoize("duplicates", lambda: self.row_hashes().duplicated())
+    
+    def get_duplicate_groups(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Groups of identical rows (by row hash), largest first"""
+        hashes = self.row_hashes()
+        duplicated = hashes[hashes.duplicated(keep=False)]
+        if duplicated.empty:
+            return []
+        
+        positions = pd.Series(np.arange(len(hashes)), index=hashes.index)[duplicated.index]
+        groups = positions.groupby(duplicated.values, sort=False).agg(list)
+        groups = groups.reindex(groups.map(len).sort_values(ascending=False, kind="stable").index)
+        return [
+            {"count": len(rows), "rows": [int(row) for row in rows[:10]]}
+            for rows in groups.head(limit)
+        ]
+    
+    def outlier_bounds(self, column: str) -> Optional[Tuple[float, float]]:
+        """IQR fences of a numeric column derived from the memoized quartiles"""
+        summary = self.numeric_summaries().get(column)
+        if summary is None or summary["count"] == 0:
+            return None
+        iqr = summary["q75"] - summary["q25"]
+        return summary["q25"] - 1.5 * iqr, summary["q75"] + 1.5 * iqr
     
     def get_basic_statistics(self) -> List[Dict[str, Any]]:
         """Calculate basic statistics for numerical columns"""
-        stats_list = []
-        
-        for col in self.df.select_dtypes(include=[np.number]).columns:
-            col_data = self.df[col].dropna()
-            
-            if len(col_data) > 0:
-                stats_dict = {
-                    "column": col,
-                    "mean": float(col_data.mean()),
-                    "median": float(col_data.median()),
-                    "std": float(col_data.std()),
-                    "min": float(col_data.min()),
-                    "max": float(col_data.max()),
-                    "q25": float(col_data.quantile(0.25)),
-                    "q75": float(col_data.quantile(0.75))
-                }
-                
-                # Try to calculate mode
-                try:
-                    mode_val = col_data.mode()
-                    if len(mode_val) > 0:
-                        stats_dict["mode"] = float(mode_val.iloc[0])
-                except:
-                    stats_dict["mode"] = None
-                
-                stats_list.append(stats_dict)
-        
-        return stats_list
+        return [
+            {key: summary[key] for key in STATISTIC_KEYS}
+            for summary in self.numeric_summaries().values()
+            if summary["count"] > 0
+        ]
     
     def detect_outliers(self, column: str) -> Tuple[int, List[float]]:
         """Detect outliers using IQR method"""
@@ -51,12 +233,13 @@ class DataAnalyzer:
         if not pd.api.types.is_numeric_dtype(col_data):
             return 0, []
         
-        q1 = col_data.quantile(0.25)
-        q3 = col_data.quantile(0.75)
-        iqr = q3 - q1
-        
-        lower_bound = q1 - 1.5 * iqr
-        upper_bound = q3 + 1.5 * iqr
+        bounds = self.outlier_bounds(column)
+        if bounds is None:
+            q1 = col_data.quantile(0.25)
+            q3 = col_data.quantile(0.75)
+            iqr = q3 - q1
+            bounds = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+        lower_bound, upper_bound = bounds
         
         outliers = col_data[(col_data < lower_bound) | (col_data > upper_bound)]
         
@@ -67,8 +250,9 @@ class DataAnalyzer:
         issues = []
         
         # Check for missing values
+        null_counts = self.null_counts()
         for col in self.df.columns:
-            missing_count = self.df[col].isna().sum()
+            missing_count = null_counts[col]
             if missing_count > 0:
                 missing_pct = (missing_count / len(self.df)) * 100
                 severity = "high" if missing_pct > 20 else ("medium" if missing_pct > 5 else "low")
@@ -83,7 +267,7 @@ class DataAnalyzer:
                 })
         
         # Check for outliers in numeric columns
-        for col in self.df.select_dtypes(include=[np.number]).columns:
+        for col in self.numeric_summaries():
             outlier_count, outliers = self.detect_outliers(col)
             if outlier_count > 0:
                 outlier_pct = (outlier_count / len(self.df)) * 100
@@ -99,7 +283,7 @@ class DataAnalyzer:
                 })
         
         # Check for duplicates
-        duplicate_count = self.df.duplicated().sum()
+        duplicate_count = self.duplicate_mask().sum()
         if duplicate_count > 0:
             dup_pct = (duplicate_count / len(self.df)) * 100
             severity = "high" if dup_pct > 10 else ("medium" if dup_pct > 2 else "low")
@@ -110,12 +294,13 @@ class DataAnalyzer:
                 "severity": severity,
                 "description": f"{duplicate_count} duplicate rows ({dup_pct:.1f}%)",
                 "count": int(duplicate_count),
-                "percentage": round(dup_pct, 2)
+                "percentage": round(dup_pct, 2),
+                "samples": self.get_duplicate_groups()
             })
         
         # Check for data imbalance in categorical columns
         for col in self.df.select_dtypes(include=['object', 'category']).columns:
-            value_counts = self.df[col].value_counts()
+            value_counts = self.value_counts(col)
             if len(value_counts) > 1:
                 max_pct = (value_counts.iloc[0] / len(self.df)) * 100
                 if max_pct > 80:
@@ -148,39 +333,80 @@ class DataAnalyzer:
         score = max(0, 100 - deductions)
         return round(score, 1)
     
-    def get_column_info(self) -> str:
-        """Get formatted column information"""
-        info_lines = []
+    def _column_info_lines(self) -> Dict[str, str]:
+        if self.profile is not None:
+            # Reuse the profile persisted at upload time
+            return {
+                col.name: f"- {col.name}: {col.dtype}, {col.missing_count} missing, {col.unique_count} unique values"
+                for col in self.profile.columns
+            }
+        
+        missing = self.null_counts()
+        unique = self.unique_counts()
+        info_lines = {}
         for col in self.df.columns:
             dtype = str(self.df[col].dtype)
-            missing = self.df[col].isna().sum()
-            unique = self.df[col].nunique()
-            info_lines.append(f"- {col}: {dtype}, {missing} missing, {unique} unique values")
-        return "\n".join(info_lines)
+            info_lines[col] = f"- {col}: {dtype}, {missing[col]} missing, {unique[col]} unique values"
+        return info_lines
+    
+    def _statistics_lines(self, stats: List[Dict[str, Any]]) -> Dict[str, str]:
+        return {
+            stat['column']: (
+                f"- {stat['column']}: mean={stat['mean']:.2f}, "
+                f"median={stat['median']:.2f}, std={stat['std']:.2f}, "
+                f"range=[{stat['min']:.2f}, {stat['max']:.2f}]"
+            )
+            for stat in stats
+        }
+    
+    def _quality_issue_lines(self, issues: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        issue_lines: Dict[str, List[str]] = {}
+        for issue in issues:
+            issue_lines.setdefault(issue['column'], []).append(
+                f"- [{issue['severity'].upper()}] {issue['column']}: {issue['description']}"
+            )
+        return issue_lines
+    
+    def get_column_info(self) -> str:
+        """Get formatted column information"""
+        return "\n".join(self._column_info_lines().values())
     
     def get_statistics_summary(self, stats: List[Dict[str, Any]]) -> str:
         """Format statistics for AI prompt"""
         if not stats:
             return "No numerical columns found"
         
-        summary_lines = []
-        for stat in stats:
-            summary_lines.append(
-                f"- {stat['column']}: mean={stat['mean']:.2f}, "
-                f"median={stat['median']:.2f}, std={stat['std']:.2f}, "
-                f"range=[{stat['min']:.2f}, {stat['max']:.2f}]"
-            )
-        return "\n".join(summary_lines)
+        return "\n".join(self._statistics_lines(stats).values())
     
     def get_quality_issues_summary(self, issues: List[Dict[str, Any]]) -> str:
         """Format quality issues for AI prompt"""
         if not issues:
             return "No significant data quality issues detected"
         
-        issue_lines = []
-        for issue in issues:
-            issue_lines.append(f"- [{issue['severity'].upper()}] {issue['column']}: {issue['description']}")
-        return "\n".join(issue_lines)
+        return "\n".join(line for lines in self._quality_issue_lines(issues).values() for line in lines)
+    
+    def get_prompt_summaries(self, stats: List[Dict[str, Any]], issues: List[Dict[str, Any]],
+                             token_budget: int = PROMPT_TOKEN_BUDGET) -> Dict[str, Any]:
+        """
+        Column info, statistics and quality summaries for the insight prompt,
+        keeping the most informative columns that fit in the token budget
+        """
+        column_lines = self._column_info_lines()
+        columns = list(column_lines)
+        if self.profile is not None:
+            unique_counts = {col.name: col.unique_count for col in self.profile.columns}
+        else:
+            unique_counts = self.unique_counts().to_dict()
+        
+        ranked = rank_columns(columns, len(self.df), unique_counts, stats, issues)
+        return build_insight_sections(
+            columns,
+            ranked,
+            column_lines,
+            self._statistics_lines(stats),
+            self._quality_issue_lines(issues),
+            token_budget
+        )
     
     def calculate_kpis(self) -> Dict[str, Any]:
         """Calculate key performance indicators"""
@@ -189,8 +415,8 @@ class DataAnalyzer:
             "total_columns": int(len(self.df.columns)),
             "numeric_columns": int(len(self.df.select_dtypes(include=[np.number]).columns)),
             "categorical_columns": int(len(self.df.select_dtypes(include=['object', 'category']).columns)),
-            "missing_cells": int(self.df.isna().sum().sum()),
-            "duplicate_rows": int(self.df.duplicated().sum()),
+            "missing_cells": int(self.null_counts().sum()),
+            "duplicate_rows": int(self.duplicate_mask().sum()),
             "memory_usage_mb": round(self.df.memory_usage(deep=True).sum() / (1024 * 1024), 2)
         }
         
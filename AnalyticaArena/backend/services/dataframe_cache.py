@@ -0,0 +1,79 @@
+import pandas as pd
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+DATAFRAME_CACHE_MB = int(os.getenv("DATAFRAME_CACHE_MB", 512))
+
+class DataFrameCache:
+    """
+    Process-wide LRU cache of parsed DataFrames, bounded by memory size.
+    Entries are keyed by (dataset_id, version) and shared between requests,
+    so callers must treat the returned frames as read-only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, dataset_id: str, version: str) -> Optional[pd.DataFrame]:
+        """Return a cached DataFrame and mark it as most recently used"""
+        key = (dataset_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, dataset_id: str, version: str, df: pd.DataFrame) -> None:
+        """Cache a DataFrame, evicting least recently used entries to stay under budget"""
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+
+        key = (dataset_id, version)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+
+            self._entries[key] = (df, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, dataset_id: str) -> None:
+        """Drop every cached version of a dataset"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == dataset_id]:
+                _, size = self._entries.pop(key)
+                self.current_bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_mb": round(self.current_bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Singleton instance
+dataframe_cache = DataFrameCache(DATAFRAME_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,208 @@
+import asyncio
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import hashlib
+import io
+import os
+from typing import Dict, Any, Optional
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+
+from services.dataframe_cache import dataframe_cache
+from utils.database import get_database
+
+STORAGE_FORMAT = "parquet"
+GRIDFS_BUCKET = "dataset_files"
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", 50000))
+
+def dataframe_to_arrow(df: pd.DataFrame, schema: Optional[pa.Schema] = None) -> pa.Table:
+    """
+    Convert a DataFrame to an Arrow table, coercing mixed-type object columns to strings
+    With `schema`, columns are cast to its types, e.g. an all-null chunk to the type of its column
+    """
+    df = df.rename(columns=str)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Object columns holding mixed Python types (e.g. ints and strings) have no
+        # Arrow equivalent, store them as text like the old JSON blob effectively did
+        df = df.copy()
+        for col in df.select_dtypes(include=['object']).columns:
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    return table if schema is None else table.cast(schema)
+
+class ParquetPayloadWriter:
+    """
+    Build the Parquet payload of a dataset one chunk of rows at a time, so
+    only the compressed output and the current chunk are held in memory.
+    The first table written fixes the schema.
+    """
+
+    def __init__(self):
+        self._sink = io.BytesIO()
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    @property
+    def schema(self) -> Optional[pa.Schema]:
+        return self._writer.schema if self._writer is not None else None
+
+    def write(self, table: pa.Table) -> None:
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._sink, table.schema, compression=PARQUET_COMPRESSION)
+        self._writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_SIZE)
+
+    def close(self) -> bytes:
+        """The finished payload, as serialize_dataframe would return it"""
+        self._writer.close()
+        return self._sink.getvalue()
+
+def serialize_dataframe(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame to compressed Parquet bytes"""
+    writer = ParquetPayloadWriter()
+    writer.write(dataframe_to_arrow(df))
+    return writer.close()
+
+def deserialize_dataframe(payload: bytes) -> pd.DataFrame:
+    """Load a DataFrame back from Parquet bytes"""
+    return pq.read_table(pa.BufferReader(payload)).to_pandas()
+
+def deserialize_json_records(data: str) -> pd.DataFrame:
+    """Load a DataFrame from the JSON records blob of datasets stored before columnar storage"""
+    return pd.read_json(io.StringIO(data), orient='records')
+
+def payload_digest(payload: bytes) -> str:
+    """Content hash of a serialized dataset"""
+    return hashlib.sha256(payload).hexdigest()
+
+def dataframe_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame, for datasets stored before payload digests were recorded"""
+    digest = hashlib.sha256()
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class DatasetStore:
+    """Columnar dataset storage backed by GridFS"""
+
+    def _bucket(self) -> AsyncIOMotorGridFSBucket:
+        return AsyncIOMotorGridFSBucket(get_database(), bucket_name=GRIDFS_BUCKET)
+
+    async def ensure_indexes(self) -> None:
+        """Index used to find earlier uploads of the same file"""
+        await get_database().datasets.create_index([("user_id", 1), ("source_sha256", 1)])
+
+    async def save(self, payload: bytes, filename: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store Parquet bytes produced by serialize_dataframe in GridFS
+        Returns: storage descriptor to embed in the dataset document
+        """
+        # `refs` counts the dataset documents sharing this file, see link()
+        file_id = await self._bucket().upload_from_stream(
+            filename,
+            payload,
+            metadata={"format": STORAGE_FORMAT, "refs": 1}
+        )
+        return {
+            "format": STORAGE_FORMAT,
+            "file_id": file_id,
+            "size_bytes": len(payload),
+            "sha256": sha256 or payload_digest(payload)
+        }
+
+    async def load(self, dataset: Dict[str, Any]) -> pd.DataFrame:
+        """Load the DataFrame for a dataset document, reading through the DataFrame cache"""
+        cache_id = self.cache_id(dataset)
+        version = self.version(dataset)
+
+        df = dataframe_cache.get(cache_id, version)
+        if df is not None:
+            return df
+
+        # Decode in a thread so the event loop keeps serving requests; Parquet
+        # decoding releases the GIL, and a worker process would have to pickle
+        # the whole frame back
+        storage = dataset.get("storage")
+        if storage is None:
+            # Datasets uploaded before columnar storage keep a JSON records blob
+            df = await asyncio.to_thread(deserialize_json_records, dataset["data"])
+        else:
+            stream = await self._bucket().open_download_stream(storage["file_id"])
+            payload = await stream.read()
+            df = await asyncio.to_thread(deserialize_dataframe, payload)
+
+        dataframe_cache.put(cache_id, version, df)
+        return df
+
+    @staticmethod
+    def cache_id(dataset: Dict[str, Any]) -> str:
+        """DataFrame cache key; datasets linked to the same stored file share one entry"""
+        storage = dataset.get("storage")
+        if storage is None:
+            return str(dataset["_id"])
+        return f"file:{storage['file_id']}"
+
+    @staticmethod
+    def version(dataset: Dict[str, Any]) -> str:
+        """Content version of a dataset; changes whenever its stored payload changes"""
+        storage = dataset.get("storage")
+        if storage is None:
+            return "json"
+        return str(storage["file_id"])
+
+    @staticmethod
+    def content_hash(dataset: Dict[str, Any]) -> Optional[str]:
+        """Digest of the stored payload; None for datasets stored before digests were recorded"""
+        storage = dataset.get("storage")
+        if storage is None:
+            return None
+        return storage.get("sha256")
+
+    @classmethod
+    def content_key(cls, dataset: Dict[str, Any]) -> str:
+        """Key that changes whenever a dataset's data changes; shared by datasets with identical payloads"""
+        return cls.content_hash(dataset) or f"{cls.cache_id(dataset)}@{cls.version(dataset)}"
+
+    async def link(self, storage: Dict[str, Any]) -> bool:
+        """
+        Take another reference to a stored file for a new dataset document
+        Returns: False if the file has already been deleted
+        """
+        files = get_database()[f"{GRIDFS_BUCKET}.files"]
+        result = await files.update_one(
+            {"_id": storage["file_id"], "metadata.refs": {"$gt": 0}},
+            {"$inc": {"metadata.refs": 1}}
+        )
+        return result.modified_count == 1
+
+    async def delete(self, dataset: Dict[str, Any]) -> None:
+        """Drop a dataset's reference to its stored payload, removing the file and cached DataFrames with the last one"""
+        storage = dataset.get("storage")
+        if storage is None:
+            dataframe_cache.invalidate(self.cache_id(dataset))
+            return
+
+        files = get_database()[f"{GRIDFS_BUCKET}.files"]
+        remaining = await files.find_one_and_update(
+            {"_id": storage["file_id"]},
+            {"$inc": {"metadata.refs": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        # Files stored before reference counting have no refs and a single owner
+        if remaining is not None and remaining["metadata"]["refs"] > 0:
+            return
+
+        dataframe_cache.invalidate(self.cache_id(dataset))
+        try:
+            await self._bucket().delete(storage["file_id"])
+        except NoFile:
+            pass
+
+# Singleton instance
+dataset_store = DatasetStore()
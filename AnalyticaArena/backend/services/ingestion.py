@@ -0,0 +1,209 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import hashlib
+import io
+import os
+import tempfile
+from fastapi import UploadFile
+from typing import Dict, List, Optional, Tuple, Union
+
+from models.dataset_model import DatasetProfile
+from services.column_profiler import ColumnProfiler
+from services.dataset_store import ParquetPayloadWriter, dataframe_to_arrow, serialize_dataframe
+
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY_MB", 8)) * 1024 * 1024
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 50000))
+
+class UploadTooLargeError(Exception):
+    """Raised while streaming an upload that exceeds the size limit"""
+
+class RowLimitExceededError(Exception):
+    """Raised while parsing a dataset that exceeds the row limit"""
+
+class UploadSpool:
+    """
+    Spooled temporary storage for an upload.
+    Bytes stay in memory up to a threshold and then roll over to a named
+    temp file on disk, so the parser can read from a path. A sha256 of the
+    content is computed as it is written.
+    """
+
+    def __init__(self, max_memory: int = UPLOAD_SPOOL_MAX_MEMORY):
+        self.max_memory = max_memory
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self.path: Optional[str] = None
+        self._buffer = io.BytesIO()
+        self._file = None
+
+    def write(self, data: bytes) -> None:
+        if self._file is None and self.size + len(data) > self.max_memory:
+            self._rollover()
+        (self._file or self._buffer).write(data)
+        self._digest.update(data)
+        self.size += len(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def _rollover(self) -> None:
+        self._file = tempfile.NamedTemporaryFile(prefix="analytica-upload-", delete=False)
+        self.path = self._file.name
+        self._file.write(self._buffer.getbuffer())
+        self._buffer = None
+
+    def source(self) -> Union[str, bytes]:
+        """The temp file path, or the bytes themselves while still in memory"""
+        if self._file is not None:
+            self._file.flush()
+            return self.path
+        return self._buffer.getvalue()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self.path)
+            self._file = None
+        self._buffer = None
+
+    def __enter__(self) -> "UploadSpool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+async def spool_upload(file: UploadFile, max_bytes: int) -> UploadSpool:
+    """Stream an upload into a spool in chunks, enforcing the size limit as bytes arrive"""
+    spool = UploadSpool()
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            if spool.size + len(chunk) > max_bytes:
+                raise UploadTooLargeError(
+                    f"File size exceeds maximum {max_bytes / (1024 * 1024):.0f}MB"
+                )
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    return spool
+
+# A column whose CSV chunks disagree on dtype is converted to this dtype; None means text
+Conversions = Dict[str, Optional[np.dtype]]
+
+def _unified_dtypes(chunk_dtypes: Dict[str, list], mismatched: List[str]) -> Conversions:
+    """
+    Dtypes for columns whose chunks were inferred differently, as pd.concat would
+    combine them: integers and floats widen to a common numeric dtype, anything
+    else (e.g. text in one chunk, all-empty floats in another) becomes text
+    """
+    conversions = {}
+    for col, dtypes in chunk_dtypes.items():
+        if len(dtypes) > 1 or col in mismatched:
+            numeric = all(isinstance(d, np.dtype) and d.kind in "iuf" for d in dtypes)
+            conversions[col] = np.result_type(*dtypes) if numeric and len(dtypes) > 1 else None
+    return conversions
+
+def _convert_chunk(chunk: pd.DataFrame, conversions: Conversions) -> pd.DataFrame:
+    for col, dtype in conversions.items():
+        if dtype is not None:
+            chunk[col] = chunk[col].astype(dtype)
+        else:
+            values = chunk[col].to_numpy(dtype=object, na_value=np.nan)
+            chunk[col] = pd.Series([v if pd.isna(v) else str(v) for v in values], index=chunk.index, dtype=object)
+    return chunk
+
+def _unified_schema(table: pa.Table, conversions: Conversions) -> pa.Schema:
+    """Arrow schema every converted chunk is cast to, so an all-empty chunk cannot change a column's type"""
+    schema = table.schema
+    for col, dtype in conversions.items():
+        index = schema.get_field_index(str(col))
+        arrow_type = pa.string() if dtype is None else pa.from_numpy_dtype(dtype)
+        schema = schema.set(index, pa.field(str(col), arrow_type))
+    return schema
+
+def _read_csv_chunks(source: Union[str, bytes]):
+    return pd.read_csv(io.BytesIO(source) if isinstance(source, bytes) else source, chunksize=CSV_CHUNK_ROWS)
+
+def _ingest_csv(source: Union[str, bytes], max_rows: int) -> Tuple[bytes, DatasetProfile]:
+    profiler = ColumnProfiler()
+    writer = ParquetPayloadWriter()
+    chunk_dtypes: Dict[str, list] = {}
+    mismatched: List[str] = []
+
+    # First pass: profile every chunk and write it straight to Parquet while
+    # all chunks agree on the column types
+    with _read_csv_chunks(source) as reader:
+        for chunk in reader:
+            if profiler.num_rows + len(chunk) > max_rows:
+                raise RowLimitExceededError(f"Dataset exceeds maximum row limit of {max_rows}")
+            profiler.update(chunk)
+            for col, dtype in chunk.dtypes.items():
+                dtypes = chunk_dtypes.setdefault(col, [])
+                if dtype not in dtypes:
+                    dtypes.append(dtype)
+            if any(len(dtypes) > 1 for dtypes in chunk_dtypes.values()) or mismatched:
+                continue
+            table = dataframe_to_arrow(chunk)
+            if writer.schema is not None and not table.schema.equals(writer.schema, check_metadata=False):
+                mismatched = [f.name for f in table.schema if f.type != writer.schema.field(f.name).type]
+                continue
+            writer.write(table)
+    if not chunk_dtypes:
+        raise ValueError("File contains no data")
+
+    dtypes = pd.Series({col: chunk_types[0] for col, chunk_types in chunk_dtypes.items()}, dtype=object)
+    conversions = _unified_dtypes(chunk_dtypes, mismatched)
+    if not conversions:
+        return writer.close(), profiler.finalize(dtypes)
+
+    # Second pass, only when chunks disagreed: convert those columns in every chunk
+    profiler.retype([col for col, dtype in conversions.items() if dtype is not None])
+    profiler.retype_as_text([col for col, dtype in conversions.items() if dtype is None])
+    writer = ParquetPayloadWriter()
+    schema = None
+    with _read_csv_chunks(source) as reader:
+        for chunk in reader:
+            chunk = _convert_chunk(chunk, conversions)
+            profiler.recount(chunk, list(conversions))
+            table = dataframe_to_arrow(chunk)
+            schema = schema or _unified_schema(table, conversions)
+            writer.write(table.cast(schema))
+
+    # Text columns get whichever string dtype the stored Parquet loads back as
+    loaded = writer.schema.empty_table().to_pandas().dtypes
+    for col, dtype in conversions.items():
+        dtypes[col] = loaded[str(col)] if dtype is None else dtype
+    return writer.close(), profiler.finalize(dtypes)
+
+def parse_upload(source: Union[str, bytes], file_ext: str,
+                 max_rows: int) -> Tuple[bytes, DatasetProfile]:
+    """
+    Parse a spooled upload into its Parquet payload and column profile.
+    CSV files are read in chunks, and each chunk is profiled and written to
+    Parquet as it arrives, so the whole dataset is never held in memory and
+    the row limit is enforced early.
+    """
+    if file_ext == '.csv':
+        return _ingest_csv(source, max_rows)
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    if file_ext in ['.xlsx', '.xls']:
+        df = pd.read_excel(source)
+    elif file_ext == '.json':
+        df = pd.read_json(source)
+    else:
+        raise ValueError("Unsupported file type")
+
+    if len(df) > max_rows:
+        raise RowLimitExceededError(f"Dataset exceeds maximum row limit of {max_rows}")
+    df.columns = df.columns.map(str)
+    profiler = ColumnProfiler()
+    profiler.update(df)
+    return serialize_dataframe(df), profiler.finalize(df.dtypes)
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from utils.database import get_database
+from utils.workers import PoolSaturatedError
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", 2))  # doubled for each failed attempt
+# A running job's owner refreshes its heartbeat this often; a claim not refreshed
+# within the lease is taken to belong to a stopped process and is requeued
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 15))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 120))
+
+# progress(stage, fraction) reports how far a running job has got
+Progress = Callable[[str, float], None]
+Handler = Callable[[Dict[str, Any], Progress], Awaitable[Optional[Dict[str, Any]]]]
+
+class JobQueue:
+    """
+    In-process background job queue persisted in the `jobs` collection.
+    Jobs are claimed atomically from Mongo, so a job is run once even if
+    several processes share the database. A claim records its owner and is
+    kept alive by a heartbeat; running jobs whose heartbeat has lapsed,
+    such as those of a process that stopped, are requeued by whichever
+    process notices first.
+    """
+
+    def __init__(self, workers: int, max_attempts: int, retry_base_seconds: float,
+                 heartbeat_seconds: float, lease_seconds: float):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, Handler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._reclaimer: Optional[asyncio.Task] = None
+        self._retries: Dict[ObjectId, asyncio.TimerHandle] = {}
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.reclaimed = 0
+
+    def register(self, kind: str, handler: Handler) -> None:
+        """Run jobs of `kind` with `await handler(job, progress)`; its result is stored on the job"""
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        db = get_database()
+        await db.jobs.create_index([("user_id", 1), ("dataset_id", 1), ("created_at", -1)])
+        await db.jobs.create_index([("status", 1), ("heartbeat_at", 1)])
+
+        async for job in db.jobs.find({"status": "queued"}, {"_id": 1}).sort("created_at", 1):
+            self._queue.put_nowait(job["_id"])
+
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+        self._reclaimer = asyncio.ensure_future(self._reclaim_loop())
+
+    async def stop(self) -> None:
+        tasks = self._tasks + ([self._reclaimer] if self._reclaimer else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._reclaimer = None
+        # Jobs waiting to be retried stay queued in Mongo and are picked up on the next start
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        # Jobs cut short by the shutdown are released rather than left for their lease to lapse
+        await get_database().jobs.update_many(
+            {"status": "running", "owner": self.owner},
+            {"$set": {"status": "queued", "stage": None, "owner": None}}
+        )
+        self._queue = None
+
+    async def enqueue(self, kind: str, user_id: str, dataset_id: str,
+                      params: Optional[Dict[str, Any]] = None) -> str:
+        """Persist a job and hand it to a worker; returns the job id"""
+        db = get_database()
+        job = {
+            "kind": kind,
+            "user_id": user_id,
+            "dataset_id": dataset_id,
+            "params": params or {},
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None
+        }
+        result = await db.jobs.insert_one(job)
+        if self._queue is not None:
+            self._queue.put_nowait(result.inserted_id)
+        return str(result.inserted_id)
+
+    async def _reclaim_loop(self) -> None:
+        while True:
+            try:
+                await self.reclaim_stale()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reclaiming stale jobs failed: {e}")
+            await asyncio.sleep(self.lease_seconds / 2)
+
+    async def reclaim_stale(self) -> int:
+        """
+        Requeue running jobs whose heartbeat is older than the lease, failing
+        those already out of attempts; returns the number requeued
+        """
+        db = get_database()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        # Claims made before heartbeats were recorded have none
+        stale = {"status": "running", "$or": [{"heartbeat_at": {"$lt": cutoff}}, {"heartbeat_at": None}]}
+
+        await db.jobs.update_many(
+            {**stale, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "error": "Interrupted too many times", "finished_at": datetime.utcnow()}}
+        )
+        requeued = 0
+        async for job in db.jobs.find(stale, {"_id": 1}):
+            # Matching on the stale heartbeat again means a claim refreshed meanwhile is left alone
+            result = await db.jobs.update_one(
+                {"_id": job["_id"], **stale},
+                {"$set": {"status": "queued", "stage": None, "owner": None}}
+            )
+            if result.modified_count and self._queue is not None:
+                self._queue.put_nowait(job["_id"])
+                requeued += 1
+        if requeued:
+            logger.warning(f"Requeued {requeued} jobs whose owner stopped sending heartbeats")
+        self.reclaimed += requeued
+        return requeued
+
+    async def _heartbeat(self, job_id: ObjectId) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            await get_database().jobs.update_one(
+                {"_id": job_id, "owner": self.owner},
+                {"$set": {"heartbeat_at": datetime.utcnow()}}
+            )
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} crashed: {e}")
+
+    async def _run(self, job_id: ObjectId) -> None:
+        db = get_database()
+        job = await db.jobs.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {
+                "$set": {"status": "running", "owner": self.owner,
+                         "started_at": datetime.utcnow(), "heartbeat_at": datetime.utcnow()},
+                "$inc": {"attempts": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            # Claimed by another worker or process, or removed
+            return
+
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            await self._finish(job_id, "failed", error=f"Unknown job kind: {job['kind']}")
+            return
+
+        # Progress writes are fire-and-forget so handlers can report synchronously
+        updates = []
+
+        def progress(stage: str, fraction: float) -> None:
+            updates.append(asyncio.ensure_future(db.jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"stage": stage}, "$max": {"progress": fraction}}
+            )))
+
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            result = await handler(job, progress)
+        except PoolSaturatedError as e:
+            await asyncio.gather(*updates, return_exceptions=True)
+            await self._retry(job, e.retry_after, str(e))
+            return
+        except Exception as e:
+            await asyncio.gather(*updates, return_exceptions=True)
+            logger.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+            if job["attempts"] < self.max_attempts:
+                await self._retry(job, self.retry_base_seconds * 2 ** (job["attempts"] - 1), str(e))
+            else:
+                self.failed += 1
+                await self._finish(job_id, "failed", error=str(e))
+            return
+        finally:
+            heartbeat.cancel()
+
+        await asyncio.gather(*updates, return_exceptions=True)
+        self.completed += 1
+        await self._finish(job_id, "complete", result=result)
+
+    async def _retry(self, job: Dict[str, Any], delay: float, error: str) -> None:
+        """
+        Put a job back in the queue after `delay` seconds. The wait is a timer,
+        not a sleep, so the worker moves on to other jobs in the meantime.
+        """
+        self.retried += 1
+        await get_database().jobs.update_one(
+            {"_id": job["_id"], "owner": self.owner},
+            {"$set": {"status": "queued", "error": error, "owner": None}}
+        )
+        job_id = job["_id"]
+        self._retries[job_id] = asyncio.get_running_loop().call_later(delay, self._requeue, job_id)
+
+    def _requeue(self, job_id: ObjectId) -> None:
+        self._retries.pop(job_id, None)
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+
+    async def _finish(self, job_id: ObjectId, status: str,
+                      result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        update = {"status": status, "finished_at": datetime.utcnow(), "error": error}
+        if status == "complete":
+            update.update({"result": result, "progress": 1.0, "stage": "complete"})
+        # A job whose claim lapsed and was taken over is left to its new owner
+        await get_database().jobs.update_one({"_id": job_id, "owner": self.owner}, {"$set": update})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "waiting_retry": len(self._retries),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "reclaimed": self.reclaimed
+        }
+
+# Singleton instance
+job_queue = JobQueue(JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_SECONDS,
+                     JOB_HEARTBEAT_SECONDS, JOB_LEASE_SECONDS)
@@ -0,0 +1,136 @@
+"""Column ranking and token budgeting for prompts built from wide datasets"""
+import math
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 3000))
+NL_TO_CODE_TOKEN_BUDGET = int(os.getenv("NL_TO_CODE_TOKEN_BUDGET", 1500))
+
+# Rough chars-per-token ratio for English text and identifiers
+CHARS_PER_TOKEN = 4
+
+SEVERITY_WEIGHTS = {"high": 3.0, "medium": 2.0, "low": 1.0}
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough for budgeting, not for billing"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def omitted_note(count: int) -> str:
+    return f"- ... {count} lower-ranked columns omitted"
+
+def rank_columns(columns: List[str], num_rows: int, unique_counts: Dict[str, int],
+                 statistics: Optional[List[Dict[str, Any]]] = None,
+                 quality_issues: Optional[List[Dict[str, Any]]] = None,
+                 question: Optional[str] = None) -> List[str]:
+    """
+    Order columns from most to least informative.
+    Columns named in the question come first; the rest are scored by quality
+    issues (weighted by severity), relative spread of numeric values and
+    cardinality, where constants and near-unique identifiers say least.
+    """
+    scores = {col: 0.0 for col in columns}
+
+    for issue in quality_issues or []:
+        if issue["column"] in scores:
+            scores[issue["column"]] += SEVERITY_WEIGHTS.get(issue["severity"], 1.0)
+
+    # Coefficient of variation, converted to a percentile rank so scales are comparable
+    spreads = []
+    for stat in statistics or []:
+        if stat["column"] in scores and stat.get("std") is not None and not math.isnan(stat["std"]):
+            spreads.append((stat["std"] / (abs(stat["mean"]) + 1e-12), stat["column"]))
+    spreads.sort()
+    for position, (_, col) in enumerate(spreads):
+        scores[col] += (position + 1) / len(spreads)
+
+    for col in columns:
+        unique = unique_counts.get(col, 0)
+        ratio = unique / num_rows if num_rows else 0
+        if unique <= 1:
+            continue
+        if ratio > 0.9:
+            scores[col] += 0.2
+        elif unique < 20:
+            scores[col] += 1.0
+        else:
+            scores[col] += 0.6
+
+    if question:
+        lowered = question.lower()
+        for col in columns:
+            if str(col).lower() in lowered:
+                scores[col] += 100.0
+
+    # Stable sort keeps file order among equally informative columns
+    return sorted(columns, key=lambda col: -scores[col])
+
+def select_columns(ranked: List[str], costs: Dict[str, int], budget: int) -> List[str]:
+    """Take columns in rank order while their combined cost fits the budget"""
+    selected = []
+    spent = 0
+    for col in ranked:
+        if spent + costs[col] > budget:
+            break
+        selected.append(col)
+        spent += costs[col]
+    return selected
+
+def build_insight_sections(columns: List[str], ranked: List[str],
+                           column_lines: Dict[str, str],
+                           statistics_lines: Dict[str, str],
+                           issue_lines: Dict[str, List[str]],
+                           budget: int = PROMPT_TOKEN_BUDGET) -> Dict[str, Any]:
+    """
+    Fit the column info, statistics and quality sections of the insight prompt
+    into a token budget. A column is kept or dropped across all three sections
+    together; kept columns stay in file order and dataset-wide issues are
+    always kept.
+    """
+    costs = {
+        col: estimate_tokens(column_lines.get(col, ""))
+        + estimate_tokens(statistics_lines.get(col, ""))
+        + sum(estimate_tokens(line) for line in issue_lines.get(col, []))
+        for col in columns
+    }
+    kept = set(select_columns(ranked, costs, budget))
+    omitted = len(columns) - len(kept)
+
+    def section(lines: List[str], empty: str, has_omitted: bool) -> str:
+        if has_omitted:
+            lines = lines + [omitted_note(omitted)]
+        return "\n".join(lines) if lines else empty
+
+    stats_columns = [col for col in columns if col in statistics_lines]
+    issue_columns = [col for col in issue_lines if col not in costs or col in kept]
+    return {
+        "column_info": section(
+            [column_lines[col] for col in columns if col in kept], "", omitted > 0
+        ),
+        "statistics_summary": section(
+            [statistics_lines[col] for col in stats_columns if col in kept],
+            "No numerical columns found",
+            any(col not in kept for col in stats_columns)
+        ),
+        "quality_issues_summary": section(
+            [line for col in issue_columns for line in issue_lines[col]],
+            "No significant data quality issues detected",
+            any(col in costs and col not in kept for col in issue_lines)
+        ),
+        "columns_kept": [col for col in columns if col in kept],
+        "columns_omitted": omitted
+    }
+
+def budget_column_list(columns: List[str], column_types: Dict[str, str], ranked: List[str],
+                       budget: int = NL_TO_CODE_TOKEN_BUDGET) -> Tuple[List[str], Dict[str, str], int]:
+    """Trim the column list and type map of the NL-to-code prompt to a token budget"""
+    costs = {
+        col: estimate_tokens(f"{col}, ") + estimate_tokens(f"'{col}': '{column_types.get(col)}', ")
+        for col in columns
+    }
+    if sum(costs.values()) <= budget:
+        return columns, column_types, 0
+
+    kept = set(select_columns(ranked, costs, budget))
+    kept_columns = [col for col in columns if col in kept]
+    kept_types = {col: kind for col, kind in column_types.items() if col in kept}
+    return kept_columns, kept_types, len(columns) - len(kept_columns)
@@ -0,0 +1,96 @@
+import ast
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+QUERY_RESULT_CACHE_MB = int(os.getenv("QUERY_RESULT_CACHE_MB", 64))
+
+def normalize_code(code: str) -> str:
+    """Canonical form of generated code, so formatting and comments do not change its identity (SQL is only stripped)"""
+    try:
+        return ast.unparse(ast.parse(code))
+    except SyntaxError:
+        return code.strip()
+
+class QueryResultCache:
+    """
+    Process-wide LRU cache of chat query results, bounded by serialized size.
+    Entries are keyed by (dataset content key, normalized code hash), so a
+    changed dataset never matches an old entry; results are stored pickled
+    and each hit returns a fresh copy.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(content_key: str, code: str, chart_spec: Optional[Dict[str, Any]] = None,
+            engine: str = "pandas") -> Tuple[str, str]:
+        """Cache key for running `code` on `engine` (and building `chart_spec`) on a dataset's content"""
+        digest = hashlib.sha256(engine.encode("utf-8"))
+        digest.update(normalize_code(code).encode("utf-8"))
+        digest.update(json.dumps(chart_spec, sort_keys=True, default=str).encode("utf-8"))
+        return (content_key, digest.hexdigest())
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Return a copy of a cached result and mark it as most recently used"""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(payload)
+
+    def put(self, key: Tuple[str, str], result: Dict[str, Any]) -> None:
+        """Cache a result, evicting least recently used entries to stay under budget"""
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= len(previous)
+
+            self._entries[key] = payload
+            self.current_bytes += len(payload)
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, content_key: str) -> None:
+        """Drop every cached result for a dataset's content"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == content_key]:
+                self.current_bytes -= len(self._entries.pop(key))
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_mb": round(self.current_bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Singleton instance
+query_result_cache = QueryResultCache(QUERY_RESULT_CACHE_MB * 1024 * 1024)
@@ -1,23 +1,128 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import io
+import os
+import pickle
 import sys
+import time
 from contextlib import redirect_stdout, redirect_stderr
 
+from services.query_planner import query_planner, QueryRejectedError
+
+# How generated code is kept from modifying the dataset: "cow" shares the
+# column buffers under pandas Copy-on-Write, "copy" deep-copies the frame per query
+QUERY_COPY_MODE = os.getenv("QUERY_COPY_MODE", "cow")
+
+# Copy-on-Write is opt-in on pandas 2.x and always on from 3.0
+PANDAS_ALWAYS_COW = int(pd.__version__.split(".")[0]) >= 3
+
+def enable_copy_on_write() -> None:
+    """Turn on pandas Copy-on-Write for this process; call before building the frames queries use"""
+    if not PANDAS_ALWAYS_COW:
+        pd.set_option("mode.copy_on_write", True)
+
+def copy_on_write_enabled() -> bool:
+    return PANDAS_ALWAYS_COW or pd.get_option("mode.copy_on_write") is True
+
+def _datetime_view(values: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    return values.view(dtype)
+
+class _FreezingPickler(pickle.Pickler):
+    """Pickles datetime arrays as int64 views so their buffers go out-of-band too"""
+
+    def reducer_override(self, obj):
+        if isinstance(obj, np.ndarray) and obj.dtype.kind in "mM":
+            return _datetime_view, (obj.view("i8"), obj.dtype)
+        return NotImplemented
+
+class FrameNotFrozenError(Exception):
+    """Raised when some of a frame's column buffers could not be made read-only"""
+
+def writable_columns(df: pd.DataFrame) -> List[str]:
+    """
+    Numpy-backed columns whose buffer generated code could make writeable
+    again (flags.writeable = True succeeds on a view of it)
+    """
+    writable = []
+    for name, values in df.items():
+        if not isinstance(values.dtype, np.dtype):
+            # Extension arrays keep their buffers behind private attributes
+            continue
+        probe = np.asarray(values.array).view()
+        try:
+            probe.flags.writeable = True
+        except ValueError:
+            continue
+        writable.append(str(name))
+    return writable
+
+def freeze_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copy of `df` whose column buffers generated code cannot write to, for
+    frames shared between queries. Numeric, datetime and categorical
+    buffers are rebuilt on immutable bytes, so even setflags(write=True)
+    fails; object columns, which pickle in-band, each get a read-only copy.
+    Raises FrameNotFrozenError if any column is still writable afterwards.
+    """
+    buffers = []
+    data = io.BytesIO()
+    _FreezingPickler(data, protocol=5, buffer_callback=buffers.append).dump(df)
+    frozen = pickle.loads(data.getvalue(), buffers=[bytes(buffer.raw()) for buffer in buffers])
+    for i, (name, values) in enumerate(list(frozen.items())):
+        if values.dtype == object:
+            column = values.to_numpy(copy=True)
+            column.flags.writeable = False
+            frozen.isetitem(i, pd.Series(column, index=frozen.index, copy=False))
+    writable = writable_columns(frozen)
+    if writable:
+        raise FrameNotFrozenError(f"Columns {writable} could not be made read-only")
+    return frozen
+
 class QueryExecutor:
     """Safely execute AI-generated Pandas code on datasets"""
     
     @staticmethod
-    def execute_query(df: pd.DataFrame, code: str) -> Dict[str, Any]:
+    def protected_frame(df: pd.DataFrame, mode: str = QUERY_COPY_MODE) -> pd.DataFrame:
+        """
+        The frame generated code runs against; nothing the code does to it reaches `df`.
+        Under Copy-on-Write a shallow copy is enough: columns are shared until
+        the code writes to one, and only that column is copied. Writes that
+        bypass Copy-on-Write (raw numpy buffers) are stopped by freeze_frame,
+        which shared frames must go through. Without Copy-on-Write this falls
+        back to a deep copy.
+        """
+        if mode == "cow" and copy_on_write_enabled():
+            return df.copy(deep=False)
+        return df.copy()
+    
+    @staticmethod
+    def execute_query(df: pd.DataFrame, code: str, copy_mode: str = QUERY_COPY_MODE) -> Dict[str, Any]:
         """
         Execute Pandas code in a restricted environment
-        Returns: {success: bool, result: Any, error: str}
+        Returns: {success: bool, result: Any, error: str, plan: dict}
         """
         
+        # Parse, classify and compile once per distinct code string
+        try:
+            plan, cache_hit = query_planner.plan(code)
+        except SyntaxError as e:
+            return QueryExecutor._failure(str(e), None)
+        
+        plan_info = {**plan.summary(), "cache_hit": cache_hit}
+        plan_info["estimated_ms"] = round(plan.estimate_seconds(len(df)) * 1000, 2)
+        
+        # Refuse code estimated to run too long on this many rows
+        try:
+            plan.check(len(df))
+        except QueryRejectedError as e:
+            plan_info["rejected"] = True
+            return QueryExecutor._failure(str(e), plan_info)
+        
         # Create a safe execution environment
         safe_globals = {
             'pd': pd,
-            'df': df.copy(),  # Work on a copy to prevent modifications
+            'df': QueryExecutor.protected_frame(df, copy_mode),  # Modifications never reach the dataset
             '__builtins__': {
                 'print': print,
                 'len': len,
@@ -44,9 +149,11 @@ class QueryExecutor:
             stdout_capture = io.StringIO()
             stderr_capture = io.StringIO()
             
+            start = time.perf_counter()
             with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture):
                 # Execute the code
-                exec(code, safe_globals, safe_locals)
+                exec(plan.compiled, safe_globals, safe_locals)
+            plan_info["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
             
             # Get the result
             result = safe_locals.get('result', None)
@@ -65,16 +172,22 @@ class QueryExecutor:
                 "success": True,
                 "result": result_data,
                 "result_type": type(result).__name__,
-                "error": None
+                "error": None,
+                "plan": plan_info
             }
             
         except Exception as e:
-            return {
-                "success": False,
-                "result": None,
-                "result_type": None,
-                "error": str(e)
-            }
+            return QueryExecutor._failure(str(e), plan_info)
+    
+    @staticmethod
+    def _failure(error: str, plan_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "result": None,
+            "result_type": None,
+            "error": error,
+            "plan": plan_info
+        }
     
     @staticmethod
     def format_result_for_display(result: Any, result_type: str) -> str:
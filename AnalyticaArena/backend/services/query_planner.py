@@ -0,0 +1,382 @@
+"""Static analysis, rewriting and compile caching of generated pandas code"""
+import ast
+import copy
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+QUERY_CODE_CACHE_SIZE = int(os.getenv("QUERY_CODE_CACHE_SIZE", 256))
+QUERY_COST_LIMIT_SECONDS = float(os.getenv("QUERY_COST_LIMIT_SECONDS", 5))
+
+# Kinds of work from cheapest to most expensive, with the estimated seconds
+# per row each costs (measured on pandas 3 and rounded up); quadratic work
+# costs per pair of rows
+ROW_COST_SECONDS = {
+    "vectorized": 2e-8,
+    "groupby": 6e-8,
+    "sort": 1e-7,
+    "elementwise": 2e-7,   # Python function per value: Series.map/apply with a lambda
+    "rowwise": 6e-6,       # Python function per row: DataFrame.apply(axis=1), itertuples, loops
+    "iteration": 4e-5,     # iterrows builds a Series per row
+    "quadratic": 4e-8      # per row pair: a per-row function that scans the frame, cross joins
+}
+KIND_ORDER = list(ROW_COST_SECONDS)
+
+GROUPING_METHODS = {"groupby", "pivot_table", "resample", "rolling", "expanding", "merge", "join", "crosstab"}
+SORTING_METHODS = {"sort_values", "sort_index", "rank", "nlargest", "nsmallest", "drop_duplicates", "duplicated"}
+ELEMENTWISE_METHODS = {"map", "applymap", "apply", "transform", "agg", "aggregate", "filter", "pipe"}
+ROW_ITERATORS = {"iterrows": "iteration", "itertuples": "rowwise", "items": "rowwise", "iteritems": "rowwise"}
+# Iterators that yield columns when called on a DataFrame rather than a Series
+COLUMN_ITERATORS = {"items", "iteritems"}
+# Attributes that reach raw buffers behind Copy-on-Write; private (_name) attributes are refused too
+FORBIDDEN_ATTRIBUTES = {"setflags", "as_strided", "ctypes", "ctypeslib"}
+# Iterating these, or results computed from them, visits columns, groups or distinct values, not rows
+GROUP_ITERABLES = {"columns", "dtypes", "keys", "unique", "value_counts", "groupby", "drop_duplicates",
+                   "pivot_table", "crosstab", "resample", "describe", "agg", "aggregate", "sum", "mean",
+                   "median", "min", "max", "count", "size", "nunique", "std", "var", "first", "last"}
+
+class QueryRejectedError(Exception):
+    """Raised when generated code is estimated to be too expensive to run, or touches forbidden attributes"""
+
+def _is_python_callable(node: ast.AST) -> bool:
+    """Whether a call argument is Python code run per item rather than a pandas/numpy builtin"""
+    return isinstance(node, (ast.Lambda, ast.Name)) and not (
+        isinstance(node, ast.Name) and node.id in ("len", "str", "int", "float", "abs", "round", "sum", "min", "max")
+    )
+
+def _mentions(node: ast.AST, name: str) -> bool:
+    return any(isinstance(child, ast.Name) and child.id == name for child in ast.walk(node))
+
+def _mentions_attribute(node: ast.AST, names: set) -> bool:
+    return any(isinstance(child, ast.Attribute) and child.attr in names for child in ast.walk(node))
+
+def _is_frame(node: ast.AST) -> bool:
+    """Whether an expression is the dataset itself or a column selection of it (`df`, `df[['a', 'b']]`)"""
+    if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.List):
+        node = node.value
+    return isinstance(node, ast.Name) and node.id == "df"
+
+def _is_plain_frame(node: ast.AST) -> bool:
+    """Whether an expression is a bare name or a column selection of one, so evaluating it again is free"""
+    if isinstance(node, ast.Subscript):
+        columns = node.slice.elts if isinstance(node.slice, ast.List) else [node.slice]
+        if not all(isinstance(c, ast.Constant) and isinstance(c.value, str) for c in columns):
+            return False
+        node = node.value
+    return isinstance(node, ast.Name)
+
+def _iterates_columns(iterable: ast.AST) -> bool:
+    """Whether iterating an expression visits the dataset's columns: `df` itself or `df.items()`"""
+    if (isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Attribute)
+            and iterable.func.attr in COLUMN_ITERATORS):
+        iterable = iterable.func.value
+    return _is_frame(iterable)
+
+def _iterates_rows(call: ast.Call) -> bool:
+    """Whether a ROW_ITERATORS call visits rows, not columns (DataFrame.items) or groups (aggregate results)"""
+    return not (_iterates_columns(call) or _mentions_attribute(call.func.value, GROUP_ITERABLES))
+
+def _is_row_iterator(node: ast.AST) -> bool:
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr in ROW_ITERATORS and _iterates_rows(node))
+
+def _forbidden_attributes(tree: ast.AST) -> List[Dict[str, Any]]:
+    """Private and buffer-level attribute accesses, which could write to a shared dataset"""
+    return [
+        {"attribute": node.attr, "line": node.lineno}
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Attribute)
+        and (node.attr.startswith("_") or node.attr in FORBIDDEN_ATTRIBUTES)
+    ]
+
+def _is_row_axis(call: ast.Call) -> bool:
+    for keyword in call.keywords:
+        if keyword.arg == "axis" and isinstance(keyword.value, ast.Constant):
+            return keyword.value.value in (1, "columns")
+    return False
+
+class _RowwiseArithmetic(ast.NodeTransformer):
+    """
+    Rewrite `X.apply(lambda r: <arithmetic on r['col']>, axis=1)` to the
+    equivalent column expression on X, e.g. `X['a'] * X['b'] + 1`.
+    Only bodies built from column lookups, constants, arithmetic, unary
+    operators and single comparisons are rewritten, and only when X is a
+    name or a column selection of one: X is repeated once per column used,
+    so a receiver like `df.sample(5)` or `df.merge(...)` is left alone.
+    """
+
+    SAFE_NODES = (ast.BinOp, ast.UnaryOp, ast.Compare, ast.Constant, ast.Subscript,
+                  ast.Name, ast.Load, ast.operator, ast.unaryop, ast.cmpop)
+
+    def __init__(self):
+        self.rewrites = 0
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        if not (isinstance(node.func, ast.Attribute) and node.func.attr == "apply"
+                and _is_row_axis(node) and len(node.args) == 1 and isinstance(node.args[0], ast.Lambda)):
+            return node
+        lam = node.args[0]
+        if len(lam.args.args) != 1 or len(node.keywords) != 1:
+            return node
+        row = lam.args.args[0].arg
+        if not self._vectorizable(lam.body, row):
+            return node
+
+        frame = node.func.value
+        if not _is_plain_frame(frame):
+            return node
+
+        class Substitute(ast.NodeTransformer):
+            def visit_Subscript(self, sub: ast.Subscript) -> ast.AST:
+                if isinstance(sub.value, ast.Name) and sub.value.id == row:
+                    return ast.Subscript(value=copy.deepcopy(frame), slice=sub.slice, ctx=ast.Load())
+                return self.generic_visit(sub)
+
+        self.rewrites += 1
+        return ast.fix_missing_locations(ast.copy_location(Substitute().visit(lam.body), node))
+
+    def _vectorizable(self, body: ast.AST, row: str) -> bool:
+        for child in ast.walk(body):
+            if not isinstance(child, self.SAFE_NODES):
+                return False
+            if isinstance(child, ast.Compare) and len(child.ops) != 1:
+                return False
+            if isinstance(child, ast.Name) and child.id != row:
+                return False
+            if isinstance(child, ast.Subscript) and not (
+                isinstance(child.value, ast.Name) and child.value.id == row
+                and isinstance(child.slice, ast.Constant) and isinstance(child.slice.value, str)
+            ):
+                return False
+        # A bare column lookup or constant is not worth rewriting
+        return isinstance(body, (ast.BinOp, ast.UnaryOp, ast.Compare))
+
+class _CostClassifier(ast.NodeVisitor):
+    """Collect the kinds of work a piece of generated code does"""
+
+    def __init__(self):
+        self.patterns: List[Dict[str, Any]] = []
+
+    def _add(self, kind: str, node: ast.AST, detail: str) -> None:
+        self.patterns.append({"kind": kind, "line": getattr(node, "lineno", 0), "detail": detail})
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if isinstance(node.func, ast.Attribute):
+            method = node.func.attr
+            receiver = node.func.value
+            python_args = [arg for arg in node.args if _is_python_callable(arg)]
+
+            if method in ROW_ITERATORS and _mentions(receiver, "df"):
+                # Iterating columns or groups is costed by the enclosing loop
+                if _iterates_rows(node):
+                    self._add(ROW_ITERATORS[method], node, method)
+            elif method == "apply" and _is_row_axis(node):
+                kind = "quadratic" if any(_mentions(arg, "df") for arg in python_args) else "rowwise"
+                self._add(kind, node, "apply(axis=1)")
+            elif method in ELEMENTWISE_METHODS and python_args:
+                # A per-item function that itself scans the frame is quadratic; per-group
+                # functions run once per group, so scanning there costs groups x rows
+                if _mentions_attribute(receiver, {"groupby", "resample", "rolling"}):
+                    kind = "elementwise"
+                elif any(_mentions(arg, "df") for arg in python_args):
+                    kind = "quadratic"
+                else:
+                    kind = "elementwise"
+                self._add(kind, node, f"{method} with a Python function")
+            elif method in ("merge", "join") and any(
+                k.arg == "how" and isinstance(k.value, ast.Constant) and k.value.value == "cross"
+                for k in node.keywords
+            ):
+                self._add("quadratic", node, "cross join")
+            elif method in GROUPING_METHODS:
+                self._add("groupby", node, method)
+            elif method in SORTING_METHODS:
+                self._add("sort", node, method)
+        self.generic_visit(node)
+
+    def _loop(self, node: ast.AST, iterable: ast.AST, body: List[ast.AST]) -> None:
+        if not _mentions(iterable, "df"):
+            return
+        scans_frame = any(_mentions(stmt, "df") for stmt in body)
+        if _iterates_columns(iterable) or _mentions_attribute(iterable, GROUP_ITERABLES):
+            # One pass per column or distinct value
+            self._add("elementwise" if scans_frame else "vectorized", node, "Python loop over groups")
+        else:
+            self._add("quadratic" if scans_frame else "rowwise", node, "Python loop over rows")
+
+    def visit_For(self, node: ast.For) -> None:
+        # Loops over iterrows() are counted by visit_Call
+        if not _is_row_iterator(node.iter):
+            self._loop(node, node.iter, node.body)
+        self.generic_visit(node)
+
+    def _comprehension(self, node: ast.AST, elements: List[ast.AST]) -> None:
+        # Each generator's body is its conditions, the generators nested in it and the elements built
+        for i, generator in enumerate(node.generators):
+            if not _is_row_iterator(generator.iter):
+                body = generator.ifs + [inner.iter for inner in node.generators[i + 1:]] + elements
+                self._loop(generator.iter, generator.iter, body)
+        self.generic_visit(node)
+
+    def visit_ListComp(self, node: ast.ListComp) -> None:
+        self._comprehension(node, [node.elt])
+
+    def visit_SetComp(self, node: ast.SetComp) -> None:
+        self._comprehension(node, [node.elt])
+
+    def visit_GeneratorExp(self, node: ast.GeneratorExp) -> None:
+        self._comprehension(node, [node.elt])
+
+    def visit_DictComp(self, node: ast.DictComp) -> None:
+        self._comprehension(node, [node.key, node.value])
+
+    def visit_While(self, node: ast.While) -> None:
+        self._add("rowwise", node, "while loop")
+        self.generic_visit(node)
+
+class QueryPlan:
+    """Compiled generated code with its static cost classification"""
+
+    def __init__(self, source: str, compiled, kind: str, patterns: List[Dict[str, Any]], rewrites: int,
+                 forbidden: Optional[List[Dict[str, Any]]] = None):
+        self.source = source
+        self.compiled = compiled
+        self.kind = kind
+        self.patterns = patterns
+        self.rewrites = rewrites
+        self.forbidden = forbidden or []
+
+    def estimate_seconds(self, rows: int) -> float:
+        """Estimated run time on a dataset with `rows` rows, from the most expensive pattern found"""
+        if self.kind == "quadratic":
+            return rows * rows * ROW_COST_SECONDS["quadratic"]
+        return rows * ROW_COST_SECONDS[self.kind]
+
+    def check(self, rows: int, limit: float = QUERY_COST_LIMIT_SECONDS) -> float:
+        """Estimated run time, raising QueryRejectedError above `limit` seconds or for forbidden attributes"""
+        if self.forbidden:
+            first = self.forbidden[0]
+            raise QueryRejectedError(
+                f"This query uses '{first['attribute']}' on line {first['line']}, which is not allowed"
+            )
+        estimate = self.estimate_seconds(rows)
+        if limit and estimate > limit:
+            worst = next(p for p in self.patterns if p["kind"] == self.kind)
+            raise QueryRejectedError(
+                f"This query would take about {estimate:,.0f}s on {rows:,} rows "
+                f"({worst['detail']} on line {worst['line']}). "
+                "Try rephrasing it so it can use column operations or groupby."
+            )
+        return estimate
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "patterns": [p["detail"] for p in self.patterns],
+            "rewrites": self.rewrites
+        }
+
+class QueryPlanner:
+    """
+    Parse, classify, rewrite and compile generated code once per distinct
+    code string; plans are kept in an LRU keyed by the code's hash
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[str, QueryPlan]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def code_hash(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+    def plan(self, code: str) -> Tuple[QueryPlan, bool]:
+        """
+        Plan for a code string and whether it came from the cache
+        Raises SyntaxError for code that does not parse
+        """
+        key = self.code_hash(code)
+        plan = self._plans.get(key)
+        if plan is not None:
+            self.hits += 1
+            self._plans.move_to_end(key)
+            return plan, True
+
+        self.misses += 1
+        plan = self._build(code)
+        self._plans[key] = plan
+        while len(self._plans) > self.max_entries:
+            self._plans.popitem(last=False)
+        return plan, False
+
+    @staticmethod
+    def _build(code: str) -> QueryPlan:
+        tree = ast.parse(code, mode="exec")
+
+        rewriter = _RowwiseArithmetic()
+        tree = rewriter.visit(tree)
+
+        classifier = _CostClassifier()
+        classifier.visit(tree)
+        patterns = classifier.patterns
+        kind = max((p["kind"] for p in patterns), key=KIND_ORDER.index, default="vectorized")
+
+        source = ast.unparse(tree) if rewriter.rewrites else code
+        return QueryPlan(source, compile(tree, "<query>", "exec"), kind, patterns, rewriter.rewrites,
+                         _forbidden_attributes(tree))
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._plans),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+class QueryPlanMetrics:
+    """Per-kind counts and run times of executed queries, recorded in the API process"""
+
+    def __init__(self):
+        self.kinds: Dict[str, Dict[str, float]] = {}
+        self.rejected = 0
+        self.rewritten = 0
+        self.cache_hits = 0
+        self.planned = 0
+
+    def record(self, plan: Optional[Dict[str, Any]]) -> None:
+        if not plan:
+            return
+        self.planned += 1
+        self.cache_hits += plan.get("cache_hit", False)
+        self.rewritten += plan.get("rewrites", 0) > 0
+        if plan.get("rejected"):
+            self.rejected += 1
+        entry = self.kinds.setdefault(plan["kind"], {"count": 0, "total_ms": 0.0, "estimated_ms": 0.0})
+        entry["count"] += 1
+        entry["total_ms"] += plan.get("elapsed_ms", 0.0)
+        entry["estimated_ms"] += plan.get("estimated_ms", 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "planned": self.planned,
+            "code_cache_hits": self.cache_hits,
+            "rewritten": self.rewritten,
+            "rejected": self.rejected,
+            "kinds": {
+                kind: {
+                    "count": int(entry["count"]),
+                    "mean_ms": round(entry["total_ms"] / entry["count"], 2),
+                    "mean_estimated_ms": round(entry["estimated_ms"] / entry["count"], 2)
+                }
+                for kind, entry in self.kinds.items()
+            }
+        }
+
+# Singleton instances
+query_planner = QueryPlanner(QUERY_CODE_CACHE_SIZE)
+query_plan_metrics = QueryPlanMetrics()
@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import pandas as pd
+
+from utils.workers import PoolSaturatedError, WORKER_POOL_RETRY_AFTER
+
+logger = logging.getLogger(__name__)
+
+QUERY_SANDBOX_WORKERS = int(os.getenv("QUERY_SANDBOX_WORKERS", 2))
+QUERY_SANDBOX_MAX_PENDING = int(os.getenv("QUERY_SANDBOX_MAX_PENDING", QUERY_SANDBOX_WORKERS * 4))
+QUERY_SANDBOX_DATASETS = int(os.getenv("QUERY_SANDBOX_DATASETS", 2))  # DataFrames kept per process
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", 10))
+QUERY_MAX_RSS_MB = float(os.getenv("QUERY_MAX_RSS_MB", 1024))
+
+# How often a running query's memory is checked
+RSS_CHECK_INTERVAL = 0.05
+
+class QueryAbortedError(Exception):
+    """Raised when a sandboxed query is killed for exceeding its time or memory limit"""
+
+def _sandbox_main(conn, max_datasets: int) -> None:
+    """
+    Executor process loop. Receives (dataset_key, engine, code, chart_spec, df)
+    and replies ("ok", run_chat_query result), ("error", message) or ("missing",
+    None) when df is None and the dataset is not held here.
+    """
+    from services.query_executor import enable_copy_on_write, freeze_frame, FrameNotFrozenError, QUERY_COPY_MODE
+    from services.sql_executor import SQLExecutor
+    from services.tasks import run_chat_query
+
+    # Frames are unpickled after this, so queries can share their buffers
+    enable_copy_on_write()
+
+    frames: "OrderedDict[Hashable, pd.DataFrame]" = OrderedDict()
+    tables: Dict[Hashable, Any] = {}  # Arrow tables for the SQL engine, built on first use
+    unfrozen = set()  # Frames that could not be frozen; each query runs on a deep copy
+    while True:
+        try:
+            key, engine, code, chart_spec, df = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        if df is not None:
+            # Kept across queries, so generated code must not be able to write to it
+            try:
+                frames[key] = freeze_frame(df)
+                unfrozen.discard(key)
+            except FrameNotFrozenError as e:
+                logger.warning(f"Copying the dataset for every query: {e}")
+                frames[key] = df
+                unfrozen.add(key)
+            tables.pop(key, None)
+            while len(frames) > max_datasets:
+                evicted, _ = frames.popitem(last=False)
+                tables.pop(evicted, None)
+                unfrozen.discard(evicted)
+        elif key not in frames:
+            conn.send(("missing", None))
+            continue
+        frames.move_to_end(key)
+
+        try:
+            if engine == "sql" and key not in tables:
+                tables[key] = SQLExecutor.arrow_table(frames[key])
+            copy_mode = "copy" if key in unfrozen else QUERY_COPY_MODE
+            conn.send(("ok", run_chat_query(frames[key], code, chart_spec, engine, tables.get(key), copy_mode)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+class _SandboxProcess:
+    """One executor process, its pipe and the datasets it is believed to hold"""
+
+    def __init__(self, ctx, max_datasets: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_sandbox_main,
+            args=(child_conn, max_datasets),
+            name="analytica-query",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.datasets: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.max_datasets = max_datasets
+        self.lock = asyncio.Lock()
+        self.load = 0  # queries running or waiting here
+
+    def holds(self, key: Hashable) -> bool:
+        return key in self.datasets
+
+    def loaded(self, key: Hashable) -> None:
+        self.datasets[key] = None
+        self.datasets.move_to_end(key)
+        while len(self.datasets) > self.max_datasets:
+            self.datasets.popitem(last=False)
+
+    def rss_bytes(self) -> int:
+        """Resident set size of the process; 0 where /proc is unavailable"""
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+class QuerySandbox:
+    """
+    Pool of pre-started processes that run generated chat code.
+    Each process keeps the DataFrames of its last few datasets (and, once
+    queried with SQL, their Arrow tables), and queries
+    for a dataset go to the process already holding it, so the frame is sent
+    over the pipe only on a miss. A query that runs past its deadline or
+    grows the process beyond the RSS cap has its process killed and replaced
+    by a warm spare, so queued queries do not wait for a fresh interpreter.
+    """
+
+    def __init__(self, size: int, max_pending: int, max_datasets: int,
+                 timeout: float, max_rss_mb: float):
+        self.size = size
+        self.max_pending = max_pending
+        self.max_datasets = max_datasets
+        self.timeout = timeout
+        self.max_rss_bytes = int(max_rss_mb * 1024 * 1024)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes: List[_SandboxProcess] = []
+        self._spare: Optional[_SandboxProcess] = None
+        self.pending = 0
+        self.runs = 0
+        self.timeouts = 0
+        self.memory_kills = 0
+        self.crashes = 0
+        self.respawns = 0
+        self.dataset_sends = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if not self._processes:
+            self._processes = [_SandboxProcess(self._ctx, self.max_datasets) for _ in range(self.size)]
+            self._spare = _SandboxProcess(self._ctx, self.max_datasets)
+
+    def shutdown(self) -> None:
+        if self._spare is not None:
+            self._processes.append(self._spare)
+        for proc in self._processes:
+            proc.kill()
+        self._processes = []
+        self._spare = None
+
+    def _pick(self, key: Hashable) -> _SandboxProcess:
+        """
+        Least loaded process; among equals prefer one holding the dataset,
+        then the dataset's home process so repeat queries find it loaded
+        """
+        home = self._processes[zlib.crc32(repr(key).encode("utf-8")) % len(self._processes)]
+        return min(self._processes, key=lambda proc: (proc.load, not proc.holds(key), proc is not home))
+
+    def _respawn(self, proc: _SandboxProcess) -> None:
+        proc.kill()
+        if proc in self._processes:
+            index = self._processes.index(proc)
+            self._processes[index] = self._spare
+            self._spare = _SandboxProcess(self._ctx, self.max_datasets)
+            self.respawns += 1
+
+    def _exchange(self, proc: _SandboxProcess, message: tuple) -> tuple:
+        """Send a request and wait for the reply, enforcing the deadline and RSS cap (runs in a thread)"""
+        proc.conn.send(message)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timeouts += 1
+                raise QueryAbortedError(f"Query took longer than {self.timeout:g} seconds and was stopped")
+            if proc.conn.poll(min(remaining, RSS_CHECK_INTERVAL)):
+                return proc.conn.recv()
+            if self.max_rss_bytes and proc.rss_bytes() > self.max_rss_bytes:
+                self.memory_kills += 1
+                raise QueryAbortedError(
+                    f"Query used more than {self.max_rss_bytes // (1024 * 1024)}MB of memory and was stopped"
+                )
+
+    async def run(self, key: Hashable, df: pd.DataFrame, code: str,
+                  chart_spec: Optional[Dict[str, Any]] = None,
+                  engine: str = "pandas") -> Dict[str, Any]:
+        """
+        Run generated code (pandas, or SQL when `engine` is "sql") against the dataset identified by `key`
+        Returns: run_chat_query result; a killed query comes back as a failed execution
+        """
+        if self.pending >= self.size + self.max_pending:
+            self.rejected += 1
+            raise PoolSaturatedError(WORKER_POOL_RETRY_AFTER)
+
+        self.start()
+        self.pending += 1
+        try:
+            while True:
+                proc = self._pick(key)
+                proc.load += 1
+                try:
+                    async with proc.lock:
+                        # The process may have been replaced while this query waited for it
+                        if proc in self._processes:
+                            return await self._run_on(proc, key, df, code, chart_spec, engine)
+                finally:
+                    proc.load -= 1
+        finally:
+            self.pending -= 1
+
+    async def _run_on(self, proc: _SandboxProcess, key: Hashable, df: pd.DataFrame,
+                      code: str, chart_spec: Optional[Dict[str, Any]], engine: str) -> Dict[str, Any]:
+        self.runs += 1
+        try:
+            status, payload = await self._send(proc, key, df, code, chart_spec, engine)
+        except QueryAbortedError as e:
+            self._respawn(proc)
+            return self._failed(str(e))
+        except asyncio.CancelledError:
+            # The exchange thread cannot be stopped; drop the process so its reply is never read
+            self._respawn(proc)
+            raise
+        except (EOFError, OSError) as e:
+            logger.error(f"Query process exited unexpectedly: {e}")
+            self.crashes += 1
+            self._respawn(proc)
+            return self._failed("Query process exited unexpectedly")
+
+        # Memory held after the run counts too; start the next query from a fresh process
+        if self.max_rss_bytes and proc.rss_bytes() > self.max_rss_bytes:
+            self.memory_kills += 1
+            self._respawn(proc)
+
+        if status == "error":
+            return self._failed(payload)
+        return payload
+
+    async def _send(self, proc: _SandboxProcess, key: Hashable, df: pd.DataFrame,
+                    code: str, chart_spec: Optional[Dict[str, Any]], engine: str) -> tuple:
+        if proc.holds(key):
+            reply = await asyncio.to_thread(self._exchange, proc, (key, engine, code, chart_spec, None))
+            if reply[0] != "missing":
+                return reply
+        self.dataset_sends += 1
+        reply = await asyncio.to_thread(self._exchange, proc, (key, engine, code, chart_spec, df))
+        proc.loaded(key)
+        return reply
+
+    @staticmethod
+    def _failed(error: str) -> Dict[str, Any]:
+        return {
+            "execution": {"success": False, "result": None, "result_type": None, "error": error},
+            "chart_config": None
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._processes),
+            "pending": self.pending,
+            "runs": self.runs,
+            "timeouts": self.timeouts,
+            "memory_kills": self.memory_kills,
+            "crashes": self.crashes,
+            "respawns": self.respawns,
+            "dataset_sends": self.dataset_sends,
+            "rejected": self.rejected,
+            "rss_mb": [round(proc.rss_bytes() / (1024 * 1024), 1) for proc in self._processes]
+        }
+
+# Singleton instance
+query_sandbox = QuerySandbox(
+    QUERY_SANDBOX_WORKERS,
+    QUERY_SANDBOX_MAX_PENDING,
+    QUERY_SANDBOX_DATASETS,
+    QUERY_TIMEOUT_SECONDS,
+    QUERY_MAX_RSS_MB
+)
@@ -0,0 +1,193 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty 2016).
+    Keeps O(k log n) items; any quantile query is within `rank_error` of the
+    true normalized rank with high probability.
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: np.ndarray) -> None:
+        """Add a batch of values (NaNs must already be removed)"""
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate((self.levels[0], np.asarray(values, dtype=np.float64)))
+        self._compress()
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+
+            items = np.sort(items)
+            # An odd item out stays at this level; the rest are halved and promoted with doubled weight
+            keep = items[-1:] if len(items) % 2 else items[:0]
+            pairs = items[:len(items) - len(keep)]
+            promoted = pairs[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+            level = 0 if level + 1 == len(self.levels) - 1 else level + 1
+
+    def quantiles(self, qs: List[float]) -> List[float]:
+        if self.count == 0:
+            return [float("nan")] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_h), 2 ** h) for h, items_h in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        total = cumulative[-1]
+        return [float(items[min(np.searchsorted(cumulative, q * total), len(items) - 1)]) for q in qs]
+
+    @property
+    def rank_error(self) -> float:
+        """Normalized rank error bound (empirical fit from the KLL/DataSketches literature)"""
+        return 2.296 / self.k ** 0.9723
+
+class HyperLogLog:
+    """HyperLogLog distinct-value counter over 64-bit pandas hashes"""
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, values: np.ndarray) -> None:
+        """Add a batch of values (NaNs must already be removed)"""
+        if len(values) == 0:
+            return
+        hashes = pd.util.hash_array(np.asarray(values))
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remainder = hashes << np.uint64(self.precision)
+
+        # Position of the leftmost 1-bit, computed on exact 32-bit halves
+        high = (remainder >> np.uint64(32)).astype(np.float64)
+        low = (remainder & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        high_bits = np.frexp(high)[1]
+        low_bits = np.frexp(low)[1]
+        rank = np.where(high_bits > 0, 33 - high_bits, 65 - low_bits)
+        rank = np.minimum(rank, 64 - self.precision + 1).astype(np.uint8)
+
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # Small-range correction (linear counting)
+            return int(round(self.m * math.log(self.m / zeros)))
+        return int(round(raw))
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+class TopKSketch:
+    """
+    Mergeable heavy-hitters summary (Misra-Gries, the deterministic dual of
+    Space-Saving). Each chunk is pre-aggregated with value_counts; reported
+    counts undercount the truth by at most `max_error`.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.total = 0
+        self.max_error = 0
+        self.counts = pd.Series(dtype="int64")
+
+    def update(self, values: pd.Series) -> None:
+        chunk_counts = values.value_counts()
+        self.total += int(chunk_counts.sum())
+        counts = self.counts.add(chunk_counts, fill_value=0)
+        if len(counts) > self.capacity:
+            threshold = counts.nlargest(self.capacity + 1).iloc[-1]
+            counts = counts - threshold
+            counts = counts[counts > 0]
+            self.max_error += int(threshold)
+        self.counts = counts.astype("int64")
+
+    def top(self, n: Optional[int] = None) -> pd.Series:
+        """Heavy hitters ordered by estimated count"""
+        ranked = self.counts.sort_values(ascending=False, kind="stable")
+        return ranked if n is None else ranked.head(n)
+
+def _merge_moments(count_a: int, mean_a: float, m2_a: float,
+                   count_b: int, mean_b: float, m2_b: float):
+    """Chan et al. parallel update of count, mean and sum of squared deviations"""
+    count = count_a + count_b
+    if count == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+    return count, mean, m2
+
+def compute_sketched_summaries(numeric_df: pd.DataFrame, chunk_rows: int,
+                               kll_k: int = 200, top_k: int = 64) -> List[Dict[str, Any]]:
+    """
+    Approximate counterpart of compute_numeric_summaries.
+    Count, mean, std, min and max are exact (streamed moments); median,
+    quartiles and mode come from per-column KLL and heavy-hitter sketches, so
+    memory stays bounded by the chunk size whatever the row count.
+    """
+    columns = list(numeric_df.columns)
+    moments = {col: (0, 0.0, 0.0) for col in columns}
+    minimums = {col: np.inf for col in columns}
+    maximums = {col: -np.inf for col in columns}
+    quantile_sketches = {col: KLLSketch(kll_k) for col in columns}
+    mode_sketches = {col: TopKSketch(top_k) for col in columns}
+
+    for start in range(0, len(numeric_df), chunk_rows):
+        chunk = numeric_df.iloc[start:start + chunk_rows]
+        for col in columns:
+            values = chunk[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                continue
+            chunk_mean = values.mean()
+            deviations = values - chunk_mean
+            moments[col] = _merge_moments(*moments[col], len(values), chunk_mean, float(deviations @ deviations))
+            minimums[col] = min(minimums[col], values.min())
+            maximums[col] = max(maximums[col], values.max())
+            quantile_sketches[col].update(values)
+            mode_sketches[col].update(pd.Series(values))
+
+    summaries = []
+    for col in columns:
+        count, mean, m2 = moments[col]
+        summary = {"column": col, "count": count, "null_count": len(numeric_df) - count}
+        if count > 0:
+            q25, median, q75 = quantile_sketches[col].quantiles([0.25, 0.5, 0.75])
+            modes = mode_sketches[col].top()
+            summary.update({
+                "mean": float(mean),
+                "median": median,
+                "std": float(math.sqrt(m2 / (count - 1))) if count > 1 else float("nan"),
+                "min": float(minimums[col]),
+                "max": float(maximums[col]),
+                "q25": q25,
+                "q75": q75,
+                "mode": float(modes.index[0]) if len(modes) else None
+            })
+        summaries.append(summary)
+
+    return summaries
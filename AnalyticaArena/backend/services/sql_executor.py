@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+
+# Rows of a SQL result returned to the client, matching the pandas engine's head(100)
+SQL_RESULT_ROWS = int(os.getenv("SQL_RESULT_ROWS", 100))
+SQL_ENGINE_THREADS = int(os.getenv("SQL_ENGINE_THREADS", 0))  # 0 lets DuckDB use every core
+
+# Name the dataset is registered under, as `df` is for generated pandas code
+SQL_TABLE_NAME = "df"
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+class SQLEngineUnavailableError(Exception):
+    """Raised when the SQL engine is requested but duckdb is not installed"""
+
+def sql_engine_available() -> bool:
+    return duckdb is not None
+
+def quote_identifier(name: Any) -> str:
+    """Double-quoted SQL identifier for a column name"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+class SQLExecutor:
+    """
+    Execute AI-generated SQL on datasets with an embedded DuckDB engine.
+    Each process opens one in-memory database; queries run on their own
+    cursor, so table registrations never leak between them.
+    """
+
+    _database = None
+    _database_lock = threading.Lock()
+
+    @staticmethod
+    def arrow_table(df: pd.DataFrame) -> pa.Table:
+        """
+        Arrow view of a dataset for DuckDB to scan. Numeric columns without
+        nulls share the DataFrame's buffers; other columns are converted, so
+        callers keep the table for as long as they keep the frame.
+        """
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    @classmethod
+    def connect(cls) -> "duckdb.DuckDBPyConnection":
+        """Cursor on the process's in-memory database, which cannot touch files, extensions or its own settings"""
+        if duckdb is None:
+            raise SQLEngineUnavailableError("SQL engine is not available: install duckdb")
+        with cls._database_lock:
+            if cls._database is None:
+                config = {"enable_external_access": False, "autoinstall_known_extensions": False,
+                          "autoload_known_extensions": False}
+                if SQL_ENGINE_THREADS:
+                    config["threads"] = SQL_ENGINE_THREADS
+                database = duckdb.connect(":memory:", config=config)
+                database.execute("SET lock_configuration = true")
+                cls._database = database
+        return cls._database.cursor()
+
+    @staticmethod
+    def check_statement(sql: str) -> None:
+        """Only a single read-only query may run"""
+        statements = duckdb.extract_statements(sql)
+        if len(statements) != 1:
+            raise ValueError("Expected exactly one SQL statement")
+        if statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only SELECT queries are allowed")
+
+    @staticmethod
+    def execute_query(source: Union[pd.DataFrame, pa.Table], sql: str) -> Dict[str, Any]:
+        """
+        Execute a SQL query against the dataset, registered as table `df`
+        Returns: {success: bool, result: Any, error: str, plan: dict}, as QueryExecutor.execute_query
+        """
+        plan_info = {"kind": "sql", "patterns": [], "rewrites": 0, "cache_hit": False, "estimated_ms": 0.0}
+
+        try:
+            conn = SQLExecutor.connect()
+        except SQLEngineUnavailableError as e:
+            return SQLExecutor._failure(str(e), plan_info)
+
+        table = SQLExecutor.arrow_table(source) if isinstance(source, pd.DataFrame) else source
+
+        try:
+            SQLExecutor.check_statement(sql)
+            conn.register(SQL_TABLE_NAME, table)
+
+            start = time.perf_counter()
+            # Only the rows returned to the client are materialized
+            result = conn.sql(sql).limit(SQL_RESULT_ROWS).df()
+            plan_info["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+            # A single value reads like a pandas scalar result
+            if result.shape == (1, 1):
+                value = result.iat[0, 0]
+                value = value.item() if hasattr(value, "item") else value
+                if isinstance(value, (int, float, str, bool)):
+                    return SQLExecutor._success(value, type(value).__name__, plan_info)
+
+            return SQLExecutor._success(result.to_dict(orient="records"), "DataFrame", plan_info)
+
+        except Exception as e:
+            return SQLExecutor._failure(str(e), plan_info)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _success(result: Any, result_type: str, plan_info: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "result": result,
+            "result_type": result_type,
+            "error": None,
+            "plan": plan_info
+        }
+
+    @staticmethod
+    def _failure(error: str, plan_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "result": None,
+            "result_type": None,
+            "error": error,
+            "plan": plan_info
+        }
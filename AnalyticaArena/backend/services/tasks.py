@@ -0,0 +1,100 @@
+"""CPU-bound pandas workloads executed in the worker pool (picklable module-level functions)"""
+import pandas as pd
+from typing import Dict, List, Any, Optional, Union
+
+from models.dataset_model import DatasetProfile
+from services.chart_generator import ChartGenerator, generate_charts
+from services.data_analysis import DataAnalyzer
+from services.dataset_store import payload_digest
+from services.ingestion import parse_upload
+from services.query_executor import QueryExecutor, QUERY_COPY_MODE
+from services.sql_executor import SQLExecutor
+
+def ingest_upload(source: Union[str, bytes], file_ext: str, max_rows: int) -> Dict[str, Any]:
+    """Parse, profile and serialize an uploaded file"""
+    payload, profile = parse_upload(source, file_ext, max_rows)
+
+    return {
+        "payload": payload,
+        "sha256": payload_digest(payload),
+        "num_rows": profile.num_rows,
+        "num_columns": len(profile.columns),
+        "columns": [col.model_dump() for col in profile.columns]
+    }
+
+def profile_dataset(df: pd.DataFrame, profile: Optional[DatasetProfile] = None,
+                    approximate: Optional[bool] = None) -> Dict[str, Any]:
+    """Statistics, quality checks, KPIs and prompt summaries for a dataset"""
+    analyzer = DataAnalyzer(df, profile, approximate)
+
+    # Get statistics
+    statistics = analyzer.get_basic_statistics()
+
+    # Get quality issues
+    quality_issues = analyzer.get_data_quality_issues()
+
+    # Summaries for the AI prompt, trimmed to the token budget on wide datasets
+    summaries = analyzer.get_prompt_summaries(statistics, quality_issues)
+
+    return {
+        "statistics": statistics,
+        "quality_issues": quality_issues,
+        "quality_score": analyzer.calculate_quality_score(quality_issues),
+        "kpis": analyzer.calculate_kpis(),
+        "column_info": summaries["column_info"],
+        "statistics_summary": summaries["statistics_summary"],
+        "quality_issues_summary": summaries["quality_issues_summary"],
+        "prompt_columns": summaries["columns_kept"],
+        "prompt_columns_omitted": summaries["columns_omitted"],
+        "sample_data": df.head(5).to_string(),
+        "approximation": analyzer.approximation_report()
+    }
+
+def build_charts(df: pd.DataFrame, column_types: Dict[str, str],
+                 ai_suggestions: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Generate chart configurations with data"""
+    return generate_charts(df, column_types, ai_suggestions)
+
+def run_chat_query(df: pd.DataFrame, code: str,
+                   chart_spec: Optional[Dict[str, Any]] = None,
+                   engine: str = "pandas", table: Optional[Any] = None,
+                   copy_mode: str = QUERY_COPY_MODE) -> Dict[str, Any]:
+    """
+    Execute generated pandas code, or SQL when `engine` is "sql", and build chart data for its result
+    `table` is a prebuilt Arrow table of `df` for the SQL engine; `copy_mode` is as for QueryExecutor
+    Returns: {execution: execute_query result, chart_config: dict or None}
+    """
+    if engine == "sql":
+        execution_result = SQLExecutor.execute_query(table if table is not None else df, code)
+    else:
+        execution_result = QueryExecutor.execute_query(df, code, copy_mode)
+    chart_config = None
+
+    if execution_result["success"] and chart_spec:
+        result_data = execution_result["result"]
+
+        # If result is a DataFrame or Series, use it for chart
+        if execution_result["result_type"] in ["DataFrame", "Series"]:
+            if isinstance(result_data, list):
+                result_df = pd.DataFrame(result_data)
+            elif isinstance(result_data, dict):
+                result_df = pd.DataFrame([result_data])
+            else:
+                result_df = df
+
+            # Generate chart data
+            if len(result_df) > 0:
+                chart_config = {
+                    "chart_type": chart_spec.get("type", "bar"),
+                    "title": chart_spec.get("title", "Query Result"),
+                    "x_column": chart_spec.get("x_column"),
+                    "y_column": chart_spec.get("y_column"),
+                    "data": ChartGenerator.generate_chart_data(
+                        result_df, {"chart_type": chart_spec.get("type", "bar"), **chart_spec}
+                    )
+                }
+
+    return {
+        "execution": execution_result,
+        "chart_config": chart_config
+    }
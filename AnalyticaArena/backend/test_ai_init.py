@@ -13,10 +13,10 @@ try:
     print("Import successful. Initializing AIService...")
     service = AIService()
     print("Initialization successful.")
-    if service.model:
-        print(f"Model initialized: {service.model.model_name}")
+    if service.provider:
+        print(f"Provider initialized: {service.provider.model_name}")
     else:
-        print("Model is None (API key missing?)")
+        print("Provider is None (API key missing?)")
 except Exception as e:
     print(f"FAILED to initialize AIService: {e}")
     import traceback
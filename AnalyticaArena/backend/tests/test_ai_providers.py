@@ -0,0 +1,13 @@
+import pytest
+
+from services.ai_providers import AIProvider, LocalProvider
+
+def test_provider_without_generate_fails_at_construction():
+    class Incomplete(AIProvider):
+        model_name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_local_provider_is_a_provider():
+    assert isinstance(LocalProvider(), AIProvider)
@@ -0,0 +1,41 @@
+import asyncio
+
+from services.ai_gateway import AIGateway
+from services.ai_providers import AIProvider
+from services.ai_service import AIService
+import services.ai_service as ai_service_module
+
+DATASET_INFO = {
+    "name": "sales.csv",
+    "num_rows": 10,
+    "num_columns": 2,
+    "column_info": "",
+    "statistics": "",
+    "quality_issues": ""
+}
+
+class SlowProvider(AIProvider):
+    model_name = "slow"
+
+    async def generate(self, prompt, task, context):
+        await asyncio.sleep(1)
+        return "[]"
+
+def run_insights(monkeypatch, gateway: AIGateway):
+    monkeypatch.setattr(ai_service_module, "ai_gateway", gateway)
+    service = AIService(SlowProvider())
+    return asyncio.run(service.generate_insights(DATASET_INFO))
+
+def test_insights_fall_back_when_the_provider_times_out(monkeypatch):
+    insights = run_insights(monkeypatch, AIGateway(4, 0.01, 1, 5, 30))
+
+    assert insights == AIService()._fallback_insights(DATASET_INFO)
+
+def test_insights_fall_back_when_the_circuit_is_open(monkeypatch):
+    gateway = AIGateway(4, 0.01, 1, 1, 30)
+    gateway.state = "open"
+    gateway.opened_at = float("inf")
+
+    insights = run_insights(monkeypatch, gateway)
+
+    assert insights == AIService()._fallback_insights(DATASET_INFO)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.data_analysis import compute_numeric_summaries
+
+def make_frame(rows: int = 501) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({f"x{i}": rng.normal(i, 3, rows) for i in range(5)})
+    df.loc[::7, "x1"] = np.nan
+    df["ints"] = rng.integers(0, 10, rows)
+    df["nullable"] = pd.array(rng.integers(0, 5, rows), dtype="Int64")
+    df.loc[::3, "nullable"] = pd.NA
+    df["empty"] = np.nan
+    df["single"] = np.nan
+    df.loc[4, "single"] = 2.5
+    return df
+
+@pytest.mark.parametrize("block_bytes", [1, 501 * 8 * 3, 64 * 1024 * 1024])
+def test_summaries_match_pandas_for_any_block_size(block_bytes):
+    df = make_frame()
+    summaries = {s["column"]: s for s in compute_numeric_summaries(df, block_bytes=block_bytes)}
+
+    assert list(summaries) == list(df.columns)
+    for col in df.columns:
+        series = df[col].astype("float64")
+        summary = summaries[col]
+        assert summary["count"] == series.count()
+        assert summary["null_count"] == series.isna().sum()
+        if summary["count"] == 0:
+            assert "mean" not in summary
+            continue
+        assert summary["mean"] == pytest.approx(series.mean())
+        assert summary["median"] == pytest.approx(series.median())
+        assert summary["min"] == series.min()
+        assert summary["max"] == series.max()
+        assert summary["q25"] == pytest.approx(series.quantile(0.25))
+        assert summary["q75"] == pytest.approx(series.quantile(0.75))
+        assert summary["mode"] == series.mode().iloc[0]
+        if summary["count"] > 1:
+            assert summary["std"] == pytest.approx(series.std())
+        else:
+            assert np.isnan(summary["std"])
+
+def test_summaries_leave_the_frame_untouched():
+    df = make_frame()
+    before = df.copy()
+    compute_numeric_summaries(df, block_bytes=1)
+    pd.testing.assert_frame_equal(df, before)
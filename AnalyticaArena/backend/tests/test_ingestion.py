@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import services.ingestion as ingestion
+from services.column_profiler import DistinctCounter
+from services.dataset_store import deserialize_dataframe
+from services.ingestion import RowLimitExceededError, parse_upload
+
+ROWS = 1000
+
+def make_csv() -> bytes:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "id": np.arange(ROWS),
+        "cat": rng.choice(list("abc"), ROWS),
+        "val": rng.normal(size=ROWS).round(2),
+    })
+    # Inferred as integers in early chunks, then as floats or text
+    df["late_float"] = pd.Series(rng.integers(0, 50, ROWS), dtype=object)
+    df.loc[ROWS - 3, "late_float"] = 1.5
+    df["late_text"] = pd.Series(rng.integers(0, 50, ROWS), dtype=object)
+    df.loc[ROWS - 2, "late_text"] = "oops"
+    # Empty, and so inferred as floats, in every chunk but the last
+    df["sparse"] = pd.Series([np.nan] * ROWS, dtype=object)
+    df.loc[ROWS - 5:, "sparse"] = "s"
+    return df.to_csv(index=False).encode()
+
+@pytest.mark.parametrize("chunk_rows", [100, 10_000])
+def test_chunked_csv_matches_a_single_read(monkeypatch, chunk_rows):
+    monkeypatch.setattr(ingestion, "CSV_CHUNK_ROWS", chunk_rows)
+    csv = make_csv()
+
+    payload, profile = parse_upload(csv, ".csv", ROWS)
+
+    df = deserialize_dataframe(payload)
+    expected = pd.read_csv(io.BytesIO(csv), dtype={"late_text": str, "sparse": str})
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+    assert df["late_text"].iloc[0] == str(expected["late_text"].iloc[0])
+
+    columns = {col.name: col for col in profile.columns}
+    assert profile.num_rows == ROWS
+    for name in ("id", "cat", "val", "late_float", "late_text", "sparse"):
+        assert columns[name].unique_count == df[name].nunique()
+        assert columns[name].missing_count == df[name].isna().sum()
+    assert columns["late_float"].max_value == df["late_float"].max()
+    assert columns["late_text"].min_value is None
+
+def test_row_limit_is_enforced_while_reading(monkeypatch):
+    monkeypatch.setattr(ingestion, "CSV_CHUNK_ROWS", 100)
+
+    with pytest.raises(RowLimitExceededError):
+        parse_upload(make_csv(), ".csv", ROWS - 1)
+
+def test_distinct_counter_switches_to_an_estimate():
+    counter = DistinctCounter(exact_limit=1000)
+    for start in range(0, 20_000, 1000):
+        # Every value is seen twice
+        counter.update(pd.Series(np.arange(start, start + 1000) % 10_000))
+
+    assert counter.sketch is not None
+    assert counter.count() == pytest.approx(10_000, rel=0.05)
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import utils.database as database_module
+from services.jobs import JobQueue
+from utils.workers import PoolSaturatedError
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(database_module.database, "db", client["test"])
+    return client["test"]
+
+async def wait_for(db, job_id: str, status: str, timeout: float = 5) -> dict:
+    for _ in range(int(timeout / 0.01)):
+        job = await db.jobs.find_one({"_id": ObjectId(job_id)})
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {job['status']}, expected {status}")
+
+def test_backpressure_retry_does_not_block_other_jobs(database):
+    queue = JobQueue(1, 3, 0.01, 15, 120)
+    calls = []
+
+    async def handler(job, progress):
+        calls.append(job["params"]["name"])
+        if job["params"]["name"] == "busy" and job["attempts"] == 1:
+            raise PoolSaturatedError(retry_after=0.3)
+        return {"name": job["params"]["name"]}
+
+    async def scenario():
+        queue.register("test", handler)
+        await queue.start()
+        try:
+            busy = await queue.enqueue("test", "u", "d", {"name": "busy"})
+            other = await queue.enqueue("test", "u", "d", {"name": "other"})
+            # The single worker runs the second job while the first waits out its retry_after
+            await wait_for(database, other, "complete", timeout=0.2)
+            assert queue.stats()["waiting_retry"] == 1
+            await wait_for(database, busy, "complete")
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+    assert calls == ["busy", "other", "busy"]
+
+def test_failed_jobs_back_off_exponentially(database):
+    queue = JobQueue(1, 3, 0.05, 15, 120)
+    attempts = []
+
+    async def handler(job, progress):
+        attempts.append(asyncio.get_running_loop().time())
+        raise RuntimeError("boom")
+
+    async def scenario():
+        queue.register("test", handler)
+        await queue.start()
+        try:
+            job_id = await queue.enqueue("test", "u", "d")
+            return await wait_for(database, job_id, "failed")
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(scenario())
+
+    assert job["attempts"] == 3
+    assert job["error"] == "boom"
+    first_wait, second_wait = attempts[1] - attempts[0], attempts[2] - attempts[1]
+    assert first_wait >= 0.05
+    assert second_wait >= 0.1
+
+def test_start_requeues_only_claims_whose_heartbeat_lapsed(database):
+    queue = JobQueue(1, 3, 0.01, 15, 120)
+    now = datetime.utcnow()
+    ran = []
+
+    async def handler(job, progress):
+        ran.append(job["params"]["name"])
+
+    async def scenario():
+        await database.jobs.insert_many([
+            {"kind": "test", "params": {"name": "live"}, "status": "running", "owner": "other",
+             "attempts": 1, "heartbeat_at": now, "created_at": now},
+            {"kind": "test", "params": {"name": "stale"}, "status": "running", "owner": "gone",
+             "attempts": 1, "heartbeat_at": now - timedelta(minutes=5), "created_at": now},
+            {"kind": "test", "params": {"name": "legacy"}, "status": "running",
+             "attempts": 1, "created_at": now},
+            {"kind": "test", "params": {"name": "exhausted"}, "status": "running", "owner": "gone",
+             "attempts": 3, "heartbeat_at": now - timedelta(minutes=5), "created_at": now},
+        ])
+        queue.register("test", handler)
+        await queue.start()
+        try:
+            for _ in range(100):
+                if len(ran) == 2:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+        return {job["params"]["name"]: job async for job in database.jobs.find()}
+
+    jobs = asyncio.run(scenario())
+
+    assert sorted(ran) == ["legacy", "stale"]
+    assert jobs["live"]["status"] == "running"
+    assert jobs["live"]["owner"] == "other"
+    assert jobs["stale"]["status"] == "complete"
+    assert jobs["exhausted"]["status"] == "failed"
+    assert queue.stats()["reclaimed"] == 2
+
+def test_stop_releases_jobs_it_was_running(database):
+    queue = JobQueue(1, 3, 0.01, 15, 120)
+
+    async def scenario():
+        running = asyncio.Event()
+
+        async def handler(job, progress):
+            running.set()
+            await asyncio.sleep(10)
+
+        queue.register("test", handler)
+        await queue.start()
+        job_id = await queue.enqueue("test", "u", "d")
+        await asyncio.wait_for(running.wait(), 1)
+        await queue.stop()
+        return await database.jobs.find_one({"_id": ObjectId(job_id)})
+
+    job = asyncio.run(scenario())
+
+    assert job["status"] == "queued"
+    assert job["owner"] is None
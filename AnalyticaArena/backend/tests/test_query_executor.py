@@ -0,0 +1,96 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.query_executor import QueryExecutor, freeze_frame, writable_columns
+from services.query_sandbox import QuerySandbox
+
+MUTATING_SNIPPETS = [
+    "a = df['a'].to_numpy()\na.setflags(write=True)\na[0] = 42\nresult = 1",
+    "df['a'].array._ndarray[0] = 99\nresult = 1",
+    "df['a'].to_numpy()[0] = 7\nresult = 1",
+    "df['when'].to_numpy()[0] = df['when'].to_numpy()[1]\nresult = 1",
+    "a = df['mixed'].to_numpy()\na.flags.writeable = True\na[0] = 'changed'\nresult = 1",
+    "a = df['a'].to_numpy()\na.flags.writeable = True\na[1] = 42\nresult = 1",
+    "df.loc[0, 'a'] = 5\ndf['label'] = 'x'\ndf.fillna(0, inplace=True)\nresult = df['a'].sum()",
+]
+
+def make_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "a": np.arange(5, dtype=float),
+        "label": pd.Categorical(list("xyzxy")),
+        "count": pd.array([1, 2, None, 4, 5], dtype="Int64"),
+        "when": pd.date_range("2024-01-01", periods=5),
+        "mixed": pd.Series(["x", 1, None, 2.5, "y"], dtype=object),
+        "other": pd.Series([None, "b", 3, "d", "e"], dtype=object)
+    })
+
+@pytest.mark.parametrize("code", MUTATING_SNIPPETS)
+def test_mutating_code_does_not_change_frozen_frame(code):
+    df = freeze_frame(make_frame())
+
+    QueryExecutor.execute_query(df, code)
+
+    pd.testing.assert_frame_equal(df, make_frame())
+    assert QueryExecutor.execute_query(df, "result = df['a'].iloc[0]")["result"] == 0.0
+
+def test_frozen_buffers_cannot_be_made_writeable():
+    df = freeze_frame(make_frame())
+
+    for values in (df["a"].to_numpy(), df["when"].to_numpy()):
+        with pytest.raises(ValueError):
+            values.setflags(write=True)
+
+def test_no_block_of_a_frozen_frame_stays_writeable():
+    df = make_frame()
+    assert writable_columns(df)
+
+    frozen = freeze_frame(df)
+
+    assert writable_columns(frozen) == []
+    # Guards the public-API freezing against pandas internals changes
+    for block in frozen._mgr.blocks:
+        values = block.values if isinstance(block.values, np.ndarray) else getattr(block.values, "_ndarray", None)
+        if values is not None:
+            with pytest.raises(ValueError):
+                values.view().setflags(write=True)
+
+def test_private_and_buffer_attributes_are_rejected():
+    df = freeze_frame(make_frame())
+
+    for code in ("df['a'].to_numpy().setflags(write=True)", "x = df._mgr"):
+        result = QueryExecutor.execute_query(df, code)
+        assert not result["success"]
+        assert result["plan"]["rejected"]
+
+def test_rowwise_apply_on_a_sampled_frame_sums_each_sampled_row():
+    df = pd.DataFrame({"a": np.arange(100.0), "b": np.arange(100.0) * 10})
+
+    result = QueryExecutor.execute_query(df, "result = df.sample(5).apply(lambda r: r['a'] + r['b'], axis=1)")
+
+    assert result["success"]
+    assert result["plan"]["rewrites"] == 0
+    sums = pd.Series(result["result"])
+    assert len(sums) == 5
+    assert (sums == pd.Series(sums.index, index=sums.index).astype(float) * 11).all()
+
+def test_sandbox_cached_frame_survives_mutating_query():
+    sandbox = QuerySandbox(1, 2, 2, 30, 0)
+
+    async def scenario():
+        df = make_frame()
+        key = ("dataset", 1)
+        for code in MUTATING_SNIPPETS:
+            await sandbox.run(key, df, code)
+        # Later queries reuse the frame cached in the sandbox process
+        return await sandbox.run(key, df, "result = df['a'].tolist()")
+
+    try:
+        run = asyncio.run(scenario())
+    finally:
+        sandbox.shutdown()
+
+    assert sandbox.dataset_sends == 1
+    assert run["execution"]["result"] == [0.0, 1.0, 2.0, 3.0, 4.0]
@@ -0,0 +1,83 @@
+import pytest
+
+from services.query_planner import QueryPlanner, QueryRejectedError
+
+ROWS = 1_000_000
+
+def plan(code: str):
+    return QueryPlanner._build(code)
+
+@pytest.mark.parametrize("code", [
+    "result = {c: s.mean() for c, s in df.items()}",
+    "result = [s.sum() for c, s in df[['a', 'b']].items()]",
+    "result = [s.mean() for c, s in df.iteritems()]",
+    "result = [c for c in df]",
+])
+def test_dataframe_items_is_per_column(code):
+    query = plan(code)
+
+    assert query.kind == "vectorized"
+    query.check(ROWS)
+
+@pytest.mark.parametrize("code", [
+    "result = {k: v for k, v in df['cat'].value_counts().items()}",
+    "for k, v in df.groupby('cat')['val'].sum().items():\n    print(k, v)",
+    "for i, row in df.groupby('cat').mean().iterrows():\n    print(row)",
+])
+def test_aggregate_results_are_per_group(code):
+    query = plan(code)
+
+    assert query.kind in ("vectorized", "groupby")
+    query.check(ROWS)
+
+@pytest.mark.parametrize("code", [
+    "result = [v * 2 for i, v in df['val'].items()]",
+    "for i, v in df['val'].dropna().items():\n    print(v)",
+    "for i, row in df.iterrows():\n    print(row)",
+])
+def test_row_level_iteration_is_rejected_on_large_frames(code):
+    query = plan(code)
+
+    assert query.kind in ("rowwise", "iteration")
+    with pytest.raises(QueryRejectedError):
+        query.check(ROWS)
+
+def test_column_loop_scanning_the_frame_is_per_column_scan():
+    query = plan("for c, s in df.items():\n    print(df[c].sum())")
+
+    assert query.kind == "elementwise"
+
+@pytest.mark.parametrize("code", [
+    "for v in df['a']:\n    print((df['a'] > v).sum())",
+    "result = [(df['a'] > v).sum() for v in df['a']]",
+    "result = sum((df['a'] > v).sum() for v in df['a'])",
+    "result = {(df['a'] > v).sum() for v in df['a']}",
+    "result = {v: (df['a'] > v).sum() for v in df['a']}",
+    "result = [a + b for a in df['a'] for b in df['b']]",
+])
+def test_row_loop_scanning_the_frame_is_quadratic(code):
+    query = plan(code)
+
+    assert query.kind == "quadratic"
+    with pytest.raises(QueryRejectedError):
+        query.check(100_000)
+
+@pytest.mark.parametrize("code", [
+    "result = df.apply(lambda r: r['a'] + r['b'], axis=1)",
+    "result = df[['a', 'b']].apply(lambda r: r['a'] * r['b'], axis=1)",
+])
+def test_rowwise_arithmetic_on_a_frame_is_rewritten(code):
+    query = plan(code)
+
+    assert query.rewrites == 1
+    assert query.kind == "vectorized"
+
+@pytest.mark.parametrize("code", [
+    "result = df.sample(5).apply(lambda r: r['a'] + r['b'], axis=1)",
+    "result = df.merge(df, on='a').apply(lambda r: r['b_x'] - r['b_y'], axis=1)",
+])
+def test_rowwise_arithmetic_on_an_expression_is_not_rewritten(code):
+    query = plan(code)
+
+    assert query.rewrites == 0
+    assert query.kind == "rowwise"
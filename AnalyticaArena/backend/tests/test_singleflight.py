@@ -0,0 +1,44 @@
+import asyncio
+
+from utils.singleflight import BroadcastFlight
+
+def test_concurrent_callers_share_one_run_and_all_stage_events():
+    flight = BroadcastFlight()
+    runs = []
+
+    async def work(emit):
+        runs.append(1)
+        for stage in ("kpis", "charts", "insights"):
+            emit(stage, {"stage": stage})
+            await asyncio.sleep(0.01)
+        return "done"
+
+    async def scenario():
+        first, late = [], []
+        first_call = asyncio.ensure_future(
+            flight.do("key", work, listener=lambda stage, payload: first.append(stage))
+        )
+        await asyncio.sleep(0.015)  # join after the first stages were emitted
+        late_result = await flight.do("key", work, listener=lambda stage, payload: late.append(stage))
+        return await first_call, late_result, first, late
+
+    first_result, late_result, first, late = asyncio.run(scenario())
+
+    assert runs == [1]
+    assert first_result == late_result == "done"
+    assert first == late == ["kpis", "charts", "insights"]
+    assert flight.stats()["in_flight"] == 0
+
+def test_finished_flight_starts_a_new_run():
+    flight = BroadcastFlight()
+    runs = []
+
+    async def work(emit):
+        runs.append(1)
+        emit("kpis", {})
+        return len(runs)
+
+    async def scenario():
+        return await flight.do("key", work), await flight.do("key", work)
+
+    assert asyncio.run(scenario()) == (1, 2)
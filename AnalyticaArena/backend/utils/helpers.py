@@ -32,45 +32,6 @@ def validate_file(filename: str, file_size: int, max_size_mb: int = 50) -> Dict[
         "extension": file_ext
     }
 
-def infer_column_types(df: pd.DataFrame) -> Dict[str, str]:
-    """Infer semantic types for each column"""
-    column_types = {}
-    
-    for col in df.columns:
-        dtype = df[col].dtype
-        
-        # Check if numeric
-        if pd.api.types.is_numeric_dtype(dtype):
-            # Check if it's actually an ID or categorical
-            unique_ratio = df[col].nunique() / len(df)
-            if unique_ratio > 0.9:
-                column_types[col] = "identifier"
-            elif df[col].nunique() < 20:
-                column_types[col] = "categorical"
-            elif pd.api.types.is_float_dtype(dtype):
-                column_types[col] = "numeric_continuous"
-            else:
-                column_types[col] = "numeric_discrete"
-        
-        # Check if datetime
-        elif pd.api.types.is_datetime64_any_dtype(dtype):
-            column_types[col] = "datetime"
-        
-        # Check if object (string)
-        else:
-            # Try to parse as datetime
-            try:
-                pd.to_datetime(df[col].dropna().head(100), errors='raise')
-                column_types[col] = "datetime_string"
-            except:
-                unique_count = df[col].nunique()
-                if unique_count < 20:
-                    column_types[col] = "categorical"
-                else:
-                    column_types[col] = "text"
-    
-    return column_types
-
 def format_number(num: float) -> str:
     """Format numbers for display"""
     if pd.isna(num):
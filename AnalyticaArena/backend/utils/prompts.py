@@ -1,5 +1,9 @@
 """Prompt templates for Gemini AI"""
 
+# Bump whenever a template changes so cached responses to old prompts, and
+# stored analyses built from them (see analysis_key), are not reused
+PROMPT_TEMPLATE_VERSION = "2"
+
 INSIGHT_GENERATION_PROMPT = """You are an expert data analyst. Analyze the following dataset summary and provide actionable business insights.
 
 Dataset Name: {dataset_name}
@@ -62,6 +66,38 @@ Example response format:
 
 Generate the response as valid JSON only."""
 
+NL_TO_SQL_PROMPT = """You are a SQL data analysis query generator. Convert the user's natural language question into a DuckDB SQL query.
+
+Dataset Information:
+- Table: df
+- Columns: {columns}
+- Column Types: {column_types}
+- Shape: {shape}
+
+User Question: {question}
+
+Rules:
+1. The dataset is the table 'df'; it is the only table
+2. Write a single read-only SELECT statement (CTEs and self-joins on df are allowed)
+3. Quote column names with double quotes
+4. Alias aggregated columns so the result has readable column names
+5. Return a dictionary with 'sql' and 'chart_config' keys
+6. If visualizable, provide chart configuration using the result's column names
+
+Example response format:
+{{
+  "sql": "SELECT \\"category\\", AVG(\\"value\\") AS \\"value\\" FROM df GROUP BY \\"category\\" ORDER BY \\"value\\" DESC LIMIT 5",
+  "needs_chart": true,
+  "chart_config": {{
+    "type": "bar",
+    "x_column": "category",
+    "y_column": "value",
+    "title": "Top 5 Categories by Average Value"
+  }}
+}}
+
+Generate the response as valid JSON only."""
+
 CHART_SUGGESTION_PROMPT = """You are a data visualization expert. Suggest the best charts for this dataset.
 
 Dataset Information:
@@ -92,6 +128,59 @@ Return a JSON array with this structure:
 
 Only return valid JSON."""
 
+COMBINED_ANALYSIS_PROMPT = """You are an expert data analyst and data visualization expert. Analyze the following dataset summary, then provide actionable business insights and suggest the best charts.
+
+Dataset Name: {dataset_name}
+Number of Rows: {num_rows}
+Number of Columns: {num_columns}
+
+Column Information:
+{column_info}
+
+Column Types: {column_types}
+
+Statistical Summary:
+{statistics}
+
+Data Quality Issues:
+{quality_issues}
+
+Sample Data:
+{sample_data}
+
+Task 1: Generate 5-8 key insights about this dataset. For each insight:
+1. Identify a pattern, trend, or anomaly
+2. Explain its significance
+3. Suggest a business action or recommendation
+
+Task 2: Suggest 4-6 meaningful charts that would provide valuable insights, choosing
+chart types appropriate to the column types.
+
+Return a single JSON object with this structure:
+{{
+  "insights": [
+    {{
+      "title": "Brief insight title",
+      "description": "Detailed explanation of the insight",
+      "category": "trend|pattern|anomaly|recommendation",
+      "importance": "high|medium|low"
+    }}
+  ],
+  "charts": [
+    {{
+      "chart_type": "bar|line|pie|scatter|histogram|box",
+      "title": "Chart title",
+      "description": "What this chart reveals",
+      "x_column": "column_name or null",
+      "y_column": "column_name or null",
+      "group_by": "column_name or null",
+      "aggregation": "sum|mean|count|none"
+    }}
+  ]
+}}
+
+Only return valid JSON, no additional text."""
+
 REPORT_GENERATION_PROMPT = """You are a professional data analyst writing an executive report.
 
 Dataset: {dataset_name}
@@ -123,10 +212,27 @@ def fill_insight_prompt(dataset_name: str, num_rows: int, num_columns: int,
         quality_issues=quality_issues
     )
 
-def fill_nl_to_code_prompt(columns: list, column_types: dict, shape: tuple, question: str) -> str:
+def fill_nl_to_code_prompt(columns: list, column_types: dict, shape: tuple, question: str,
+                           omitted_columns: int = 0) -> str:
     """Fill natural language to code prompt template"""
+    column_list = ", ".join(columns)
+    if omitted_columns:
+        column_list += f" (and {omitted_columns} less relevant columns not listed)"
     return NL_TO_CODE_PROMPT.format(
-        columns=", ".join(columns),
+        columns=column_list,
+        column_types=str(column_types),
+        shape=f"{shape[0]} rows × {shape[1]} columns",
+        question=question
+    )
+
+def fill_nl_to_sql_prompt(columns: list, column_types: dict, shape: tuple, question: str,
+                          omitted_columns: int = 0) -> str:
+    """Fill natural language to SQL prompt template"""
+    column_list = ", ".join(columns)
+    if omitted_columns:
+        column_list += f" (and {omitted_columns} less relevant columns not listed)"
+    return NL_TO_SQL_PROMPT.format(
+        columns=column_list,
         column_types=str(column_types),
         shape=f"{shape[0]} rows × {shape[1]} columns",
         question=question
@@ -140,6 +246,21 @@ def fill_chart_suggestion_prompt(columns: list, column_types: dict, sample_data:
         sample_data=sample_data
     )
 
+def fill_combined_analysis_prompt(dataset_name: str, num_rows: int, num_columns: int,
+                                  column_info: str, column_types: dict, statistics: str,
+                                  quality_issues: str, sample_data: str) -> str:
+    """Fill the single-call insights and chart suggestions prompt template"""
+    return COMBINED_ANALYSIS_PROMPT.format(
+        dataset_name=dataset_name,
+        num_rows=num_rows,
+        num_columns=num_columns,
+        column_info=column_info,
+        column_types=str(column_types),
+        statistics=statistics,
+        quality_issues=quality_issues,
+        sample_data=sample_data
+    )
+
 def fill_report_prompt(dataset_name: str, statistics: str, insights: str, chart_descriptions: str) -> str:
     """Fill report generation prompt template"""
     return REPORT_GENERATION_PROMPT.format(
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key.
+    The first caller starts the work as a task; callers arriving while it is
+    in flight await the same task instead of repeating it. The task is
+    shielded, so a caller that disconnects does not cancel it for the others.
+    Nothing is remembered once the task finishes.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() once per key across concurrent callers"""
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._finish(key))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable) -> None:
+        self._flights.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Coalescing counters for monitoring"""
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "shared": self.shared
+        }
+
+class BroadcastFlight(SingleFlight):
+    """
+    SingleFlight for work that reports progress events.
+    The first caller starts fn(emit); every caller's `listener` receives the
+    events of the flight it joins, starting with those emitted before it joined.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._events: Dict[Hashable, List[Tuple]] = {}
+        self._listeners: Dict[Hashable, List[Callable[..., None]]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[Callable[..., None]], Awaitable[Any]],
+                 listener: Optional[Callable[..., None]] = None) -> Any:
+        """Await fn(emit) once per key across concurrent callers, passing its events to `listener`"""
+        if key not in self._flights:
+            events: List[Tuple] = []
+            listeners: List[Callable[..., None]] = []
+            self._events[key] = events
+            self._listeners[key] = listeners
+
+            def emit(*event: Any) -> None:
+                events.append(event)
+                for receive in list(listeners):
+                    receive(*event)
+
+            work = lambda: fn(emit)
+        else:
+            work = None  # the flight in progress is joined, nothing is started
+
+        listeners = self._listeners[key]
+        if listener is not None:
+            for event in self._events[key]:
+                listener(*event)
+            listeners.append(listener)
+        try:
+            return await super().do(key, work)
+        finally:
+            if listener is not None:
+                listeners.remove(listener)
+
+    def _finish(self, key: Hashable) -> None:
+        super()._finish(key)
+        self._events.pop(key, None)
+        self._listeners.pop(key, None)
@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict
+
+WORKER_POOL_KIND = os.getenv("WORKER_POOL_KIND", "process")  # process or thread
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", os.cpu_count() or 2))
+WORKER_POOL_MAX_PENDING = int(os.getenv("WORKER_POOL_MAX_PENDING", WORKER_POOL_SIZE * 2))
+WORKER_POOL_RETRY_AFTER = int(os.getenv("WORKER_POOL_RETRY_AFTER_SECONDS", 5))
+
+class PoolSaturatedError(Exception):
+    """Raised when the worker pool queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Server is busy processing other datasets. Please retry shortly.")
+        self.retry_after = retry_after
+
+class WorkerPool:
+    """
+    Executor for CPU-bound pandas work, kept off the asyncio event loop.
+    At most `size` jobs run at once and `max_pending` more may wait; beyond
+    that submissions are rejected so callers can answer with 503.
+    """
+
+    def __init__(self, kind: str, size: int, max_pending: int, retry_after: int):
+        self.kind = kind
+        self.size = size
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._executor: Executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _create_executor(self) -> Executor:
+        if self.kind == "thread":
+            return ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="analytica-worker")
+        # Spawned workers do not inherit the event loop or open Mongo sockets
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = self._create_executor()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run fn(*args, **kwargs) in the pool and await its result"""
+        if self.in_flight >= self.size + self.max_pending:
+            self.rejected += 1
+            raise PoolSaturatedError(self.retry_after)
+
+        self.start()
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); replace the pool for later jobs
+            self.failed += 1
+            self.shutdown()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool counters for monitoring"""
+        return {
+            "kind": self.kind,
+            "size": self.size,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.size),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+
+# Singleton instance
+worker_pool = WorkerPool(WORKER_POOL_KIND, WORKER_POOL_SIZE, WORKER_POOL_MAX_PENDING, WORKER_POOL_RETRY_AFTER)